@@ -4,14 +4,13 @@ import os
 import time
 import json
 import streamlit as st
-import pandas as pd
 from typing import List, Dict, Any, Optional, Callable
 
 # 导入配置和模块
-from config import APP_CONFIG, DOCUMENT_DIR, DOCUMENT_CONFIG
+from config import APP_CONFIG, DOCUMENT_DIR, DOCUMENT_CONFIG, VECTOR_STORE_CONFIG
 from src.document_processor import PDFProcessor, WordProcessor, TextProcessor, URLProcessor
-from src.vector_store import ChromaStore
-from src.model import create_llm, SentenceEmbedding
+from src.vector_store import BaseVectorStore, KnowledgeBaseLock, create_vector_store
+from src.model import create_llm, SentenceEmbedding, EmbeddingExecutor, CrossEncoderReranker, get_model_registry
 from src.utils.helpers import get_document_processor, get_file_extension, get_file_size_str
 
 # 初始化会话状态
@@ -31,28 +30,84 @@ if "documents" not in st.session_state:
 if "need_refresh" not in st.session_state:
     st.session_state.need_refresh = False
 
-# 确保embedding_model在初始化后再调用load_model
-if "embedding_model" not in st.session_state:
-    st.session_state.embedding_model = SentenceEmbedding()
-    # 将load_model()调用移到初始化之后的单独检查中
+# 模型和向量存储在进程内共享，会话中只保存句柄
+registry = get_model_registry()
 
-# 确保在embedding_model初始化后再初始化vector_store
-if "vector_store" not in st.session_state:
-    # 确保embedding_model已经初始化
-    if "embedding_model" in st.session_state:
-        st.session_state.vector_store = ChromaStore(embedding_function=st.session_state.embedding_model.encode)
-    else:
-        st.error("初始化向量存储失败：嵌入模型未初始化")
+def _create_embedding_executor():
+    """创建多进程嵌入执行器，未配置工作进程时返回None"""
+    if VECTOR_STORE_CONFIG["embedding_workers"] <= 0:
+        return None
+    embedding_model = registry.get("embedding")
+    return EmbeddingExecutor(
+        model_name=embedding_model.model_name,
+        backend=embedding_model.backend,
+        cache=embedding_model.cache
+    )
 
-# 在所有初始化完成后，加载模型
-if "embedding_model" in st.session_state and st.session_state.embedding_model is not None:
+def _create_vector_store():
+    """创建向量存储，并持有其依赖对象的句柄和知识库共享锁
+
+    共享锁在存储卸载前一直持有，命令行的compact和restore在应用运行期间会拒绝执行。
+    """
+    lock = KnowledgeBaseLock()
+    lock.acquire()
     try:
-        st.session_state.embedding_model.load_model()
-    except Exception as e:
-        st.error(f"加载嵌入模型失败: {str(e)}")
+        dependency_handles = [
+            registry.acquire("embedding"),
+            registry.acquire("embedding_executor"),
+            registry.acquire("reranker"),
+        ]
+        embedding_model = dependency_handles[0].value
+        store = create_vector_store(
+            embedding_function=embedding_model.encode,
+            embedding_executor=dependency_handles[1].value,
+            embedding_model=embedding_model,
+            reranker=dependency_handles[2].value
+        )
+    except BaseException:
+        lock.release()
+        raise
+    store.dependency_handles = dependency_handles
+    store.process_lock = lock
+    return store
+
+registry.register("embedding", SentenceEmbedding)
+registry.register("embedding_executor", _create_embedding_executor,
+                  lambda executor: executor.shutdown() if executor is not None else None)
+registry.register("reranker", CrossEncoderReranker)
+registry.register("vector_store", _create_vector_store, lambda store: store.process_lock.release())
+registry.register("llm", create_llm)
+
+def get_embedding_model() -> SentenceEmbedding:
+    """获取共享的嵌入模型"""
+    return st.session_state.embedding_handle.value
+
+def get_vector_store() -> BaseVectorStore:
+    """获取共享的向量存储"""
+    return st.session_state.vector_store_handle.value
+
+if "embedding_handle" not in st.session_state:
+    st.session_state.embedding_handle = registry.acquire("embedding")
+
+if "vector_store_handle" not in st.session_state:
+    st.session_state.vector_store_handle = registry.acquire("vector_store")
 
-if "model" not in st.session_state:
-    st.session_state.model = None
+# 在所有初始化完成后，加载模型
+try:
+    get_embedding_model().load_model()
+except Exception as e:
+    st.error(f"加载嵌入模型失败: {str(e)}")
+
+# 命令行工具正在维护知识库时无法打开向量存储
+try:
+    get_vector_store()
+except RuntimeError as e:
+    st.error(f"打开知识库失败: {str(e)}")
+    st.stop()
+
+# 大模型按需加载
+if "llm_handle" not in st.session_state:
+    st.session_state.llm_handle = None
 if "use_llm" not in st.session_state:
     st.session_state.use_llm = False
 
@@ -186,6 +241,7 @@ def process_document(uploaded_file):
                 # 继续处理，不中断文档处理流程
 
         processor.set_progress_callback(progress_callback)
+        processor.set_embedding_model(get_embedding_model())
         
         # 启动文档处理
         processor.process(file_path)
@@ -207,29 +263,50 @@ def add_to_vector_store(document_data):
     chunks = document_data["chunks"]
     source = document_data["source"]
     metadata = document_data["metadata"]
+    offsets = document_data.get("chunk_offsets")
     
     metadatas = []
     for i, chunk in enumerate(chunks):
         chunk_metadata = metadata.copy()
         chunk_metadata["chunk_index"] = i
         chunk_metadata["chunk_count"] = len(chunks)
+        # 文本块在提取出的全文中的字符偏移
+        if offsets:
+            chunk_metadata["start_offset"], chunk_metadata["end_offset"] = offsets[i]
         chunk_metadata["source"] = source
+        chunk_metadata["source_type"] = document_data.get("source_type", "file")
         metadatas.append(chunk_metadata)
     
+    # 写入进度对应PROCESS_STAGES中的vector_store阶段
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+    stage_keys = list(PROCESS_STAGES.keys())
+    base_progress = sum(PROCESS_STAGES[k]["weight"] for k in stage_keys[:stage_keys.index("vector_store")])
+    
+    def progress_callback(stage_name, progress):
+        current_progress = min(base_progress + progress * PROCESS_STAGES[stage_name]["weight"], 1.0)
+        progress_bar.progress(current_progress)
+        status_text.text(f"{PROCESS_STAGES[stage_name]['desc']} ({int(current_progress*100)}%)")
+    
     try:
-        ids = st.session_state.vector_store.add_texts(chunks, metadatas)
+        # 同一来源重新上传时只写入和删除变化的文本块，semantic分块得到的文本块向量直接写入
+        ids = get_vector_store().replace_source(source, chunks, metadatas, progress_callback=progress_callback,
+                                                embeddings=document_data.get("chunk_embeddings"))
         return ids
     except Exception as e:
         handle_error(e, "添加到向量存储失败")
         return []
 
-def search_documents(query, top_k=5):
-    """搜索文档"""
+def search_documents(query, top_k=5, mode=None, rerank=None, stats=None):
+    """搜索文档，stats用于接收本次检索的耗时统计"""
     try:
-        results = st.session_state.vector_store.similarity_search(
+        results = get_vector_store().similarity_search(
             query, 
             k=top_k,
-            use_llm=st.session_state.use_llm
+            use_llm=st.session_state.use_llm,
+            mode=mode,
+            rerank=rerank,
+            stats=stats
         )
         return results
     except Exception as e:
@@ -238,11 +315,11 @@ def search_documents(query, top_k=5):
 
 def generate_answer(query, context):
     """生成回答"""
-    if st.session_state.model is None:
+    if st.session_state.llm_handle is None:
         load_model()
     
     try:
-        answer = st.session_state.model.generate_response(query, context)
+        answer = st.session_state.llm_handle.value.generate_response(query, context)
         return answer
     except Exception as e:
         return f"生成回答失败: {str(e)}"
@@ -287,10 +364,12 @@ def format_search_results(results):
 
 def load_model():
     """加载大模型"""
-    if st.session_state.model is None:
+    if st.session_state.llm_handle is None:
         with st.spinner("正在加载模型，请稍候..."):
-            st.session_state.model = create_llm()
-            st.session_state.model.generate_response("你好")
+            need_warmup = not registry.is_loaded("llm")
+            st.session_state.llm_handle = registry.acquire("llm")
+            if need_warmup:
+                st.session_state.llm_handle.value.generate_response("你好")
 
 def process_url(url: str) -> Dict[str, Any]:
     """处理网页链接"""
@@ -338,6 +417,7 @@ def process_url(url: str) -> Dict[str, Any]:
                 print(f"Progress callback error: {str(e)}")
 
         processor.set_progress_callback(progress_callback)
+        processor.set_embedding_model(get_embedding_model())
         
         # 处理网页链接
         result = processor.process_url(url)
@@ -387,12 +467,11 @@ def render_document_management():
                     doc = {
                         "name": uploaded_file.name,
                         "path": os.path.join(DOCUMENT_DIR, uploaded_file.name),
+                        "source": document_data["source"],
                         "metadata": document_data["metadata"],
-                        "totalchunks": len(document_data["chunks"]),
-                        "ids": ids
+                        "total_chunks": len(document_data["chunks"])
                     }
-                    st.session_state.documents.append(doc)
-                    save_documents_to_disk()
+                    save_document_entry(doc)
                     st.success(f"文档 '{uploaded_file.name}' 处理成功，已添加到知识库")
     
     if url:
@@ -406,12 +485,11 @@ def render_document_management():
                 if ids:
                     doc = {
                         "url": url,
+                        "source": document_data["source"],
                         "metadata": document_data["metadata"],
-                        "total_chunks": len(document_data["chunks"]),
-                        "ids": ids
+                        "total_chunks": len(document_data["chunks"])
                     }
-                    st.session_state.documents.append(doc)
-                    save_documents_to_disk()
+                    save_document_entry(doc)
                     st.success(f"链接 '{url}' 处理成功，已添加到知识库")
     
     if st.session_state.documents:
@@ -422,7 +500,7 @@ def render_document_management():
                 st.write(format_metadata(doc['metadata']))
                 st.write(f"**分块数**: {doc['total_chunks']}")
                 if st.button("删除", key=f"delete_{i}"):
-                    st.session_state.vector_store.delete(doc['ids'])
+                    delete_document_chunks(doc)
                     st.session_state.documents.pop(i)
                     save_documents_to_disk()
                     st.success(f"文档 '{doc.get('name', doc.get('url', '未知'))}' 已删除")
@@ -432,9 +510,26 @@ def render_document_management():
     
     st.subheader("知识库统计")
     doc_count = len(st.session_state.documents)
-    chunk_count = st.session_state.vector_store.count()
+    chunk_count = get_vector_store().count()
     st.metric("文档数量", doc_count)
     st.metric("文本块数量", chunk_count)
+    cache_stats = get_embedding_model().cache_stats()
+    if cache_stats:
+        st.caption(f"嵌入缓存: 命中 {cache_stats['hits']} / 未命中 {cache_stats['misses']}，"
+                   f"命中率 {cache_stats['hit_rate']:.0%}，条目 {cache_stats['entries']}")
+    query_cache_stats = get_vector_store().query_cache_stats()
+    if query_cache_stats:
+        st.caption(f"检索缓存: 命中 {query_cache_stats['hits']} / 未命中 {query_cache_stats['misses']}，"
+                   f"命中率 {query_cache_stats['hit_rate']:.0%}，累计节省 {query_cache_stats['saved_ms']:.0f} ms")
+
+    # 压缩在应用进程内执行，与检索共用存储锁，不需要停止应用
+    if get_vector_store().needs_compaction():
+        st.caption("已删除的文本块较多，压缩后可减少存储占用并恢复检索速度")
+        if st.button("存储维护", help="压缩已删除的行并重建索引"):
+            with st.spinner("正在压缩向量存储..."):
+                get_vector_store().maintain()
+            st.success("向量存储维护完成")
+            st.experimental_rerun()
 
     if not st.session_state.confirm_reset:
         if st.button("重置知识库", type="primary", help="清空所有文档和向量存储"):
@@ -444,8 +539,8 @@ def render_document_management():
         col1, col2 = st.columns(2)
         with col1:
             if st.button("确认重置", type="primary"):
-                if st.session_state.documents or st.session_state.vector_store.count() > 0:
-                    st.session_state.vector_store.reset()
+                if st.session_state.documents or get_vector_store().count() > 0:
+                    get_vector_store().reset()
                     st.session_state.documents = []
                     st.success("知识库已重置")
                 else:
@@ -469,14 +564,40 @@ def render_qa_interface():
     )
     
     query = st.text_input("请输入您的问题", placeholder="例如：什么是机器学习？")
-    col1, col2 = st.columns([1, 4])
+    search_modes = {"dense": "向量检索", "hybrid": "混合检索（关键词+向量）"}
+    col1, col2, col3 = st.columns([1, 1, 3])
     with col1:
         top_k = st.number_input("检索文档数量", min_value=1, max_value=10, value=3)
     with col2:
+        mode = st.selectbox(
+            "检索模式",
+            options=list(search_modes),
+            index=list(search_modes).index(VECTOR_STORE_CONFIG["search_mode"]),
+            format_func=search_modes.get,
+            help="混合检索可以更好地命中产品编号、人名等精确词"
+        )
+    with col3:
+        rerank = st.checkbox(
+            "重排序",
+            value=VECTOR_STORE_CONFIG["rerank_enabled"],
+            help="从更大的候选池中用交叉编码器精排，提高送入大模型的片段质量"
+        )
         search_btn = st.button("搜索", type="primary", help="从知识库中检索相关文档")
     
     if query and search_btn:
-        results = search_documents(query, top_k=top_k)
+        # 向量存储在会话间共享，耗时统计随本次调用返回
+        search_stats = {}
+        results = search_documents(query, top_k=top_k, mode=mode, rerank=rerank, stats=search_stats)
+        
+        if search_stats:
+            latency_text = f"检索耗时 {search_stats['search_ms']:.0f} ms"
+            if search_stats.get("cache_hit"):
+                latency_text += "（命中检索缓存）"
+            if rerank:
+                latency_text += f"，重排序耗时 {search_stats['rerank_ms']:.0f} ms"
+                if search_stats.get("rerank_truncated"):
+                    latency_text += "（超出延迟预算，部分候选未重排）"
+            st.caption(latency_text)
         
         if results:
             with st.expander("检索结果", expanded=True):
@@ -522,10 +643,47 @@ def render_document_browser():
             
             doc_data.append(row)
         
+        import pandas as pd
+
         st.dataframe(pd.DataFrame(doc_data), use_container_width=True)
     else:
         st.info("尚未添加任何文档，请在侧边栏上传文档")
 
+def save_document_entry(doc):
+    """记录文档目录条目，同一来源重复上传时替换原条目"""
+    for i, existing in enumerate(st.session_state.documents):
+        if existing.get("source") == doc["source"]:
+            st.session_state.documents[i] = doc
+            break
+    else:
+        st.session_state.documents.append(doc)
+    save_documents_to_disk()
+
+def delete_document_chunks(doc):
+    """按来源删除文档的全部文本块，旧版目录条目按保存的ID列表删除"""
+    if doc.get("source"):
+        get_vector_store().delete_by_source(doc["source"])
+    else:
+        get_vector_store().delete(doc.get("ids", []))
+
+def migrate_document_catalog():
+    """将旧版目录条目中的ID列表替换为来源，目录只保留文本块数量"""
+    changed = False
+    for doc in st.session_state.documents:
+        if "totalchunks" in doc:
+            doc["total_chunks"] = doc.pop("totalchunks")
+            changed = True
+        if doc.get("ids") and not doc.get("source"):
+            found = get_vector_store().get(doc["ids"][:1])
+            if found["metadatas"] and found["metadatas"][0].get("source"):
+                doc["source"] = found["metadatas"][0]["source"]
+        if doc.get("source") and "ids" in doc:
+            doc.setdefault("total_chunks", len(doc["ids"]))
+            del doc["ids"]
+            changed = True
+    if changed:
+        save_documents_to_disk()
+
 def save_documents_to_disk():
     """将文档列表保存到持久化文件"""
     try:
@@ -552,6 +710,11 @@ def main():
     st.title(APP_CONFIG["title"])
     st.markdown(APP_CONFIG["description"])
 
+    # 旧版文档目录只需迁移一次
+    if not st.session_state.get("catalog_migrated", False):
+        migrate_document_catalog()
+        st.session_state.catalog_migrated = True
+
     # 侧边栏 - 文档管理
     with st.sidebar:
         render_document_management()
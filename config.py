@@ -10,10 +10,14 @@ BASE_DIR = Path(__file__).parent.absolute()
 DATA_DIR = os.path.join(BASE_DIR, "data")
 DOCUMENT_DIR = os.path.join(DATA_DIR, "documents")
 VECTOR_STORE_DIR = os.path.join(DATA_DIR, "vector_store")
+EMBEDDING_CACHE_DIR = os.path.join(DATA_DIR, "embedding_cache")
+MODEL_CACHE_DIR = os.path.join(DATA_DIR, "models")
 
 # 确保目录存在
 os.makedirs(DOCUMENT_DIR, exist_ok=True)
 os.makedirs(VECTOR_STORE_DIR, exist_ok=True)
+os.makedirs(EMBEDDING_CACHE_DIR, exist_ok=True)
+os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
 
 # 模型配置
 MODEL_CONFIG = {
@@ -22,6 +26,14 @@ MODEL_CONFIG = {
     "max_length": 2048,  # 最大生成长度
     "temperature": 0.7,  # 生成温度
     "top_p": 0.9,  # Top-p 采样
+    "embedding_backend": "torch",  # 嵌入模型推理后端，可选 "torch"、"torch_int8"、"onnx"、"onnx_int8"
+    "embedding_num_threads": None,  # 嵌入推理线程数，None表示使用后端默认值
+    "reranker_model": "BAAI/bge-reranker-base",  # 交叉编码器重排序模型
+    "reranker_batch_size": 16,  # 重排序每批打分的候选数
+    "reranker_max_length": 512,  # 重排序输入的最大token数
+    "reranker_cache_size": 10000,  # (查询, 文本块ID)打分缓存的最大条目数
+    "reranker_budget_ms": 800,  # 重排序的延迟预算（毫秒），超出后停止打分
+    "registry_idle_ttl": 1800,  # 进程级共享模型无会话引用后保留的时间（秒），超时后卸载
     "enable_llm": True,  # 是否启用LLM能力
     "llm_provider": "ollama",  # LLM调用方式，可选 "qwen" 或 "ollama"
     "ollama_config": {
@@ -34,14 +46,52 @@ MODEL_CONFIG = {
 DOCUMENT_CONFIG = {
     "chunk_size": 1000,  # 文档分块大小
     "chunk_overlap": 50,  # 分块重叠大小
+    "chunk_strategy": "paragraph",  # 分块策略，可选 "paragraph"（段落优先）、"cdc"（在句末按内容哈希确定边界，编辑文档后未改动部分的文本块保持不变）或 "semantic"（在相邻句子语义相似度下降处切分，需要嵌入模型）
+    "cdc_min_chars": 400,  # cdc分块的最小块长（字符），最大块长为chunk_size
+    "cdc_boundary_divisor": 4,  # cdc分块中达到最小块长后每个句末成为边界的概率为1/n，控制平均块长
+    "semantic_min_chars": 200,  # semantic分块的最小块长（字符），达到后才在语义转折处切分，最大块长为chunk_size
+    "semantic_breakpoint_percentile": 20,  # 相邻句子相似度低于该分位数（0-100）时视为语义转折
+    "semantic_reuse_embeddings": False,  # semantic分块时用句向量加权平均合成文本块向量直接写入，省去对文本块的再次编码；合成向量与编码文本块得到的向量不同且不含重叠部分，对召回率的影响未经验证，默认关闭
+    "chunk_unit": "char",  # 分块长度的计量单位，可选 "char"（字符数）或 "token"（嵌入模型分词器的token数）
+    "chunk_max_tokens": 512,  # token分块时每块的token上限（含[CLS]/[SEP]），应与嵌入模型的max_length一致
+    "chunk_overlap_tokens": 32,  # token分块时的重叠token数
+    "chunk_tokenizer": "shibing624/text2vec-base-chinese",  # token分块使用的分词器，应与嵌入模型一致
     "supported_formats": [".pdf", ".docx", ".txt"],  # 支持的文档格式
 }
 
 # 向量存储配置
 VECTOR_STORE_CONFIG = {
+    "backend": "chroma",  # 向量存储后端，可选 "chroma"、"numpy"（进程内精确检索，适合20万条以内）或 "faiss"（HNSW近似检索，适合百万条以上）
     "embedding_dimension": 768,  # 嵌入向量维度
     "distance_metric": "cosine",  # 距离度量方式
+    "numpy_compact_threshold": 0.3,  # numpy后端中已删除行占比超过该值时压缩向量文件
+    "faiss_rebuild_threshold": 0.2,  # faiss后端中已删除行占比超过该值时压缩向量文件并重建索引
+    "shard_strategy": "none",  # 分片策略，可选 "none"、"source_type"（按来源类型）、"hash"（按来源哈希）或 "partition_key"（按元数据中的分区键）
+    "shard_count": 4,  # hash分片策略的分片数
+    "shard_partition_key": "partition",  # partition_key分片策略使用的元数据字段
+    "shard_query_workers": 4,  # 分片并行查询的线程数
+    "hnsw": {"M": 32, "construction_ef": 200, "search_ef": 64},  # HNSW索引参数：每个节点的邻居数、构建和检索时的候选队列长度
+    "hnsw_collections": {},  # 按集合覆盖HNSW参数，如 {"knowledge_base": {"M": 48, "search_ef": 128}}
+    "hnsw_sweep_grid": {"M": [16, 32, 48], "construction_ef": [100, 200, 400], "search_ef": [16, 32, 64, 128, 256]},  # HNSW参数扫描的网格
     "top_k": 5,  # 检索时返回的最相似文档数量
+    "embedding_batch_size": 32,  # 嵌入模型每个微批次的最大文本数
+    "embedding_max_batch_tokens": 8192,  # 嵌入模型每个微批次的最大token数（按填充后长度计算）
+    "embedding_cache_enabled": True,  # 是否启用磁盘嵌入向量缓存
+    "embedding_cache_max_entries": 200000,  # 嵌入缓存最大条目数，超出后按LRU淘汰
+    "embedding_workers": 0,  # 入库时的嵌入工作进程数，0表示在当前进程中计算
+    "embedding_worker_threads": 2,  # 每个嵌入工作进程的推理线程数
+    "embedding_task_size": 64,  # 分发给工作进程的每个任务的文本数
+    "embedding_task_timeout": 300,  # 等待工作进程完成单个任务的最长时间（秒），超时后入库报错而不是一直等待
+    "write_batch_size": 256,  # 每批写入向量库的文本数，写入与下一批的向量计算并行
+    "sparse_index_enabled": True,  # 是否维护BM25稀疏索引（混合检索需要）
+    "search_mode": "dense",  # 默认检索模式，可选 "dense"（向量）或 "hybrid"（BM25+向量融合）
+    "hybrid_candidate_multiplier": 4,  # 混合检索时每一路候选数为top_k的倍数
+    "rrf_k": 60,  # 倒数排名融合的平滑常数
+    "rerank_enabled": False,  # 是否默认对检索结果做交叉编码器重排序
+    "rerank_pool_multiplier": 4,  # 重排序候选池大小为top_k的倍数
+    "query_cache_enabled": True,  # 是否缓存检索结果（集合有写入或删除后自动失效）
+    "query_cache_max_entries": 1024,  # 检索结果缓存的最大条目数，超出后按LRU淘汰
+    "query_cache_ttl": 600,  # 检索结果缓存的有效期（秒）
 }
 
 # Streamlit 应用配置
@@ -7,10 +7,168 @@ import argparse
 import subprocess
 from config import APP_CONFIG
 
+# 应用启动时导入的模块，用于统计导入耗时
+STARTUP_IMPORTS = [
+    "streamlit",
+    "config",
+    "src.document_processor",
+    "src.vector_store",
+    "src.model",
+    "src.utils.helpers",
+]
+
+
+def report_import_time(top_n: int = 20):
+    """以 python -X importtime 方式统计应用启动时的模块导入耗时
+
+    Args:
+        top_n: 显示累计耗时最高的模块数量
+    """
+    code = "; ".join(f"import {name}" for name in STARTUP_IMPORTS)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if result.returncode != 0:
+        print(f"导入失败: {result.stderr.strip().splitlines()[-1]}")
+        sys.exit(1)
+    
+    rows = []
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            total_us += int(cumulative_us)
+        rows.append((int(cumulative_us), int(self_us), depth, name.strip()))
+    
+    print(f"启动导入总耗时: {total_us / 1000:.1f} ms")
+    print(f"{'累计(ms)':>10} {'自身(ms)':>10}  模块")
+    for cumulative_us, self_us, depth, name in sorted(rows, reverse=True)[:top_n]:
+        print(f"{cumulative_us / 1000:>10.1f} {self_us / 1000:>10.1f}  {'  ' * depth}{name}")
+
+
+def run_sweep(args):
+    """对当前知识库运行HNSW参数扫描"""
+    from src.model import SentenceEmbedding
+    from src.vector_store import create_vector_store
+    from src.vector_store.hnsw_sweep import run_hnsw_sweep
+    
+    query_texts = None
+    if args.sweep_query_file:
+        with open(args.sweep_query_file, "r", encoding="utf-8") as f:
+            query_texts = [line.strip() for line in f if line.strip()]
+    
+    embedding_model = SentenceEmbedding()
+    store = create_vector_store(embedding_function=embedding_model.encode, embedding_model=embedding_model)
+    run_hnsw_sweep(
+        store,
+        k=args.sweep_k,
+        num_queries=args.sweep_queries,
+        query_texts=query_texts,
+        output_dir=args.sweep_output,
+    )
+
+
+def run_chunker_bench(args):
+    """运行分块器微基准"""
+    from src.utils.chunker_benchmark import run_chunker_benchmark
+    
+    text = None
+    if args.bench_chunker:
+        with open(args.bench_chunker, "r", encoding="utf-8") as f:
+            text = f.read()
+    run_chunker_benchmark(text)
+
+
+def run_backend_bench(args):
+    """运行向量存储后端基准"""
+    from src.vector_store.backend_benchmark import run_backend_benchmark
+    
+    run_backend_benchmark(args.bench_backends or None, num_vectors=args.bench_vectors)
+
+
+def acquire_lock(exclusive: bool = False):
+    """获取知识库锁，与应用或其他命令冲突时退出"""
+    from src.vector_store import KnowledgeBaseLock
+    
+    lock = KnowledgeBaseLock()
+    try:
+        lock.acquire(exclusive=exclusive)
+    except RuntimeError as e:
+        print(str(e))
+        sys.exit(1)
+    return lock
+
+
+def run_snapshot(args):
+    """导出知识库快照或从快照恢复
+
+    恢复会清空集合并替换文档目录，运行中的应用仍持有旧的存储状态和检索缓存，
+    因此需要先停止应用；导出只读取知识库，可以在应用运行时执行。
+    """
+    from src.model import SentenceEmbedding
+    from src.vector_store import create_vector_store
+    from src.vector_store.snapshot import create_snapshot, restore_snapshot
+    
+    if args.command == "restore" and not args.path:
+        print("恢复快照需要指定快照目录: python run.py restore <快照目录>")
+        sys.exit(1)
+    
+    lock = acquire_lock(exclusive=args.command == "restore")
+    try:
+        embedding_model = SentenceEmbedding()
+        store = create_vector_store(embedding_function=embedding_model.encode, embedding_model=embedding_model)
+        if args.command == "snapshot":
+            create_snapshot(store, output_dir=args.path)
+        else:
+            restore_snapshot(store, args.path, compare_reingest=args.compare_reingest)
+    finally:
+        lock.release()
+
+
+def run_compact(args):
+    """执行向量存储维护：压缩已删除的行并重建索引
+
+    压缩会重写向量文件并重新编号行号，运行中的应用仍持有旧的行号映射，
+    因此需要先停止应用；应用运行期间可在侧栏执行同样的维护。
+    """
+    from src.vector_store import create_vector_store
+    
+    lock = acquire_lock(exclusive=True)
+    try:
+        store = create_vector_store()
+        if store.maintain():
+            print("向量存储维护完成")
+        else:
+            print("已删除行未超过阈值，无需维护")
+    finally:
+        lock.release()
+
 
 def main():
     """主函数，解析命令行参数并启动应用"""
     parser = argparse.ArgumentParser(description="个人知识库系统启动脚本")
+    parser.add_argument(
+        "command", 
+        nargs="?", 
+        choices=["snapshot", "restore", "compact"],
+        help="snapshot: 导出知识库快照；restore: 从快照恢复知识库（需先停止应用）；compact: 压缩已删除的行并重建HNSW索引（需先停止应用）。不指定时启动应用"
+    )
+    parser.add_argument(
+        "path", 
+        nargs="?", 
+        help="快照目录，导出时默认为data/snapshots/<集合名>_<时间>"
+    )
+    parser.add_argument(
+        "--compare-reingest", 
+        action="store_true", 
+        help="恢复快照后抽样测量重新计算向量的耗时，与恢复耗时对比"
+    )
     parser.add_argument(
         "--port", 
         type=int, 
@@ -27,9 +185,85 @@ def main():
         action="store_true", 
         help="启用调试模式"
     )
+    parser.add_argument(
+        "--import-time", 
+        action="store_true", 
+        help="统计应用启动时的模块导入耗时（python -X importtime），不启动应用"
+    )
+    
+    parser.add_argument(
+        "--hnsw-sweep", 
+        action="store_true", 
+        help="在当前知识库的向量上扫描HNSW参数，测量recall@k和p50/p99延迟并写出CSV/JSON报告，不启动应用"
+    )
+    parser.add_argument(
+        "--sweep-k", 
+        type=int, 
+        default=10,
+        help="参数扫描时的k，默认为10"
+    )
+    parser.add_argument(
+        "--sweep-queries", 
+        type=int, 
+        default=200,
+        help="参数扫描时从知识库中抽样的查询数，默认为200"
+    )
+    parser.add_argument(
+        "--sweep-query-file", 
+        help="参数扫描使用的真实查询文件，每行一条查询"
+    )
+    parser.add_argument(
+        "--sweep-output", 
+        help="参数扫描报告的输出目录，默认为data/reports"
+    )
+    
+    parser.add_argument(
+        "--bench-chunker", 
+        nargs="?", 
+        const="",
+        metavar="FILE",
+        help="测量文本分块的吞吐量（MB/s），与原先的实现对比，可指定测试文本文件，默认生成样例文本，不启动应用"
+    )
+    
+    parser.add_argument(
+        "--bench-backends", 
+        nargs="*", 
+        choices=["chroma", "numpy", "faiss"],
+        help="在随机向量上比较向量存储后端的冷启动耗时、查询延迟和常驻内存，默认比较全部后端，不启动应用"
+    )
+    parser.add_argument(
+        "--bench-vectors", 
+        type=int, 
+        default=100000,
+        help="后端基准的向量数，默认为100000"
+    )
     
     args = parser.parse_args()
     
+    if args.import_time:
+        report_import_time()
+        return
+    
+    if args.hnsw_sweep:
+        run_sweep(args)
+        return
+    
+    if args.bench_chunker is not None:
+        run_chunker_bench(args)
+        return
+    
+    if args.bench_backends is not None:
+        run_backend_bench(args)
+        return
+    
+    if args.command == "compact":
+        run_compact(args)
+        return
+    
+    if args.command:
+        run_snapshot(args)
+        return
+    
     # 构建Streamlit命令
     cmd = [
         "streamlit", 
@@ -1,8 +1,10 @@
 """文档处理器基类，提供通用的文本分片功能"""
 
-from typing import List, Dict, Any, Optional, Callable
+import numpy as np
+from typing import List, Dict, Any, Optional, Callable, Iterable, Tuple
 from config import DOCUMENT_CONFIG
 from src.utils.text_chunker import TextChunker
+from src.utils.token_counter import get_token_counter
 
 class BaseProcessor:
     """文档处理器基类"""
@@ -17,7 +19,15 @@ class BaseProcessor:
         self.chunk_size = chunk_size or DOCUMENT_CONFIG["chunk_size"]
         self.chunk_overlap = chunk_overlap or DOCUMENT_CONFIG["chunk_overlap"]
         self.progress_callback = None
-        self.chunker = TextChunker(self.chunk_size, self.chunk_overlap)
+        self.chunk_embeddings = None
+        if DOCUMENT_CONFIG["chunk_unit"] == "token":
+            # 按嵌入模型的token数分块，每块恰好放进模型窗口，不会被截断
+            token_counter = get_token_counter(DOCUMENT_CONFIG["chunk_tokenizer"])
+            self.chunker = TextChunker(DOCUMENT_CONFIG["chunk_max_tokens"] - token_counter.num_special_tokens,
+                                       DOCUMENT_CONFIG["chunk_overlap_tokens"], token_counter=token_counter)
+        else:
+            self.chunker = TextChunker(self.chunk_size, self.chunk_overlap,
+                                       strategy=DOCUMENT_CONFIG["chunk_strategy"])
     
     def set_progress_callback(self, callback: Callable[[str, float], None]):
         """设置进度回调函数
@@ -27,6 +37,14 @@ class BaseProcessor:
         """
         self.progress_callback = callback
     
+    def set_embedding_model(self, model):
+        """设置semantic分块使用的嵌入模型
+        
+        Args:
+            model: SentenceEmbedding实例，需要提供encode_array
+        """
+        self.chunker.embedding_model = model
+    
     def chunk_text(self, text: str) -> List[str]:
         """将文本分割成块
         
@@ -46,4 +64,36 @@ class BaseProcessor:
         if self.progress_callback:
             self.progress_callback("generate_chunks", 1.0)
             
-        return chunks
\ No newline at end of file
+        return chunks
+    
+    def chunk_segments(self, segments: Iterable[str]) -> Tuple[List[str], List[Tuple[int, int]]]:
+        """边读取文本片段边分块，不需要先拼接出全文
+        
+        Args:
+            segments: 按顺序拼接构成全文的文本片段，如逐页提取的页面文本
+            
+        Returns:
+            (文本块列表, 各文本块在全文中的[起始, 结束)字符偏移列表)，文本块与对全文调用chunk_text的结果相同。
+            semantic分块且启用semantic_reuse_embeddings时，由句向量合成的文本块向量保存在self.chunk_embeddings
+        """
+        chunks, offsets = [], []
+        self.chunk_embeddings = None
+        if self.chunker.strategy == "semantic" and self.chunker.token_counter is None \
+                and DOCUMENT_CONFIG["semantic_reuse_embeddings"]:
+            vectors = []
+            for chunk, start, end, vector in self.chunker.iter_semantic_chunks(segments):
+                chunks.append(chunk)
+                offsets.append((start, end))
+                vectors.append(vector)
+            if vectors:
+                self.chunk_embeddings = np.stack(vectors)
+        else:
+            for chunk, start, end in self.chunker.iter_chunks_with_offsets(segments):
+                chunks.append(chunk)
+                offsets.append((start, end))
+        
+        # 更新进度
+        if self.progress_callback:
+            self.progress_callback("generate_chunks", 1.0)
+            
+        return chunks, offsets
\ No newline at end of file
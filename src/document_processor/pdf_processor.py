@@ -1,8 +1,7 @@
 """PDF文档处理模块，负责解析PDF文档并提取文本内容"""
 
 import os
-import fitz  # PyMuPDF
-from typing import List, Dict, Any, Optional, Callable
+from typing import List, Dict, Any, Optional, Callable, Iterator
 from config import DOCUMENT_CONFIG
 
 
@@ -38,36 +37,49 @@ class PDFProcessor(BaseProcessor):
         Returns:
             提取的文本内容
         """
+        text = "".join(self.iter_pages(file_path))
+        print(f"PDF文本提取完成，总长度: {len(text)}字符")
+        return text
+
+    def iter_pages(self, file_path: str) -> Iterator[str]:
+        """逐页提取PDF文本，每页末尾附加页面分隔符
+
+        Args:
+            file_path: PDF文件路径
+
+        Yields:
+            页面文本
+        """
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"文件不存在: {file_path}")
 
         try:
+            import fitz  # PyMuPDF
+
             print(f"开始从PDF提取文本: {file_path}")
             # 打开PDF文件
             doc = fitz.open(file_path)
-            text = ""
+        except Exception as e:
+            raise Exception(f"PDF文件解析失败: {str(e)}")
+
+        try:
             total_pages = len(doc)
             print(f"PDF总页数: {total_pages}")
 
             # 遍历所有页面并提取文本
-            for i, page in enumerate(doc):
-                print(f"处理第 {i+1}/{total_pages} 页")
-                page_text = page.get_text()
-                text += page_text
-                text += "\n\n"  # 添加页面分隔符
-                print(f"第 {i+1} 页文本长度: {len(page_text)}字符")
+            for i in range(total_pages):
+                try:
+                    page_text = doc[i].get_text()
+                except Exception as e:
+                    raise Exception(f"PDF文件解析失败: {str(e)}")
+                print(f"第 {i+1}/{total_pages} 页文本长度: {len(page_text)}字符")
+                yield page_text + "\n\n"  # 添加页面分隔符
                 
                 # 更新进度
                 if self.progress_callback:
-                    progress = (i + 1) / total_pages
-                    print(f"调用进度回调: process_content, {progress:.2f}")
-                    self.progress_callback("process_content", progress)
-
+                    self.progress_callback("process_content", (i + 1) / total_pages)
+        finally:
             doc.close()
-            print(f"PDF文本提取完成，总长度: {len(text)}字符")
-            return text
-        except Exception as e:
-            raise Exception(f"PDF文件解析失败: {str(e)}")
 
     def extract_metadata(self, file_path: str) -> Dict[str, Any]:
         """提取PDF文件的元数据
@@ -82,6 +94,8 @@ class PDFProcessor(BaseProcessor):
             raise FileNotFoundError(f"文件不存在: {file_path}")
 
         try:
+            import fitz  # PyMuPDF
+
             doc = fitz.open(file_path)
             metadata = {
                 "title": doc.metadata.get("title", ""),
@@ -119,21 +133,16 @@ class PDFProcessor(BaseProcessor):
         if self.progress_callback:
             self.progress_callback("extract_metadata", 1.0)
         
-        # 处理内容
-        text = self.extract_text(file_path)
-        
-        # 生成文本块
-        if self.progress_callback:
-            self.progress_callback("generate_chunks", 0.5)
-        chunks = self.chunk_text(text)
-        if self.progress_callback:
-            self.progress_callback("generate_chunks", 1.0)
+        # 逐页提取内容并分块，不在内存中拼接全文
+        chunks, offsets = self.chunk_segments(self.iter_pages(file_path))
             
         self.result = {
             "source": file_path,
             "source_type": "file",
             "metadata": metadata,
             "chunks": chunks,
+            "chunk_offsets": offsets,
+            "chunk_embeddings": self.chunk_embeddings,
             "total_chunks": len(chunks)
         }
         
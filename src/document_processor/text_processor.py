@@ -1,9 +1,13 @@
 """纯文本处理模块，负责解析TXT文档并提取文本内容"""
 
 import os
-from typing import List, Dict, Any, Optional, Callable
+import codecs
+from typing import List, Dict, Any, Optional, Callable, Iterator
 from config import DOCUMENT_CONFIG
 
+# 流式读取文本文件时每次读取的字符数
+READ_BLOCK_CHARS = 1 << 20
+
 
 from .base_processor import BaseProcessor
 
@@ -55,6 +59,38 @@ class TextProcessor(BaseProcessor):
         except Exception as e:
             raise Exception(f"文本文件解析失败: {str(e)}")
 
+    def _detect_encoding(self, file_path: str) -> str:
+        """逐块校验文件是否为UTF-8编码，否则按GBK读取"""
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        try:
+            with open(file_path, 'rb') as file:
+                for block in iter(lambda: file.read(READ_BLOCK_CHARS), b""):
+                    decoder.decode(block)
+                decoder.decode(b"", final=True)
+            return "utf-8"
+        except UnicodeDecodeError:
+            return "gbk"
+
+    def iter_text(self, file_path: str) -> Iterator[str]:
+        """分块读取文本文件，不一次性读入全文
+
+        Args:
+            file_path: 文本文件路径
+
+        Yields:
+            文本片段
+        """
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"文件不存在: {file_path}")
+
+        encoding = self._detect_encoding(file_path)
+        try:
+            with open(file_path, 'r', encoding=encoding) as file:
+                for block in iter(lambda: file.read(READ_BLOCK_CHARS), ""):
+                    yield block
+        except Exception as e:
+            raise Exception(f"文本文件解析失败: {str(e)}")
+
     def extract_metadata(self, file_path: str) -> Dict[str, Any]:
         """提取文本文件的元数据
 
@@ -90,19 +126,15 @@ class TextProcessor(BaseProcessor):
         Returns:
             包含文本块和元数据的字典
         """
-        text = self.extract_text(file_path)
-        print("extract_text")
-        chunks = self.chunk_text(text)
-        print("chunk_text")
+        # 分块读取文件并流式分块，不在内存中保留全文
+        chunks, offsets = self.chunk_segments(self.iter_text(file_path))
         metadata = self.extract_metadata(file_path)
-        print("extract_metadata")
-        
-        print("+++++++++++++")
-        print(text)
 
         # 保存处理结果到实例变量
         self.result = {
             "chunks": chunks,
+            "chunk_offsets": offsets,
+            "chunk_embeddings": self.chunk_embeddings,
             "metadata": metadata,
             "source": file_path,
             "source_type": "file",
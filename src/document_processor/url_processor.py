@@ -71,12 +71,14 @@ class URLProcessor(BaseProcessor):
         if self.progress_callback:
             self.progress_callback("元数据提取完成", 0.6)
 
-        chunks = self.chunk_text(text)
+        chunks, offsets = self.chunk_segments([text])
         if self.progress_callback:
             self.progress_callback("分块完成", 1.0)
 
         return {
             "chunks": chunks,
+            "chunk_offsets": offsets,
+            "chunk_embeddings": self.chunk_embeddings,
             "metadata": metadata,
             "source": url,
             "source_type": "url",
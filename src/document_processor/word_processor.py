@@ -1,7 +1,6 @@
 """Word文档处理模块，负责解析Word文档并提取文本内容"""
 
 import os
-import docx
 from typing import List, Dict, Any, Optional, Callable
 from config import DOCUMENT_CONFIG
 
@@ -41,6 +40,8 @@ class WordProcessor(BaseProcessor):
             raise FileNotFoundError(f"文件不存在: {file_path}")
 
         try:
+            import docx
+
             # 打开Word文件
             doc = docx.Document(file_path)
             text = ""
@@ -74,6 +75,8 @@ class WordProcessor(BaseProcessor):
             raise FileNotFoundError(f"文件不存在: {file_path}")
 
         try:
+            import docx
+
             doc = docx.Document(file_path)
             core_properties = doc.core_properties
             
@@ -114,13 +117,15 @@ class WordProcessor(BaseProcessor):
         if self.progress_callback:
             self.progress_callback("元数据提取完成", 0.6)
 
-        chunks = self.chunk_text(text)
+        chunks, offsets = self.chunk_segments([text])
         if self.progress_callback:
             self.progress_callback("分块完成", 1.0)
 
         # 保存处理结果到实例变量
         self.result = {
             "chunks": chunks,
+            "chunk_offsets": offsets,
+            "chunk_embeddings": self.chunk_embeddings,
             "metadata": metadata,
             "source": file_path,
             "source_type": "file",
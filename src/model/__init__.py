@@ -2,5 +2,9 @@
 
 from .llm import QwenLLM, OllamaLLM, create_llm
 from .embedding import SentenceEmbedding
+from .embedding_pool import EmbeddingExecutor
+from .reranker import CrossEncoderReranker
+from .registry import ModelRegistry, ModelHandle, get_model_registry
 
-__all__ = ["QwenLLM", "OllamaLLM","SentenceEmbedding", "create_llm"]
\ No newline at end of file
+__all__ = ["QwenLLM", "OllamaLLM","SentenceEmbedding", "EmbeddingExecutor", "CrossEncoderReranker", "create_llm",
+           "ModelRegistry", "ModelHandle", "get_model_registry"]
\ No newline at end of file
@@ -1,102 +1,268 @@
 """嵌入模型模块，负责生成文本的向量表示"""
 
 import os
-import torch
+import time
+import logging
+import threading
 import numpy as np
 from typing import List, Dict, Any, Optional
-from transformers import AutoTokenizer, AutoModel
-from config import VECTOR_STORE_CONFIG
+from config import VECTOR_STORE_CONFIG, MODEL_CONFIG
+from .embedding_cache import EmbeddingCache
+from .embedding_backend import TorchBackend, create_embedding_backend
+
+logger = logging.getLogger(__name__)
 
 
 class SentenceEmbedding:
     """句子嵌入模型，用于生成文本的向量表示"""
 
-    def __init__(self, model_name: str = "shibing624/text2vec-base-chinese"):
+    def __init__(self, model_name: str = "shibing624/text2vec-base-chinese", backend: str = None,
+                 use_cache: bool = True):
         """初始化句子嵌入模型
 
         Args:
             model_name: 模型名称，默认使用text2vec-base-chinese
+            backend: 推理后端，默认使用配置文件中的设置
+            use_cache: 是否使用磁盘嵌入缓存（还需配置中启用）
         """
         self.model_name = model_name
+        self.backend = backend or MODEL_CONFIG.get("embedding_backend", "torch")
         self.dimension = VECTOR_STORE_CONFIG["embedding_dimension"]
+        self.max_length = 512
+        self.batch_size = VECTOR_STORE_CONFIG["embedding_batch_size"]
+        self.max_batch_tokens = VECTOR_STORE_CONFIG["embedding_max_batch_tokens"]
+        
+        # 磁盘嵌入缓存，未变化的文本块无需重新推理
+        # 量化后端的输出与float32存在细微差异，缓存按后端区分
+        cache_name = model_name if self.backend == "torch" else f"{model_name}@{self.backend}"
+        self.cache = EmbeddingCache(cache_name, self.dimension) if use_cache and VECTOR_STORE_CONFIG["embedding_cache_enabled"] else None
         
         # 延迟加载模型，避免在初始化时就占用大量内存
         self.tokenizer = None
         self.model = None
+        # 实例在会话间共享，快速分词器和模型不能并发调用，推理按微批次串行
+        self._lock = threading.RLock()
     
     def load_model(self):
         """加载模型和分词器"""
-        if self.tokenizer is None or self.model is None:
+        with self._lock:
+            if self.tokenizer is not None and self.model is not None:
+                return
             try:
-                print(f"正在加载嵌入模型: {self.model_name}")
+                # transformers导入耗时较长，延迟到首次加载模型时
+                from transformers import AutoTokenizer
+
+                print(f"正在加载嵌入模型: {self.model_name} (后端: {self.backend})")
                 self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-                self.model = AutoModel.from_pretrained(self.model_name)
-                # 将模型设置为评估模式
-                self.model.eval()
+                model = create_embedding_backend(self.model_name, self.backend)
+                model.load()
+                self.model = model
                 print("嵌入模型加载完成")
             except Exception as e:
                 raise Exception(f"嵌入模型加载失败: {str(e)}")
     
-    def _mean_pooling(self, model_output, attention_mask):
-        """平均池化，将token级别的向量转换为句子级别的向量
+    def _mean_pooling(self, token_embeddings: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        """平均池化并归一化，将token级别的向量转换为句子级别的向量
 
         Args:
-            model_output: 模型输出
+            token_embeddings: token向量，形状为(batch, seq_len, hidden)
             attention_mask: 注意力掩码
 
         Returns:
-            句子向量
+            L2归一化后的句子向量
         """
-        # 获取token嵌入
-        token_embeddings = model_output[0]
-        
         # 扩展注意力掩码
-        input_mask_expanded = attention_mask.unsqueeze(-1).expand(token_embeddings.size()).float()
+        input_mask_expanded = attention_mask[..., None].astype(np.float32)
         
         # 对token嵌入进行掩码和求和
-        sum_embeddings = torch.sum(token_embeddings * input_mask_expanded, 1)
-        sum_mask = torch.clamp(input_mask_expanded.sum(1), min=1e-9)
+        sum_embeddings = np.einsum("bsh,bsi->bh", token_embeddings, input_mask_expanded)
+        sum_mask = np.clip(input_mask_expanded.sum(axis=1), 1e-9, None)
         
         # 计算平均值
-        return sum_embeddings / sum_mask
+        embeddings = sum_embeddings / sum_mask
+        
+        # 归一化嵌入
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return (embeddings / np.clip(norms, 1e-12, None)).astype(np.float32, copy=False)
     
-    def encode(self, texts: List[str]) -> List[List[float]]:
-        """将文本编码为向量
+    def _make_batches(self, lengths: List[int]) -> List[List[int]]:
+        """按token长度对文本排序并划分微批次
+
+        每个批次同时受文本数量和token预算（批次大小 × 批内最大长度）限制，
+        相近长度的文本放在同一批次以减少填充。
+
+        Args:
+            lengths: 每条文本的token长度
+
+        Returns:
+            批次列表，每个批次为原始文本下标列表
+        """
+        order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+        
+        batches = []
+        current = []
+        current_max = 0
+        for idx in order:
+            padded_length = max(current_max, lengths[idx])
+            if current and (
+                len(current) + 1 > self.batch_size
+                or (len(current) + 1) * padded_length > self.max_batch_tokens
+            ):
+                batches.append(current)
+                current = []
+                padded_length = lengths[idx]
+            current.append(idx)
+            current_max = padded_length
+        
+        if current:
+            batches.append(current)
+        return batches
+    
+    def _encode_batches(self, texts: List[str], batch_stats: Optional[List[Dict[str, Any]]] = None) -> np.ndarray:
+        """分桶微批次推理，结果按输入顺序返回
 
         Args:
             texts: 文本列表
+            batch_stats: 可选的列表，每个微批次追加一条耗时统计，便于调整批次参数
 
         Returns:
-            向量列表
+            形状为(len(texts), dimension)的float32矩阵
         """
         # 确保模型已加载
         if self.tokenizer is None or self.model is None:
             self.load_model()
         
-        # 对空列表进行处理
-        if not texts:
-            return []
+        # 一次性分词，不填充，后续按批次补齐
+        with self._lock:
+            encoded_all = self.tokenizer(texts, truncation=True, max_length=self.max_length)
+        lengths = [len(ids) for ids in encoded_all["input_ids"]]
+        batches = self._make_batches(lengths)
         
-        try:
-            # 对文本进行编码
-            encoded_input = self.tokenizer(texts, padding=True, truncation=True, return_tensors="pt", max_length=512)
-            
-            # 不计算梯度
-            with torch.no_grad():
-                model_output = self.model(**encoded_input)
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        
+        for batch_no, batch_indices in enumerate(batches, 1):
+            start_time = time.perf_counter()
             
-            # 计算句子嵌入
-            sentence_embeddings = self._mean_pooling(model_output, encoded_input["attention_mask"])
+            # 对当前批次进行填充，每个微批次单独持锁，大批量入库期间其他会话的查询可以插入
+            features = {key: [encoded_all[key][i] for i in batch_indices] for key in encoded_all.keys()}
+            with self._lock:
+                encoded_input = self.tokenizer.pad(features, padding=True, return_tensors="np")
+                token_embeddings = self.model.forward(dict(encoded_input))
             
-            # 归一化嵌入
-            sentence_embeddings = torch.nn.functional.normalize(sentence_embeddings, p=2, dim=1)
+            # 计算句子嵌入，并按原始顺序写回结果
+            embeddings[batch_indices] = self._mean_pooling(token_embeddings, encoded_input["attention_mask"])
             
-            # 转换为列表
-            return sentence_embeddings.tolist()
+            elapsed = time.perf_counter() - start_time
+            padded_length = encoded_input["input_ids"].shape[1]
+            if batch_stats is not None:
+                batch_stats.append({
+                    "batch": batch_no,
+                    "size": len(batch_indices),
+                    "padded_length": padded_length,
+                    "seconds": elapsed,
+                })
+            logger.debug("嵌入批次 %d/%d: %d条, 填充长度 %d, 耗时 %.1fms",
+                         batch_no, len(batches), len(batch_indices), padded_length, elapsed * 1000)
+        
+        return embeddings
+    
+    def encode_array(self, texts: List[str], batch_stats: Optional[List[Dict[str, Any]]] = None) -> np.ndarray:
+        """将文本编码为连续的float32向量矩阵
+
+        优先从嵌入缓存读取，未命中的文本按长度分桶后逐个微批次推理，
+        结果按输入顺序返回。
+
+        Args:
+            texts: 文本列表
+            batch_stats: 可选的列表，写入本次调用各微批次的耗时统计。
+                模型实例在会话间共享，统计按调用返回而不保存在实例上
+
+        Returns:
+            形状为(len(texts), dimension)的float32矩阵
+        """
+        # 对空列表进行处理
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        
+        try:
+            if self.cache is not None:
+                embeddings = self.cache.lookup_or_compute(
+                    texts, lambda missing: self._encode_batches(missing, batch_stats))
+            else:
+                embeddings = self._encode_batches(texts, batch_stats)
+            return np.ascontiguousarray(embeddings, dtype=np.float32)
         except Exception as e:
             print(f"生成嵌入向量失败: {str(e)}")
             # 返回零向量作为后备
-            return [[0.0] * self.dimension] * len(texts)
+            return np.zeros((len(texts), self.dimension), dtype=np.float32)
+    
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        """将文本编码为向量（列表形式的兼容接口）
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            向量列表
+        """
+        return self.encode_array(texts).tolist()
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """获取嵌入缓存的命中统计
+
+        Returns:
+            缓存统计字典，未启用缓存时返回空字典
+        """
+        return self.cache.stats() if self.cache is not None else {}
+    
+    def check_parity(self, texts: List[str], tolerance: float = 0.01) -> Dict[str, Any]:
+        """将当前后端与PyTorch float32参考实现对比，检查输出一致性和吞吐
+
+        参考实现与原始encode一致：整批填充、一次前向、平均池化并归一化。
+        两侧都绕过嵌入缓存。
+
+        Args:
+            texts: 用于对比的文本列表
+            tolerance: 允许的最大余弦距离（1 - 余弦相似度）
+
+        Returns:
+            包含最小余弦相似度、最大绝对误差、双方吞吐和是否通过的字典
+        """
+        if not texts:
+            raise ValueError("parity检查需要至少一条文本")
+        
+        if self.tokenizer is None or self.model is None:
+            self.load_model()
+        
+        if type(self.model) is TorchBackend:
+            reference_model = self.model
+        else:
+            reference_model = TorchBackend(self.model_name)
+            reference_model.load()
+        
+        start_time = time.perf_counter()
+        with self._lock:
+            encoded_input = self.tokenizer(texts, padding=True, truncation=True, return_tensors="np", max_length=self.max_length)
+            token_embeddings = reference_model.forward(dict(encoded_input))
+        reference = self._mean_pooling(token_embeddings, encoded_input["attention_mask"])
+        reference_seconds = time.perf_counter() - start_time
+        
+        start_time = time.perf_counter()
+        candidate = self._encode_batches(texts)
+        candidate_seconds = time.perf_counter() - start_time
+        
+        cosine = np.sum(reference * candidate, axis=1)
+        report = {
+            "backend": self.backend,
+            "count": len(texts),
+            "min_cosine": float(cosine.min()),
+            "max_abs_diff": float(np.abs(reference - candidate).max()),
+            "reference_chunks_per_sec": len(texts) / reference_seconds,
+            "backend_chunks_per_sec": len(texts) / candidate_seconds,
+            "speedup": reference_seconds / candidate_seconds,
+        }
+        report["passed"] = report["min_cosine"] >= 1.0 - tolerance
+        return report
     
     def encode_query(self, query: str) -> List[float]:
         """将查询文本编码为向量
@@ -107,5 +273,4 @@ class SentenceEmbedding:
         Returns:
             查询向量
         """
-        embeddings = self.encode([query])
-        return embeddings[0] if embeddings else [0.0] * self.dimension
\ No newline at end of file
+        return self.encode_array([query])[0].tolist()
\ No newline at end of file
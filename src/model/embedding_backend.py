@@ -0,0 +1,184 @@
+"""嵌入模型推理后端，支持PyTorch、ONNX Runtime及int8动态量化"""
+
+import os
+import re
+import numpy as np
+from abc import ABC, abstractmethod
+from typing import Dict
+from config import MODEL_CACHE_DIR, MODEL_CONFIG
+
+
+class EmbeddingBackend(ABC):
+    """嵌入推理后端抽象基类
+
+    各后端接收分词器输出的numpy数组，返回float32的token级向量，
+    池化和归一化由SentenceEmbedding统一完成，保证各后端输出口径一致。
+    """
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.num_threads = MODEL_CONFIG.get("embedding_num_threads")
+
+    @abstractmethod
+    def load(self) -> None:
+        """加载模型"""
+        pass
+
+    @abstractmethod
+    def forward(self, encoded_input: Dict[str, np.ndarray]) -> np.ndarray:
+        """执行前向推理
+
+        Args:
+            encoded_input: 分词器输出，包含input_ids、attention_mask等
+
+        Returns:
+            形状为(batch, seq_len, hidden)的token向量
+        """
+        pass
+
+
+class TorchBackend(EmbeddingBackend):
+    """PyTorch float32推理后端"""
+
+    def __init__(self, model_name: str):
+        super().__init__(model_name)
+        self.model = None
+
+    def load(self) -> None:
+        import torch
+        from transformers import AutoModel
+
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+        self.model = AutoModel.from_pretrained(self.model_name)
+        # 将模型设置为评估模式
+        self.model.eval()
+
+    def forward(self, encoded_input: Dict[str, np.ndarray]) -> np.ndarray:
+        import torch
+
+        inputs = {key: torch.from_numpy(np.asarray(value, dtype=np.int64)) for key, value in encoded_input.items()}
+        # 不计算梯度
+        with torch.inference_mode():
+            model_output = self.model(**inputs)
+        return model_output[0].float().numpy()
+
+
+class QuantizedTorchBackend(TorchBackend):
+    """PyTorch int8动态量化推理后端，对所有Linear层做动态量化"""
+
+    def load(self) -> None:
+        import torch
+
+        super().load()
+        self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class ONNXBackend(EmbeddingBackend):
+    """ONNX Runtime推理后端
+
+    首次使用时将模型导出为ONNX图并缓存到MODEL_CACHE_DIR，
+    quantize为True时额外生成int8动态量化的图。
+    """
+
+    def __init__(self, model_name: str, quantize: bool = False):
+        super().__init__(model_name)
+        self.quantize = quantize
+        self.session = None
+        self.input_names = []
+
+        safe_name = re.sub(r"[^0-9A-Za-z_.-]", "_", model_name)
+        self.export_dir = os.path.join(MODEL_CACHE_DIR, safe_name)
+        self.onnx_path = os.path.join(self.export_dir, "model.onnx")
+        self.int8_path = os.path.join(self.export_dir, "model.int8.onnx")
+
+    def _export(self) -> None:
+        """将PyTorch模型导出为ONNX图"""
+        import torch
+        from transformers import AutoModel
+
+        print(f"正在导出ONNX模型: {self.onnx_path}")
+        os.makedirs(self.export_dir, exist_ok=True)
+
+        class _LastHiddenState(torch.nn.Module):
+            """只输出last_hidden_state，便于导出"""
+
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+
+            def forward(self, input_ids, attention_mask, token_type_ids):
+                return self.model(input_ids=input_ids, attention_mask=attention_mask,
+                                  token_type_ids=token_type_ids)[0]
+
+        model = AutoModel.from_pretrained(self.model_name)
+        model.eval()
+        dummy = torch.ones((1, 8), dtype=torch.int64)
+        input_names = ["input_ids", "attention_mask", "token_type_ids"]
+        torch.onnx.export(
+            _LastHiddenState(model),
+            (dummy, dummy, torch.zeros_like(dummy)),
+            self.onnx_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]},
+            opset_version=14,
+        )
+
+    def _quantize(self) -> None:
+        """对ONNX图做int8动态量化"""
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        print(f"正在量化ONNX模型: {self.int8_path}")
+        quantize_dynamic(self.onnx_path, self.int8_path, weight_type=QuantType.QInt8)
+
+    def load(self) -> None:
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("使用ONNX后端需要安装onnxruntime: pip install onnxruntime")
+
+        if not os.path.exists(self.onnx_path):
+            self._export()
+        if self.quantize and not os.path.exists(self.int8_path):
+            self._quantize()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.num_threads:
+            options.intra_op_num_threads = self.num_threads
+
+        path = self.int8_path if self.quantize else self.onnx_path
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [item.name for item in self.session.get_inputs()]
+
+    def forward(self, encoded_input: Dict[str, np.ndarray]) -> np.ndarray:
+        feeds = {}
+        for name in self.input_names:
+            if name in encoded_input:
+                feeds[name] = np.asarray(encoded_input[name], dtype=np.int64)
+            else:
+                feeds[name] = np.zeros_like(np.asarray(encoded_input["input_ids"], dtype=np.int64))
+        return self.session.run(None, feeds)[0].astype(np.float32, copy=False)
+
+
+def create_embedding_backend(model_name: str, backend: str = None) -> EmbeddingBackend:
+    """嵌入后端工厂方法，根据配置创建对应的推理后端
+
+    Args:
+        model_name: 模型名称
+        backend: 后端名称，可选 "torch"、"torch_int8"、"onnx"、"onnx_int8"，默认使用配置文件中的设置
+
+    Returns:
+        推理后端实例
+    """
+    backend = backend or MODEL_CONFIG.get("embedding_backend", "torch")
+    if backend == "torch":
+        return TorchBackend(model_name)
+    if backend == "torch_int8":
+        return QuantizedTorchBackend(model_name)
+    if backend == "onnx":
+        return ONNXBackend(model_name)
+    if backend == "onnx_int8":
+        return ONNXBackend(model_name, quantize=True)
+    raise ValueError(f"不支持的嵌入后端: {backend}")
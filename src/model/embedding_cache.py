@@ -0,0 +1,258 @@
+"""嵌入向量缓存模块，基于内容哈希持久化缓存文本向量"""
+
+import os
+import re
+import json
+import time
+import atexit
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Callable
+from config import EMBEDDING_CACHE_DIR, VECTOR_STORE_CONFIG
+
+
+# 索引写回磁盘的最短间隔（秒）和触发立即写回的未持久化条目数
+FLUSH_INTERVAL = 30.0
+FLUSH_PENDING_ENTRIES = 4096
+
+
+class EmbeddingCache:
+    """磁盘嵌入向量缓存
+
+    以(模型名称, 规范化文本哈希)为键，向量保存在内存映射的float32文件中，
+    键到槽位的映射保存在JSON索引中。缓存按条目数上限做LRU淘汰，
+    被淘汰条目的槽位直接复用。
+
+    索引只定期写回，而槽位在淘汰时立即被覆盖，进程崩溃后磁盘上的索引可能把键指向
+    已存放其他文本向量的槽位。因此每个槽位同时记录所存向量的键哈希，读取时核对，
+    不一致的条目视为未命中。
+    """
+
+    def __init__(self, model_name: str, dimension: int,
+                 max_entries: int = None, cache_dir: str = None):
+        """初始化嵌入缓存
+
+        Args:
+            model_name: 模型名称，作为缓存键的一部分
+            dimension: 向量维度
+            max_entries: 最大缓存条目数，默认使用配置文件中的设置
+            cache_dir: 缓存目录，默认使用配置文件中的设置
+        """
+        self.model_name = model_name
+        self.dimension = dimension
+        self.max_entries = max_entries or VECTOR_STORE_CONFIG["embedding_cache_max_entries"]
+        self.cache_dir = cache_dir or EMBEDDING_CACHE_DIR
+
+        safe_name = re.sub(r"[^0-9A-Za-z_.-]", "_", model_name)
+        self.vector_path = os.path.join(self.cache_dir, f"{safe_name}.f32")
+        self.index_path = os.path.join(self.cache_dir, f"{safe_name}.index.json")
+        self.key_path = os.path.join(self.cache_dir, f"{safe_name}.keys")
+
+        self.hits = 0
+        self.misses = 0
+
+        # 延迟打开缓存文件，避免在初始化时就占用磁盘和内存
+        self._vectors = None
+        self._slot_keys = None  # 每个槽位所存向量的键哈希（32字节）
+        self._index = OrderedDict()  # key -> slot，按访问顺序排列（末尾为最近使用）
+        self._next_slot = 0
+        self._free_slots = []  # 核对失败后空出的槽位
+        self._atexit_registered = False
+        self._dirty = False
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _open(self):
+        """打开（或创建）向量文件和索引"""
+        if self._vectors is not None:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # 进程退出时写回未持久化的条目，clear后重新打开时不再重复注册
+        if not self._atexit_registered:
+            atexit.register(self.flush)
+            self._atexit_registered = True
+
+        index = None
+        if all(os.path.exists(path) for path in (self.index_path, self.vector_path, self.key_path)):
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+                # 维度或容量变化时旧缓存不可用
+                if index.get("dimension") != self.dimension or index.get("max_entries") != self.max_entries:
+                    print("嵌入缓存参数已变化，重建缓存")
+                    index = None
+            except Exception as e:
+                print(f"加载嵌入缓存索引失败，重建缓存: {e}")
+                index = None
+
+        shape = (self.max_entries, self.dimension)
+        key_shape = (self.max_entries, 32)
+        self._free_slots = []
+        if index is None:
+            self._vectors = np.memmap(self.vector_path, dtype=np.float32, mode="w+", shape=shape)
+            self._slot_keys = np.memmap(self.key_path, dtype=np.uint8, mode="w+", shape=key_shape)
+            self._index = OrderedDict()
+            self._next_slot = 0
+            self._dirty = True
+        else:
+            self._vectors = np.memmap(self.vector_path, dtype=np.float32, mode="r+", shape=shape)
+            self._slot_keys = np.memmap(self.key_path, dtype=np.uint8, mode="r+", shape=key_shape)
+            self._index = OrderedDict((key, slot) for key, slot in index["entries"])
+            self._next_slot = index["next_slot"]
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """规范化文本：去除首尾空白并合并连续空白"""
+        return " ".join(text.split())
+
+    def make_key(self, text: str) -> str:
+        """计算文本的缓存键"""
+        content = f"{self.model_name}\0{self.normalize_text(text)}"
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """批量查询缓存
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            与输入对应的向量列表，未命中的位置为None
+        """
+        with self._lock:
+            self._open()
+            results = []
+            for text in texts:
+                key = self.make_key(text)
+                slot = self._index.get(key)
+                if slot is not None and self._slot_keys[slot].tobytes() != bytes.fromhex(key):
+                    # 槽位已被其他文本的向量覆盖，索引条目作废
+                    del self._index[key]
+                    self._free_slots.append(slot)
+                    self._dirty = True
+                    slot = None
+                if slot is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    self._index.move_to_end(key)
+                    results.append(np.array(self._vectors[slot]))
+            return results
+
+    def put_many(self, texts: List[str], vectors) -> None:
+        """批量写入缓存
+
+        Args:
+            texts: 文本列表
+            vectors: 与文本对应的向量
+        """
+        with self._lock:
+            self._open()
+            for text, vector in zip(texts, vectors):
+                key = self.make_key(text)
+                slot = self._index.get(key)
+                if slot is None:
+                    if self._free_slots:
+                        slot = self._free_slots.pop()
+                    elif self._next_slot < self.max_entries:
+                        slot = self._next_slot
+                        self._next_slot += 1
+                    else:
+                        # 淘汰最久未使用的条目并复用其槽位
+                        _, slot = self._index.popitem(last=False)
+                self._vectors[slot] = np.asarray(vector, dtype=np.float32)
+                self._slot_keys[slot] = np.frombuffer(bytes.fromhex(key), dtype=np.uint8)
+                self._index[key] = slot
+                self._index.move_to_end(key)
+            self._dirty = True
+            self._pending += len(texts)
+
+    def lookup_or_compute(self, texts: List[str],
+                          compute_fn: Callable[[List[str]], Any]) -> np.ndarray:
+        """查询缓存，仅对未命中的文本调用compute_fn并回写缓存
+
+        Args:
+            texts: 文本列表
+            compute_fn: 计算向量的函数，接受文本列表并返回向量序列
+
+        Returns:
+            形状为(len(texts), dimension)的float32矩阵
+        """
+        cached = self.get_many(texts)
+        result = np.empty((len(texts), self.dimension), dtype=np.float32)
+
+        missing = []
+        for i, vector in enumerate(cached):
+            if vector is None:
+                missing.append(i)
+            else:
+                result[i] = vector
+
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            computed = np.asarray(compute_fn(missing_texts), dtype=np.float32)
+            result[missing] = computed
+            self.put_many(missing_texts, computed)
+            self.maybe_flush()
+
+        return result
+
+    def maybe_flush(self) -> None:
+        """积累足够多的新条目或距上次写回超过一定时间后才写回，避免每次查询都重写索引"""
+        if self._pending >= FLUSH_PENDING_ENTRIES or time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self) -> None:
+        """将向量文件和索引写回磁盘"""
+        with self._lock:
+            if self._vectors is None or not self._dirty:
+                return
+            self._vectors.flush()
+            self._slot_keys.flush()
+
+            index = {
+                "model_name": self.model_name,
+                "dimension": self.dimension,
+                "max_entries": self.max_entries,
+                "next_slot": self._next_slot,
+                "entries": list(self._index.items()),
+            }
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(index, f)
+            os.replace(tmp_path, self.index_path)
+            self._dirty = False
+            self._pending = 0
+            self._last_flush = time.monotonic()
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._vectors = None
+            self._slot_keys = None
+            self._index = OrderedDict()
+            self._next_slot = 0
+            self._free_slots = []
+            for path in (self.vector_path, self.index_path, self.key_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存命中统计
+
+        Returns:
+            包含命中数、未命中数、命中率和当前条目数的字典
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._index),
+            "max_entries": self.max_entries,
+        }
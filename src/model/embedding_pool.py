@@ -0,0 +1,277 @@
+"""多进程嵌入执行器，用于大批量文档入库时并行生成向量"""
+
+import os
+import queue
+import threading
+import itertools
+import multiprocessing as mp
+import numpy as np
+from multiprocessing import shared_memory
+from concurrent.futures import Future
+from typing import List, Dict, Any, Optional, Tuple
+from config import VECTOR_STORE_CONFIG, MODEL_CONFIG
+
+
+def _worker_main(model_name: str, backend: str, num_threads: int,
+                 task_queue, result_queue) -> None:
+    """工作进程入口：加载一次模型，循环处理任务队列中的批次
+
+    Args:
+        model_name: 嵌入模型名称
+        backend: 推理后端
+        num_threads: 每个进程的推理线程数
+        task_queue: 任务队列，元素为(task_id, texts, shm_name)，None表示退出
+        result_queue: 结果队列，元素为(task_id, error)；模型加载失败时task_id为None
+    """
+    # 固定每个进程的线程数，避免多个进程之间争抢CPU
+    MODEL_CONFIG["embedding_num_threads"] = num_threads
+    os.environ["OMP_NUM_THREADS"] = str(num_threads)
+
+    from .embedding import SentenceEmbedding
+
+    # 缓存由主进程统一查询和写入
+    try:
+        model = SentenceEmbedding(model_name, backend=backend, use_cache=False)
+        model.load_model()
+    except Exception as e:
+        result_queue.put((None, f"加载嵌入模型失败: {e}"))
+        return
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+
+        task_id, texts, shm_name = task
+        try:
+            vectors = model._encode_batches(texts)
+            shm = shared_memory.SharedMemory(name=shm_name)
+            try:
+                np.ndarray(vectors.shape, dtype=np.float32, buffer=shm.buf)[:] = vectors
+            finally:
+                shm.close()
+            result_queue.put((task_id, None))
+        except Exception as e:
+            result_queue.put((task_id, str(e)))
+
+
+class EmbeddingExecutor:
+    """多进程嵌入执行器
+
+    启动N个工作进程，每个进程加载一次嵌入模型并固定推理线程数。
+    批次通过任务队列分发，向量通过共享内存回传，避免序列化大数组。
+    """
+
+    def __init__(self,
+                 num_workers: int = None,
+                 threads_per_worker: int = None,
+                 model_name: str = "shibing624/text2vec-base-chinese",
+                 backend: str = None,
+                 cache=None):
+        """初始化嵌入执行器
+
+        Args:
+            num_workers: 工作进程数，默认使用配置文件中的设置
+            threads_per_worker: 每个工作进程的推理线程数，默认使用配置文件中的设置
+            model_name: 嵌入模型名称
+            backend: 推理后端，默认使用配置文件中的设置
+            cache: 可选的EmbeddingCache，在主进程中查询和回写
+        """
+        self.num_workers = num_workers or VECTOR_STORE_CONFIG["embedding_workers"]
+        self.threads_per_worker = threads_per_worker or VECTOR_STORE_CONFIG["embedding_worker_threads"]
+        self.task_size = VECTOR_STORE_CONFIG["embedding_task_size"]
+        self.model_name = model_name
+        self.backend = backend or MODEL_CONFIG.get("embedding_backend", "torch")
+        self.dimension = VECTOR_STORE_CONFIG["embedding_dimension"]
+        self.task_timeout = VECTOR_STORE_CONFIG["embedding_task_timeout"]
+        self.cache = cache
+
+        # 延迟启动工作进程
+        self._context = mp.get_context("spawn")
+        self._workers = []
+        self._task_queue = None
+        self._result_queue = None
+        self._collector = None
+        self._pending = {}  # task_id -> (future, shm, shape)
+        self._task_ids = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def started(self) -> bool:
+        return bool(self._workers)
+
+    def start(self) -> None:
+        """启动工作进程和结果收集线程"""
+        with self._lock:
+            if self._workers:
+                return
+
+            print(f"正在启动嵌入工作进程: {self.num_workers}个，每个{self.threads_per_worker}线程")
+            self._task_queue = self._context.Queue()
+            self._result_queue = self._context.Queue()
+            for _ in range(self.num_workers):
+                worker = self._context.Process(
+                    target=_worker_main,
+                    args=(self.model_name, self.backend, self.threads_per_worker,
+                          self._task_queue, self._result_queue),
+                    daemon=True,
+                )
+                worker.start()
+                self._workers.append(worker)
+
+            self._collector = threading.Thread(target=self._collect_results, daemon=True)
+            self._collector.start()
+
+    def _collect_results(self) -> None:
+        """结果收集线程：从共享内存取回向量并完成对应的Future
+
+        工作进程加载模型失败或意外退出时，它手上的任务不会再有结果，
+        此时让所有未完成的Future以异常结束并停止工作进程，下次提交时重新启动。
+        """
+        result_queue = self._result_queue
+        while True:
+            try:
+                item = result_queue.get(timeout=1.0)
+            except queue.Empty:
+                with self._lock:
+                    workers = list(self._workers)
+                if not workers:
+                    break
+                dead = [worker for worker in workers if not worker.is_alive()]
+                if dead:
+                    self._abort(f"嵌入工作进程意外退出（退出码 {dead[0].exitcode}）")
+                    break
+                continue
+            except (EOFError, OSError):
+                break
+
+            if item is None:
+                break
+
+            task_id, error = item
+            if task_id is None:
+                self._abort(error)
+                break
+            with self._lock:
+                entry = self._pending.pop(task_id, None)
+            if entry is None:
+                continue
+            future, shm, shape = entry
+            try:
+                if error is None:
+                    future.set_result(np.ndarray(shape, dtype=np.float32, buffer=shm.buf).copy())
+                else:
+                    future.set_exception(Exception(f"嵌入工作进程出错: {error}"))
+            finally:
+                shm.close()
+                shm.unlink()
+
+    def _abort(self, error: str) -> None:
+        """停止全部工作进程，未完成的Future以异常结束"""
+        with self._lock:
+            workers, self._workers = self._workers, []
+            pending, self._pending = self._pending, {}
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        for future, shm, _ in pending.values():
+            future.set_exception(RuntimeError(f"嵌入工作进程出错: {error}"))
+            shm.close()
+            shm.unlink()
+        print(f"嵌入工作进程已停止: {error}")
+
+    def submit(self, texts: List[str]) -> Future:
+        """提交一个批次
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            Future，结果为形状(len(texts), dimension)的float32矩阵
+        """
+        return self._submit(texts)[1]
+
+    def _submit(self, texts: List[str]) -> Tuple[Optional[int], Future]:
+        """提交一个批次，返回(任务ID, Future)，空批次的任务ID为None"""
+        if not self._workers:
+            self.start()
+
+        future = Future()
+        if not texts:
+            future.set_result(np.empty((0, self.dimension), dtype=np.float32))
+            return None, future
+
+        shape = (len(texts), self.dimension)
+        shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 4)
+        task_id = next(self._task_ids)
+        with self._lock:
+            self._pending[task_id] = (future, shm, shape)
+        self._task_queue.put((task_id, list(texts), shm.name))
+        return task_id, future
+
+    def _discard(self, task_ids: List[int]) -> None:
+        """放弃尚未完成的任务：取消Future并释放共享内存
+
+        工作进程之后送回的结果找不到对应条目，由结果收集线程直接忽略。
+        """
+        with self._lock:
+            entries = [self._pending.pop(task_id, None) for task_id in task_ids]
+        for entry in entries:
+            if entry is None:
+                continue
+            future, shm, _ = entry
+            future.cancel()
+            shm.close()
+            shm.unlink()
+
+    def _encode_parallel(self, texts: List[str]) -> np.ndarray:
+        """将文本切分为任务分发到工作进程，按原始顺序拼接结果
+
+        每个任务最多等待task_timeout秒，超时抛出concurrent.futures.TimeoutError，
+        并放弃本次调用中尚未完成的任务。
+        """
+        tasks = [self._submit(texts[i:i + self.task_size]) for i in range(0, len(texts), self.task_size)]
+        try:
+            return np.concatenate([future.result(timeout=self.task_timeout) for _, future in tasks], axis=0)
+        except BaseException:
+            self._discard([task_id for task_id, _ in tasks if task_id is not None])
+            raise
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """并行编码文本，结果按输入顺序返回
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            形状为(len(texts), dimension)的float32矩阵
+        """
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        if self.cache is not None:
+            return self.cache.lookup_or_compute(texts, self._encode_parallel)
+        return self._encode_parallel(texts)
+
+    def shutdown(self) -> None:
+        """停止所有工作进程"""
+        with self._lock:
+            workers, self._workers = self._workers, []
+        if not workers:
+            return
+
+        for _ in workers:
+            self._task_queue.put(None)
+        for worker in workers:
+            worker.join(timeout=10)
+            if worker.is_alive():
+                worker.terminate()
+        self._result_queue.put(None)
+        print("嵌入工作进程已停止")
+
+    def stats(self) -> Dict[str, Any]:
+        """获取执行器状态"""
+        return {
+            "workers": len(self._workers),
+            "threads_per_worker": self.threads_per_worker,
+            "pending_tasks": len(self._pending),
+        }
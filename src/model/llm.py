@@ -1,11 +1,9 @@
 """大模型模块，支持多种LLM调用方式"""
 
 import os
-import torch
 import requests
 from typing import List, Dict, Any, Optional
 from abc import ABC, abstractmethod
-from transformers import AutoTokenizer, AutoModelForCausalLM
 from config import MODEL_CONFIG
 
 
@@ -47,6 +45,10 @@ class QwenLLM(BaseLLM):
         """加载模型和分词器"""
         if self.tokenizer is None or self.model is None:
             try:
+                # torch和transformers导入耗时较长，延迟到首次加载模型时
+                import torch
+                from transformers import AutoTokenizer, AutoModelForCausalLM
+
                 print(f"正在加载模型: {self.model_name}")
                 self.tokenizer = AutoTokenizer.from_pretrained(self.model_name, trust_remote_code=True)
                 self.model = AutoModelForCausalLM.from_pretrained(
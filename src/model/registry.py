@@ -0,0 +1,210 @@
+"""进程级模型注册表，在多个会话之间共享模型和向量存储"""
+
+import gc
+import time
+import weakref
+import threading
+from typing import Any, Callable, Dict, Optional
+from config import MODEL_CONFIG
+
+
+class _Entry:
+    """注册表条目"""
+
+    def __init__(self, factory: Callable[[], Any], unloader: Optional[Callable[[Any], None]]):
+        self.factory = factory
+        self.unloader = unloader
+        self.value = None
+        self.loaded = False
+        # 条目级加载锁，加载耗时较长的对象时不阻塞其他条目的读取
+        self.load_lock = threading.Lock()
+        self.refcount = 0
+        self.last_used = time.monotonic()
+
+
+class ModelHandle:
+    """模型句柄，会话中只保存句柄
+
+    句柄被回收（例如会话结束、session_state被清理）时自动释放引用计数。
+    """
+
+    def __init__(self, registry: "ModelRegistry", key: str):
+        self.key = key
+        self._registry = registry
+        self._finalizer = weakref.finalize(self, registry.release, key)
+
+    @property
+    def value(self) -> Any:
+        """获取共享对象，必要时重新加载"""
+        return self._registry.get(self.key)
+
+    def release(self) -> None:
+        """主动释放句柄"""
+        self._finalizer()
+
+
+class ModelRegistry:
+    """进程级模型注册表
+
+    每个键对应的对象只加载一次，按持有句柄的会话计数；
+    引用计数归零且空闲超过TTL的对象会被卸载。
+    """
+
+    def __init__(self, idle_ttl: float = None):
+        """初始化注册表
+
+        Args:
+            idle_ttl: 空闲对象的保留时间（秒），默认使用配置文件中的设置
+        """
+        self.idle_ttl = idle_ttl if idle_ttl is not None else MODEL_CONFIG["registry_idle_ttl"]
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.RLock()
+        self._reaper = None
+
+    def register(self, key: str, factory: Callable[[], Any],
+                 unloader: Optional[Callable[[Any], None]] = None) -> None:
+        """注册对象的构造方式，已注册的键保持不变
+
+        Args:
+            key: 对象键
+            factory: 构造函数
+            unloader: 卸载前调用的清理函数
+        """
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = _Entry(factory, unloader)
+
+    def acquire(self, key: str, factory: Callable[[], Any] = None,
+                unloader: Optional[Callable[[Any], None]] = None) -> ModelHandle:
+        """获取对象句柄并增加引用计数
+
+        Args:
+            key: 对象键
+            factory: 首次注册时使用的构造函数
+            unloader: 首次注册时使用的清理函数
+
+        Returns:
+            模型句柄
+        """
+        with self._lock:
+            if key not in self._entries:
+                if factory is None:
+                    raise KeyError(f"未注册的模型: {key}")
+                self.register(key, factory, unloader)
+            entry = self._entries[key]
+            entry.refcount += 1
+            entry.last_used = time.monotonic()
+        self._ensure_reaper()
+        return ModelHandle(self, key)
+
+    def get(self, key: str) -> Any:
+        """获取共享对象，未加载时调用构造函数加载
+
+        构造函数在条目自己的锁内执行，不持有注册表锁：加载大模型期间，
+        其他会话读取已加载的对象不受影响，同一对象也只会加载一次。
+
+        Args:
+            key: 对象键
+
+        Returns:
+            共享对象
+        """
+        with self._lock:
+            entry = self._entries[key]
+            entry.last_used = time.monotonic()
+            if entry.loaded:
+                return entry.value
+
+        with entry.load_lock:
+            with self._lock:
+                if entry.loaded:
+                    return entry.value
+            print(f"注册表加载: {key}")
+            value = entry.factory()
+            with self._lock:
+                entry.value = value
+                entry.loaded = True
+                entry.last_used = time.monotonic()
+                return value
+
+    def is_loaded(self, key: str) -> bool:
+        """对象是否已加载"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry.loaded
+
+    def release(self, key: str) -> None:
+        """减少引用计数"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.refcount > 0:
+                entry.refcount -= 1
+                entry.last_used = time.monotonic()
+
+    def unload(self, key: str) -> None:
+        """卸载对象，保留注册信息以便下次按需重新加载"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not entry.loaded:
+                return
+            value, entry.value, entry.loaded = entry.value, None, False
+
+        if entry.unloader is not None:
+            try:
+                entry.unloader(value)
+            except Exception as e:
+                print(f"卸载 {key} 时清理失败: {e}")
+        del value
+        gc.collect()
+        print(f"注册表卸载空闲对象: {key}")
+
+    def sweep(self) -> None:
+        """卸载无人引用且空闲超过TTL的对象"""
+        now = time.monotonic()
+        with self._lock:
+            idle_keys = [
+                key for key, entry in self._entries.items()
+                if entry.loaded and entry.refcount == 0 and now - entry.last_used > self.idle_ttl
+            ]
+        for key in idle_keys:
+            self.unload(key)
+
+    def _ensure_reaper(self) -> None:
+        """启动后台清理线程"""
+        with self._lock:
+            if self._reaper is not None or self.idle_ttl <= 0:
+                return
+            self._reaper = threading.Thread(target=self._reap_loop, daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self) -> None:
+        interval = max(1.0, min(60.0, self.idle_ttl / 2))
+        while True:
+            time.sleep(interval)
+            self.sweep()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取各对象的加载状态和引用计数"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                key: {
+                    "loaded": entry.loaded,
+                    "refcount": entry.refcount,
+                    "idle_seconds": now - entry.last_used,
+                }
+                for key, entry in self._entries.items()
+            }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    """获取进程级注册表单例"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
@@ -0,0 +1,143 @@
+"""交叉编码器重排序模块，对检索候选进行精排"""
+
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import List, Dict, Any, Tuple
+from config import MODEL_CONFIG
+
+
+class CrossEncoderReranker:
+    """交叉编码器重排序器
+
+    对(查询, 文本块)成对打分，按批次在CPU上推理；打分结果按(查询, 文本块ID)缓存在LRU中，
+    超出延迟预算时停止打分，未打分的候选按原顺序排在已打分候选之后。
+    """
+
+    def __init__(self, model_name: str = None):
+        """初始化重排序器
+
+        Args:
+            model_name: 交叉编码器模型名称，默认使用配置文件中的设置
+        """
+        self.model_name = model_name or MODEL_CONFIG["reranker_model"]
+        self.batch_size = MODEL_CONFIG["reranker_batch_size"]
+        self.max_length = MODEL_CONFIG["reranker_max_length"]
+        self.cache_size = MODEL_CONFIG["reranker_cache_size"]
+
+        # 延迟加载模型
+        self.tokenizer = None
+        self.model = None
+
+        self._cache = OrderedDict()  # (query, chunk_id) -> score
+        self._lock = threading.Lock()
+        # 实例在会话间共享，快速分词器和模型不能并发调用，打分按批次串行
+        self._model_lock = threading.Lock()
+
+    def load_model(self):
+        """加载模型和分词器"""
+        with self._model_lock:
+            if self.tokenizer is not None and self.model is not None:
+                return
+            try:
+                import torch
+                from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+                print(f"正在加载重排序模型: {self.model_name}")
+                if MODEL_CONFIG.get("embedding_num_threads"):
+                    torch.set_num_threads(MODEL_CONFIG["embedding_num_threads"])
+                self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                self.model = AutoModelForSequenceClassification.from_pretrained(self.model_name)
+                self.model.eval()
+                print("重排序模型加载完成")
+            except Exception as e:
+                raise Exception(f"重排序模型加载失败: {str(e)}")
+
+    def _score_pairs(self, query: str, texts: List[str]) -> np.ndarray:
+        """对一批(查询, 文本)打分
+
+        Returns:
+            经过sigmoid映射到[0, 1]的相关性分数
+        """
+        import torch
+
+        with self._model_lock:
+            encoded_input = self.tokenizer(
+                [query] * len(texts), texts,
+                padding=True, truncation="only_second", max_length=self.max_length, return_tensors="pt"
+            )
+            with torch.inference_mode():
+                logits = self.model(**encoded_input).logits
+        # 单输出的模型直接取logit，多分类模型取最后一类（相关）
+        logits = logits[:, -1] if logits.shape[-1] > 1 else logits[:, 0]
+        return torch.sigmoid(logits.float()).numpy()
+
+    def rerank(self, query: str, candidates: List[Dict[str, Any]], k: int,
+               budget_ms: float = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """对候选重排序
+
+        Args:
+            query: 查询文本
+            candidates: 检索候选，需要包含id和content
+            k: 返回的文档数量
+            budget_ms: 延迟预算（毫秒），默认使用配置文件中的设置
+
+        Returns:
+            (重排后的前k个候选, 重排统计)，候选中增加rerank_score字段
+        """
+        budget_ms = budget_ms if budget_ms is not None else MODEL_CONFIG["reranker_budget_ms"]
+        start_time = time.perf_counter()
+
+        scores = {}
+        with self._lock:
+            for candidate in candidates:
+                key = (query, candidate["id"])
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[candidate["id"]] = self._cache[key]
+        cached_count = len(scores)
+
+        pending = [candidate for candidate in candidates if candidate["id"] not in scores]
+        truncated = False
+        if pending:
+            # 模型加载时间不计入打分预算
+            self.load_model()
+        score_start = time.perf_counter()
+        for start in range(0, len(pending), self.batch_size):
+            if (time.perf_counter() - score_start) * 1000 > budget_ms:
+                truncated = True
+                break
+            batch = pending[start:start + self.batch_size]
+            batch_scores = self._score_pairs(query, [candidate["content"] for candidate in batch])
+            with self._lock:
+                for candidate, score in zip(batch, batch_scores):
+                    scores[candidate["id"]] = float(score)
+                    self._cache[(query, candidate["id"])] = float(score)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        # 已打分的候选按分数降序，未打分的保持原顺序排在后面
+        scored = [candidate for candidate in candidates if candidate["id"] in scores]
+        unscored = [candidate for candidate in candidates if candidate["id"] not in scores]
+        scored.sort(key=lambda candidate: scores[candidate["id"]], reverse=True)
+
+        results = []
+        for candidate in (scored + unscored)[:k]:
+            result = dict(candidate)
+            result["rerank_score"] = scores.get(candidate["id"])
+            results.append(result)
+
+        stats = {
+            "rerank_ms": (time.perf_counter() - start_time) * 1000,
+            "rerank_candidates": len(candidates),
+            "rerank_scored": len(scores) - cached_count,
+            "rerank_cached": cached_count,
+            "rerank_truncated": truncated,
+        }
+        return results, stats
+
+    def clear_cache(self) -> None:
+        """清空打分缓存"""
+        with self._lock:
+            self._cache.clear()
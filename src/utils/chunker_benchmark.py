@@ -0,0 +1,125 @@
+"""分块器微基准，比较基于偏移的TextChunker与原先按字符串拼接实现的吞吐量"""
+
+import re
+import time
+import random
+from typing import List, Dict, Any, Optional
+from config import DOCUMENT_CONFIG
+from .text_chunker import TextChunker
+
+
+class LegacyTextChunker:
+    """原先的分块实现，逐句拼接字符串并在分块后另建一份带重叠的列表，仅作为基准保留"""
+
+    def __init__(self, chunk_size: int, chunk_overlap: int):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def split_text(self, text: str) -> List[str]:
+        paragraphs = [p.strip() + '\n' for p in re.split(r'\n\s*\n', text) if p.strip()]
+        chunks = []
+        current_chunk = ""
+        for para in paragraphs:
+            if len(para) > self.chunk_size:
+                for sent in self._split_sentences(para):
+                    if len(current_chunk) + len(sent) <= self.chunk_size:
+                        current_chunk += sent
+                    else:
+                        if current_chunk:
+                            chunks.append(current_chunk)
+                        current_chunk = sent
+            else:
+                if len(current_chunk) + len(para) > self.chunk_size:
+                    chunks.append(current_chunk)
+                    current_chunk = para
+                else:
+                    current_chunk += para
+        if current_chunk:
+            chunks.append(current_chunk)
+        if self.chunk_overlap > 0 and chunks:
+            chunks = [chunks[0]] + [
+                (chunks[i - 1][-self.chunk_overlap:] if len(chunks[i - 1]) > self.chunk_overlap else chunks[i - 1])
+                + chunks[i]
+                for i in range(1, len(chunks))
+            ]
+        return chunks
+
+    def _split_sentences(self, text: str) -> List[str]:
+        text = text.replace('\n', '')
+        sentences = []
+        pattern = r'([。！？!?]+|\\n)'
+        parts = re.split(pattern, text)
+        i = 0
+        while i < len(parts):
+            if i + 1 < len(parts) and re.match(pattern, parts[i + 1]):
+                sentences.append(parts[i] + parts[i + 1])
+                i += 2
+            else:
+                if parts[i].strip():
+                    sentences.append(parts[i])
+                i += 1
+        return sentences
+
+
+def make_sample_text(size_mb: float = 8.0, seed: int = 0) -> str:
+    """生成中文为主、段落长短不一的测试文本
+
+    Args:
+        size_mb: 文本大小（按UTF-8编码计）
+        seed: 随机种子
+
+    Returns:
+        测试文本
+    """
+    rng = random.Random(seed)
+    words = ["知识库", "向量检索", "文本分块", "嵌入模型", "段落", "句子", "数据", "系统",
+             "performance", "chunk", "the", "index", "查询", "文档", "结果"]
+    target = int(size_mb * 1024 * 1024)
+    parts = []
+    size = 0
+    while size < target:
+        # 大部分是短段落，少数是需要按句切分的长段落
+        sentence_count = rng.choice([1, 2, 3, 5, 40])
+        para = "".join(
+            "".join(rng.choice(words) for _ in range(rng.randint(4, 20))) + rng.choice("。！？.")
+            for _ in range(sentence_count)
+        )
+        parts.append(para)
+        size += len(para.encode("utf-8")) + 2
+    return "\n\n".join(parts)
+
+
+def run_chunker_benchmark(text: Optional[str] = None, repeat: int = 3,
+                          chunk_size: int = None, chunk_overlap: int = None) -> Dict[str, Any]:
+    """测量两种实现的分块吞吐量（MB/s），并检查输出一致
+
+    Args:
+        text: 测试文本，默认生成8MB的样例文本
+        repeat: 重复次数，取最快的一次
+        chunk_size: 分块大小，默认使用配置文件中的设置
+        chunk_overlap: 分块重叠大小，默认使用配置文件中的设置
+
+    Returns:
+        包含文本大小、各实现吞吐量和加速比的字典
+    """
+    text = text if text is not None else make_sample_text()
+    chunk_size = chunk_size or DOCUMENT_CONFIG["chunk_size"]
+    chunk_overlap = DOCUMENT_CONFIG["chunk_overlap"] if chunk_overlap is None else chunk_overlap
+    size_mb = len(text.encode("utf-8")) / (1024 * 1024)
+
+    results = {"size_mb": size_mb}
+    outputs = {}
+    for name, chunker in [("legacy", LegacyTextChunker(chunk_size, chunk_overlap)),
+                          ("span", TextChunker(chunk_size, chunk_overlap))]:
+        best = float("inf")
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            outputs[name] = chunker.split_text(text)
+            best = min(best, time.perf_counter() - start_time)
+        results[f"{name}_mb_s"] = size_mb / best
+        print(f"{name:>6}: {size_mb / best:8.1f} MB/s（{best * 1000:.0f} ms，{len(outputs[name])}块）")
+
+    results["speedup"] = results["span_mb_s"] / results["legacy_mb_s"]
+    results["identical"] = outputs["legacy"] == outputs["span"]
+    print(f"文本大小 {size_mb:.1f} MB，加速比 {results['speedup']:.2f}x，输出{'一致' if results['identical'] else '不一致'}")
+    return results
@@ -1,140 +1,584 @@
 """文本分块器，实现智能分块策略"""
 
 import re
-import jieba
-from typing import List, Optional
+import zlib
+import numpy as np
+from bisect import bisect_right
+from itertools import accumulate, chain, islice
+from typing import List, Optional, Iterable, Iterator, Tuple
 from config import DOCUMENT_CONFIG
 
+# 段落分隔符：中间只有空白的两个及以上换行
+_PARAGRAPH_SEPARATOR = re.compile(r'\n\s*\n')
+
+# 句子结束符：连续的句末标点或字面的"\n"。长段落去掉换行后分句，因此允许结束符中间夹有换行
+_SENTENCE_END = re.compile(r'[。！？!?](?:\n*[。！？!?])*|\\\n*n')
+
+# 换行符，用于在去掉换行的文本和原文之间换算位置
+_NEWLINE = re.compile(r'\n')
+
+# 文本片段的类型：整段（末尾补换行符）、长段落中的句子（去掉换行符）和原样保留的文本
+_PARAGRAPH, _SENTENCE, _TEXT = 0, 1, 2
+
+# 内容定义分块时判断边界所用的窗口长度（字符），取句末之前的这段文本计算哈希
+CDC_WINDOW_CHARS = 48
+
+# 语义分块时每次批量计算向量的句子数，断点阈值在每批内按分位数计算
+SEMANTIC_BATCH_SENTENCES = 1024
+
+# token分块时每次批量统计token数的段落数
+TOKEN_COUNT_BATCH = 256
+
+
+def _batched(iterable: Iterable, size: int) -> Iterator[list]:
+    """按固定大小分批"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
 
 class TextChunker:
-    """文本分块器，实现段落优先的分块策略"""
-    
-    def __init__(self, 
+    """文本分块器，实现段落优先的分块策略
+
+    分块过程只在原文上记录(起点, 终点)偏移，按字符数累计文本块长度，
+    产出文本块时才一次性拼接出字符串。提供token计数器时按嵌入模型的token数计量，
+    段落、句子依次作为单位，超长的句子在token边界处切开。semantic策略用嵌入模型计算句向量，
+    在相邻句子相似度明显下降处切分。
+    """
+
+    def __init__(self,
                  chunk_size: int = DOCUMENT_CONFIG["chunk_size"],
-                 chunk_overlap: int = DOCUMENT_CONFIG["chunk_overlap"]):
+                 chunk_overlap: int = DOCUMENT_CONFIG["chunk_overlap"],
+                 token_counter=None,
+                 strategy: str = "paragraph",
+                 embedding_model=None):
         """初始化分块器
-        
+
         Args:
-            chunk_size: 分块大小
-            chunk_overlap: 分块重叠大小
+            chunk_size: 分块大小，提供token_counter时为不含特殊token的token数，cdc和semantic策略下为最大块长
+            chunk_overlap: 分块重叠大小，提供token_counter时为token数
+            token_counter: 可选的TokenCounter，提供时按token数分块
+            strategy: 分块策略，"paragraph"为段落优先，"cdc"为在句末按内容哈希确定边界，
+                "semantic"为在相邻句子语义相似度下降处切分
+            embedding_model: semantic策略使用的SentenceEmbedding，也可以在分块前再设置
         """
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-        
+        self.token_counter = token_counter
+        self.strategy = strategy
+        self.embedding_model = embedding_model
+        if strategy not in ("paragraph", "cdc", "semantic"):
+            raise ValueError(f"不支持的分块策略: {strategy}")
+        if token_counter is not None and strategy != "paragraph":
+            raise ValueError("token分块只支持paragraph策略")
+        if token_counter is not None and chunk_overlap >= chunk_size:
+            raise ValueError("token分块的重叠大小必须小于分块大小")
+        self.cdc_min_size = min(DOCUMENT_CONFIG["cdc_min_chars"], chunk_size)
+        self.cdc_divisor = DOCUMENT_CONFIG["cdc_boundary_divisor"]
+        self.semantic_min_size = min(DOCUMENT_CONFIG["semantic_min_chars"], chunk_size)
+        self.semantic_percentile = DOCUMENT_CONFIG["semantic_breakpoint_percentile"]
+
     def split_text(self, text: str) -> List[str]:
         """将文本分割成块
-        
+
         Args:
             text: 要分割的文本
-            
+
         Returns:
             分割后的文本块列表
         """
-        # 首先按段落分割
-        paragraphs = self._split_paragraphs(text)
-        
-        # 处理段落
-        chunks = []
-        current_chunk = ""
-        
-        for para in paragraphs:
+        return list(self.split_text_iter([text]))
+
+    def split_text_with_offsets(self, text: str) -> List[Tuple[str, int, int]]:
+        """将文本分割成块，同时返回每个文本块在原文中的字符偏移
+
+        Args:
+            text: 要分割的文本
+
+        Returns:
+            (文本块, 起始偏移, 结束偏移)列表
+        """
+        return list(self.iter_chunks_with_offsets([text]))
+
+    def split_text_iter(self, segments: Iterable[str]) -> Iterator[str]:
+        """流式分块，逐段读入文本并逐个产出文本块
+
+        输出与对拼接后的全文调用split_text相同。内存占用只与最长的段落和一个文本块有关，
+        处理器可以边提取页面或段落边送入。
+
+        Args:
+            segments: 文本片段的可迭代对象，各片段按顺序直接拼接构成全文
+
+        Yields:
+            文本块
+        """
+        for chunk, _, _ in self.iter_chunks_with_offsets(segments):
+            yield chunk
+
+    def iter_chunks_with_offsets(self, segments: Iterable[str]) -> Iterator[Tuple[str, int, int]]:
+        """流式分块，产出文本块及其在全文中的字符偏移
+
+        偏移为文本块自身内容（不含与前一块的重叠部分）在拼接后的全文中的[起始, 结束)区间。
+
+        Args:
+            segments: 文本片段的可迭代对象，各片段按顺序直接拼接构成全文
+
+        Yields:
+            (文本块, 起始偏移, 结束偏移)
+        """
+        if self.token_counter is not None:
+            yield from self._iter_token_chunks(segments)
+            return
+        if self.strategy == "semantic":
+            for chunk, start, end, _ in self.iter_semantic_chunks(segments):
+                yield chunk, start, end
+            return
+
+        iter_pieces = self._iter_cdc_chunk_pieces if self.strategy == "cdc" else self._iter_chunk_pieces
+        overlap = ""
+        for pieces, start, end in iter_pieces(self._iter_paragraphs(segments)):
+            chunk = self._materialize(pieces, overlap)
+            overlap = self._next_overlap(chunk, overlap)
+            yield chunk, start, end
+
+    def iter_semantic_chunks(self, segments: Iterable[str]) -> Iterator[Tuple[str, int, int, np.ndarray]]:
+        """语义分块，产出文本块、字符偏移和文本块向量
+
+        文本块向量是块内句向量按字符数加权平均、再缩放到句向量平均模长的结果，可以直接写入向量存储，
+        省去对文本块的再次推理；它与直接编码整个文本块得到的向量相近但不完全相同，且不包含重叠部分。
+
+        Args:
+            segments: 文本片段的可迭代对象，各片段按顺序直接拼接构成全文
+
+        Yields:
+            (文本块, 起始偏移, 结束偏移, 文本块向量)
+        """
+        if self.embedding_model is None:
+            raise ValueError("语义分块需要提供嵌入模型")
+
+        overlap = ""
+        for pieces, start, end, vector in self._iter_semantic_chunk_pieces(self._iter_paragraphs(segments)):
+            chunk = self._materialize(pieces, overlap)
+            overlap = self._next_overlap(chunk, overlap)
+            yield chunk, start, end, vector
+
+    def _next_overlap(self, chunk: str, overlap: str) -> str:
+        """处理重叠：下一块以本块（不含重叠部分）的末尾开头"""
+        if self.chunk_overlap <= 0:
+            return ""
+        own_length = len(chunk) - len(overlap)
+        return chunk[-min(self.chunk_overlap, own_length):]
+
+    @staticmethod
+    def _materialize(pieces: list, prefix: str = "") -> str:
+        """将片段一次性拼接为字符串"""
+        parts = [prefix] if prefix else []
+        for buffer, piece_start, piece_end, kind in pieces:
+            if kind == _PARAGRAPH:
+                parts.append(buffer[piece_start:piece_end])
+                parts.append('\n')
+            elif kind == _TEXT:
+                parts.append(buffer[piece_start:piece_end])
+            elif buffer.count('\n', piece_start, piece_end):
+                parts.append(buffer[piece_start:piece_end].replace('\n', ''))
+            else:
+                parts.append(buffer[piece_start:piece_end])
+        return "".join(parts)
+
+    def _iter_paragraphs(self, segments: Iterable[str]) -> Iterator[Tuple[str, int, int, int]]:
+        """从文本片段流中逐个产出段落的位置
+
+        缓冲区中最后一个段落分隔符之前的内容已经完整，之后的部分留待与下一个片段拼接。
+        分隔符跨片段时可能被拆成两次匹配，多出的只是空白，去除首尾空白后成为空段落被跳过。
+
+        Args:
+            segments: 文本片段的可迭代对象
+
+        Yields:
+            (缓冲区, 段落起点, 段落终点, 缓冲区在全文中的偏移)，段落已去除首尾空白
+        """
+        buffer = ""
+        base = 0
+        for segment in segments:
+            if not segment:
+                continue
+            # 缓冲区中没有完整的分隔符，新的分隔符只能从其末尾的空白开始
+            search_from = len(buffer.rstrip())
+            buffer += segment
+            last_end = 0
+            for match in _PARAGRAPH_SEPARATOR.finditer(buffer, search_from):
+                span = self._strip_span(buffer, last_end, match.start())
+                if span:
+                    yield (buffer,) + span + (base,)
+                last_end = match.end()
+            if last_end:
+                base += last_end
+                buffer = buffer[last_end:]
+
+        span = self._strip_span(buffer, 0, len(buffer))
+        if span:
+            yield (buffer,) + span + (base,)
+
+    @staticmethod
+    def _strip_span(text: str, start: int, end: int) -> Optional[Tuple[int, int]]:
+        """去除区间首尾的空白，区间为空时返回None"""
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return (start, end) if start < end else None
+
+    def _iter_chunk_pieces(self, paragraphs: Iterable[Tuple[str, int, int, int]]) -> Iterator[Tuple[list, int, int]]:
+        """将段落合并为不超过chunk_size的文本块（不含重叠）
+
+        长段落中同一文本块内的相邻句子在原文中连续，合并为一个片段。
+
+        Args:
+            paragraphs: _iter_paragraphs产出的段落位置
+
+        Yields:
+            (片段列表, 起始偏移, 结束偏移)，片段为(缓冲区, 起点, 终点, 类型)
+        """
+        pieces = []
+        length = 0
+        chunk_start = chunk_end = 0
+
+        for buffer, para_start, para_end, base in paragraphs:
+            # 段落末尾补一个换行符
+            para_length = para_end - para_start + 1
             # 如果段落本身超过chunk_size，需要进一步分割
-            if len(para) > self.chunk_size:
-                # 将长段落分割成句子
-                sentences = self._split_sentences(para)
-                # 处理句子
-                for sent in sentences:
-                    if len(current_chunk) + len(sent) <= self.chunk_size:
-                        current_chunk += sent
-                    else:
-                        if current_chunk:
-                            chunks.append(current_chunk)
-                        current_chunk = sent
+            if para_length > self.chunk_size:
+                # 将长段落分割成句子，每次取能放进当前文本块的最多句子
+                ends, flat_ends = self._sentence_ends(buffer, para_start, para_end)
+                i, pos, flat_pos = 0, para_start, 0
+                while i < len(ends):
+                    j = bisect_right(flat_ends, flat_pos + self.chunk_size - length, i) - 1
+                    if j < i:
+                        if pieces:
+                            yield pieces, chunk_start, chunk_end
+                            pieces, length = [], 0
+                            continue
+                        # 单个句子超过chunk_size时独占一块
+                        j = i
+                    if not pieces:
+                        chunk_start = base + pos
+                    pieces.append((buffer, pos, ends[j], _SENTENCE))
+                    length += flat_ends[j] - flat_pos
+                    chunk_end = base + ends[j]
+                    i, pos, flat_pos = j + 1, ends[j], flat_ends[j]
             else:
                 # 如果添加整个段落后超过chunk_size
-                if len(current_chunk) + len(para) > self.chunk_size:
-                    chunks.append(current_chunk)
-                    current_chunk = para
-                else:
-                    current_chunk += para
-        
+                if length + para_length > self.chunk_size and pieces:
+                    yield pieces, chunk_start, chunk_end
+                    pieces, length = [], 0
+                if not pieces:
+                    chunk_start = base + para_start
+                pieces.append((buffer, para_start, para_end, _PARAGRAPH))
+                length += para_length
+                chunk_end = base + para_end
+
         # 添加最后一个chunk
-        if current_chunk:
-            chunks.append(current_chunk)
-            
-        # 处理重叠
-        if self.chunk_overlap > 0:
-            chunks = self._add_overlap(chunks)
-            
-        return chunks
-    
-    def _split_paragraphs(self, text: str) -> List[str]:
-        """将文本按段落分割
-        
+        if pieces:
+            yield pieces, chunk_start, chunk_end
+
+    def _iter_cdc_chunk_pieces(self, paragraphs: Iterable[Tuple[str, int, int, int]]) -> Iterator[Tuple[list, int, int]]:
+        """按内容定义的边界将段落切分为文本块（不含重叠）
+
+        候选边界是句末和段落结尾。块长达到最小长度后，候选边界之前窗口内文本的哈希能被除数整除时切分；
+        再加入下一句会超过chunk_size时在上一个候选边界处切分。边界只取决于附近的内容，
+        文档某处被编辑后，之后的边界很快与原来重新对齐，未改动部分产生相同的文本块。
+
         Args:
-            text: 要分割的文本
-            
+            paragraphs: _iter_paragraphs产出的段落位置
+
+        Yields:
+            (片段列表, 起始偏移, 结束偏移)
+        """
+        pieces = []
+        length = 0
+        chunk_start = chunk_end = 0
+
+        for buffer, seg_start, seg_end, kind, para_start, base in self._iter_sentence_spans(paragraphs):
+            # 段落的最后一句末尾补的换行符也计入块长
+            newline = kind == _PARAGRAPH
+            if length + (seg_end - seg_start) + newline > self.chunk_size and pieces:
+                yield pieces, chunk_start, chunk_end
+                pieces, length = [], 0
+            # 超过chunk_size的单个句子按固定长度切开，切剩的部分至少保留一个字符
+            while seg_end - seg_start + newline > self.chunk_size and seg_end - seg_start > 1:
+                cut_at = seg_start + min(self.chunk_size, seg_end - seg_start - 1)
+                yield [(buffer, seg_start, cut_at, _TEXT)], base + seg_start, base + cut_at
+                seg_start = cut_at
+
+            if not pieces:
+                chunk_start = base + seg_start
+            pieces.append((buffer, seg_start, seg_end, kind))
+            length += seg_end - seg_start + newline
+            chunk_end = base + seg_end
+            if length >= self.cdc_min_size and self._is_cdc_boundary(buffer, para_start, seg_end):
+                yield pieces, chunk_start, chunk_end
+                pieces, length = [], 0
+
+        # 添加最后一个chunk
+        if pieces:
+            yield pieces, chunk_start, chunk_end
+
+    def _iter_sentence_spans(self, paragraphs: Iterable[Tuple[str, int, int, int]]) -> Iterator[Tuple[str, int, int, int, int, int]]:
+        """在句末和段落结尾处切分段落
+
+        Args:
+            paragraphs: _iter_paragraphs产出的段落位置
+
+        Yields:
+            (缓冲区, 起点, 终点, 类型, 段落起点, 缓冲区在全文中的偏移)，段落的最后一句末尾补换行符，
+            与段落优先策略一致
+        """
+        for buffer, para_start, para_end, base in paragraphs:
+            pos = para_start
+            sentence_ends = (match.end() for match in _SENTENCE_END.finditer(buffer, para_start, para_end))
+            for cut in chain(sentence_ends, [para_end]):
+                span = self._strip_span(buffer, pos, cut)
+                pos = cut
+                if span is not None:
+                    kind = _PARAGRAPH if span[1] == para_end else _TEXT
+                    yield buffer, span[0], span[1], kind, para_start, base
+
+    def _iter_semantic_chunk_pieces(self, paragraphs: Iterable[Tuple[str, int, int, int]]) -> Iterator[Tuple[list, int, int, np.ndarray]]:
+        """按相邻句子的语义相似度将段落切分为文本块（不含重叠）
+
+        句子分批编码，用向量化的点积计算相邻句子的余弦相似度，低于本批相似度的
+        semantic_breakpoint_percentile分位数即视为话题转折。块长达到最小长度后在转折处切分，
+        再加入下一句会超过chunk_size时提前切分。
+
+        Args:
+            paragraphs: _iter_paragraphs产出的段落位置
+
+        Yields:
+            (片段列表, 起始偏移, 结束偏移, 文本块向量)
+        """
+        pieces = []
+        length = 0
+        chunk_start = chunk_end = 0
+        chunk_vectors, chunk_weights = [], []
+        prev_vector = None
+
+        def pooled() -> np.ndarray:
+            # 加权平均会缩短向量，缩放回句向量的平均模长，与模型直接输出的向量尺度一致
+            vectors = np.stack(chunk_vectors)
+            vector = np.average(vectors, axis=0, weights=chunk_weights)
+            scale = np.average(np.linalg.norm(vectors, axis=1), weights=chunk_weights)
+            return (vector * (scale / max(np.linalg.norm(vector), 1e-12))).astype(np.float32)
+
+        for window in _batched(self._iter_sentence_spans(paragraphs), SEMANTIC_BATCH_SENTENCES):
+            # 超过chunk_size的单个句子先按固定长度切开，每个单位都能放进一个文本块
+            units = []
+            for buffer, seg_start, seg_end, kind, _, base in window:
+                newline = kind == _PARAGRAPH
+                while seg_end - seg_start + newline > self.chunk_size and seg_end - seg_start > 1:
+                    cut_at = seg_start + min(self.chunk_size, seg_end - seg_start - 1)
+                    units.append((buffer, seg_start, cut_at, _TEXT, base))
+                    seg_start = cut_at
+                units.append((buffer, seg_start, seg_end, kind, base))
+
+            vectors = np.asarray(self.embedding_model.encode_array(
+                [buffer[seg_start:seg_end] for buffer, seg_start, seg_end, _, _ in units]), dtype=np.float32)
+            unit_vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+            # 每个单位与前一单位的余弦相似度，跨批次时与上一批的最后一句比较
+            previous = unit_vectors[:-1] if prev_vector is None \
+                else np.vstack([prev_vector[None, :], unit_vectors[:-1]])
+            similarities = np.einsum("ij,ij->i", previous, unit_vectors[-len(previous):])
+            if prev_vector is None:
+                similarities = np.concatenate([[np.inf], similarities])
+            finite = similarities[np.isfinite(similarities)]
+            threshold = np.percentile(finite, self.semantic_percentile) if len(finite) else -np.inf
+
+            for (buffer, seg_start, seg_end, kind, base), vector, similarity in zip(units, vectors, similarities):
+                unit_length = seg_end - seg_start + (kind == _PARAGRAPH)
+                if pieces and (length + unit_length > self.chunk_size
+                               or (length >= self.semantic_min_size and similarity < threshold)):
+                    yield pieces, chunk_start, chunk_end, pooled()
+                    pieces, length = [], 0
+                    chunk_vectors, chunk_weights = [], []
+                if not pieces:
+                    chunk_start = base + seg_start
+                pieces.append((buffer, seg_start, seg_end, kind))
+                length += unit_length
+                chunk_end = base + seg_end
+                chunk_vectors.append(vector)
+                chunk_weights.append(seg_end - seg_start)
+            prev_vector = unit_vectors[-1]
+
+        # 添加最后一个chunk
+        if pieces:
+            yield pieces, chunk_start, chunk_end, pooled()
+
+    def _is_cdc_boundary(self, text: str, para_start: int, end: int) -> bool:
+        """句末之前窗口内文本的哈希是否命中边界条件，窗口不超出所在段落"""
+        window = text[max(para_start, end - CDC_WINDOW_CHARS):end]
+        return zlib.crc32(window.encode("utf-8")) % self.cdc_divisor == 0
+
+    def _sentence_ends(self, text: str, start: int, end: int) -> Tuple[List[int], List[int]]:
+        """将段落分割成句子
+
+        句子在去掉换行符后的段落上划分：每个句子止于结束符之后，最后一个句子是剩余部分。
+
+        Args:
+            text: 段落所在的文本
+            start: 段落起点
+            end: 段落终点
+
         Returns:
-            段落列表
-        """
-        # 使用多个换行符作为段落分隔符
-        paragraphs = re.split(r'\n\s*\n', text)
-        # 过滤空段落并确保每个段落以换行符结尾
-        return [p.strip() + '\n' for p in paragraphs if p.strip()]
-    
-    def _split_sentences(self, text: str) -> List[str]:
-        """将文本分割成句子
-        
+            (各句子在文本中的终点, 去掉换行符后各句子终点相对段落起点的长度)
+        """
+        ends = [match.end() for match in _SENTENCE_END.finditer(text, start, end)]
+        if not ends or ends[-1] < end:
+            ends.append(end)
+        if text.count('\n', start, end):
+            flat_ends = list(accumulate(
+                sent_end - sent_start - text.count('\n', sent_start, sent_end)
+                for sent_start, sent_end in zip([start] + ends[:-1], ends)
+            ))
+        else:
+            flat_ends = [sent_end - start for sent_end in ends]
+        return ends, flat_ends
+
+    def _iter_token_chunks(self, segments: Iterable[str]) -> Iterator[Tuple[str, int, int]]:
+        """按token数分块，每块（含重叠）的token数不超过chunk_size
+
+        打包时为重叠部分预留chunk_overlap个token，产出前用分词器的偏移映射确认整块的token数，
+        同时取本块末尾chunk_overlap个token对应的文本作为下一块的重叠。
+        """
+        counter = self.token_counter
+        overlap = ""
+        for pieces, start, end in self._iter_token_chunk_pieces(self._iter_paragraphs(segments)):
+            own = self._materialize(pieces)
+            chunk = overlap + own
+            offsets = counter.offsets(chunk)
+            if len(offsets) > self.chunk_size and overlap:
+                # 重叠部分重新分词后变长，放弃重叠以保证不被截断
+                chunk = own
+                offsets = counter.offsets(chunk)
+            if len(offsets) > self.chunk_size:
+                print(f"警告: 文本块有{len(offsets)}个token，超过上限{self.chunk_size}，嵌入时会被截断")
+
+            if self.chunk_overlap > 0:
+                own_start = len(chunk) - len(own)
+                own_offsets = [offset for offset in offsets if offset[0] >= own_start]
+                if len(own_offsets) > self.chunk_overlap:
+                    overlap = chunk[own_offsets[-self.chunk_overlap][0]:]
+                else:
+                    overlap = own
+            yield chunk, start, end
+
+    def _iter_token_chunk_pieces(self, paragraphs: Iterable[Tuple[str, int, int, int]]) -> Iterator[Tuple[list, int, int]]:
+        """将段落按token数合并为文本块（不含重叠）
+
+        段落分批统计token数；超出单块预算的段落拆成句子，超出预算的句子再在token边界处切开。
+
         Args:
-            text: 要分割的文本
-            
+            paragraphs: _iter_paragraphs产出的段落位置
+
+        Yields:
+            (片段列表, 起始偏移, 结束偏移)
+        """
+        budget = self.chunk_size - self.chunk_overlap
+        pieces = []
+        length = 0
+        chunk_start = chunk_end = 0
+
+        batch = []
+        for paragraph in chain(paragraphs, [None]):
+            if paragraph is not None:
+                batch.append(paragraph)
+                if len(batch) < TOKEN_COUNT_BATCH:
+                    continue
+            if not batch:
+                break
+
+            counts = self.token_counter.count([buffer[start:end] for buffer, start, end, _ in batch])
+            for (buffer, para_start, para_end, base), count in zip(batch, counts):
+                if count <= budget:
+                    units = [(para_start, para_end, _PARAGRAPH, count)]
+                else:
+                    units = self._token_units(buffer, para_start, para_end, budget)
+                for unit_start, unit_end, kind, unit_tokens in units:
+                    if length + unit_tokens > budget and pieces:
+                        yield pieces, chunk_start, chunk_end
+                        pieces, length = [], 0
+                    if not pieces:
+                        chunk_start = base + unit_start
+                    pieces.append((buffer, unit_start, unit_end, kind))
+                    length += unit_tokens
+                    chunk_end = base + unit_end
+            batch = []
+
+        # 添加最后一个chunk
+        if pieces:
+            yield pieces, chunk_start, chunk_end
+
+    def _token_units(self, text: str, start: int, end: int, budget: int) -> List[Tuple[int, int, int, int]]:
+        """将超出预算的段落拆成不超过预算的句子单位
+
+        Args:
+            text: 段落所在的文本
+            start: 段落起点
+            end: 段落终点
+            budget: 单位的token数上限
+
         Returns:
-            句子列表
-        """
-        # 使用jieba分词进行中文分句
-        text = text.replace('\n', '')
-        sentences = []
-        
-        # 使用正则表达式匹配句子结束符
-        pattern = r'([。！？!?]+|\\n)'
-        
-        # 先用结束符分割
-        parts = re.split(pattern, text)
-        
-        # 重新组合句子
-        i = 0
-        while i < len(parts):
-            if i + 1 < len(parts) and re.match(pattern, parts[i + 1]):
-                sentences.append(parts[i] + parts[i + 1])
-                i += 2
+            (起点, 终点, 类型, token数)列表
+        """
+        ends, _ = self._sentence_ends(text, start, end)
+        spans = list(zip([start] + ends[:-1], ends))
+        counts = self.token_counter.count([text[a:b].replace('\n', '') for a, b in spans])
+
+        units = []
+        for (sent_start, sent_end), count in zip(spans, counts):
+            if count <= budget:
+                units.append((sent_start, sent_end, _SENTENCE, count))
             else:
-                if parts[i].strip():
-                    sentences.append(parts[i])
-                i += 1
-        
-        return sentences
-    
-    def _add_overlap(self, chunks: List[str]) -> List[str]:
-        """为文本块添加重叠
-        
+                units.extend(self._split_by_tokens(text, sent_start, sent_end, budget))
+        return units
+
+    def _split_by_tokens(self, text: str, start: int, end: int, budget: int) -> List[Tuple[int, int, int, int]]:
+        """在token边界处切开超长句子，尽量不切在英文单词中间
+
+        句子去掉换行符后分词，切分位置再映射回原文。
+
         Args:
-            chunks: 文本块列表
-            
+            text: 句子所在的文本
+            start: 句子起点
+            end: 句子终点
+            budget: 每段的token数上限
+
         Returns:
-            处理后的文本块列表
-        """
-        if not chunks:
-            return chunks
-            
-        result = [chunks[0]]
-        
-        for i in range(1, len(chunks)):
-            # 获取前一个chunk的末尾部分
-            prev_chunk = chunks[i-1]
-            overlap = prev_chunk[-self.chunk_overlap:] if len(prev_chunk) > self.chunk_overlap else prev_chunk
-            
-            # 将重叠部分添加到当前chunk的开头
-            current_chunk = chunks[i]
-            result.append(overlap + current_chunk)
-            
-        return result
\ No newline at end of file
+            (起点, 终点, 类型, token数)列表，各段首尾相接覆盖整个句子
+        """
+        flat = text[start:end].replace('\n', '')
+        offsets = self.token_counter.offsets(flat)
+        # 原文中各换行符之前的非换行字符数，用于将去掉换行后的位置映射回原文
+        newline_positions = [match.start() - start - i
+                             for i, match in enumerate(_NEWLINE.finditer(text, start, end))]
+
+        def is_word_char(char: str) -> bool:
+            return char.isascii() and char.isalnum()
+
+        def can_cut(i: int) -> bool:
+            # 与前一个token紧邻且两侧都是字母数字时，切开会把一个单词拆成两半
+            return not (offsets[i][0] == offsets[i - 1][1]
+                        and is_word_char(flat[offsets[i][0]]) and is_word_char(flat[offsets[i - 1][1] - 1]))
+
+        units = []
+        unit_start, first = start, 0
+        while len(offsets) - first > budget:
+            cut = next((i for i in range(first + budget, first, -1) if can_cut(i)), first + budget)
+            flat_cut = offsets[cut][0]
+            source_cut = start + flat_cut + bisect_right(newline_positions, flat_cut)
+            units.append((unit_start, source_cut, _SENTENCE, cut - first))
+            unit_start, first = source_cut, cut
+        units.append((unit_start, end, _SENTENCE, len(offsets) - first))
+        return units
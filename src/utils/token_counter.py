@@ -0,0 +1,113 @@
+"""token计数器，使用嵌入模型的快速分词器批量统计文本的token数"""
+
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Tuple
+
+# 超过该长度的文本不缓存token数，避免缓存占用过多内存
+CACHE_MAX_TEXT_CHARS = 2048
+
+# 每个分词器共享一个计数器，缓存在文档之间复用
+_counters: Dict[str, "TokenCounter"] = {}
+_counters_lock = threading.Lock()
+
+
+class TokenCounter:
+    """token计数器
+
+    分词器在首次使用时加载，必须是快速分词器以支持批量调用和字符偏移映射。
+    统计的token数不含[CLS]/[SEP]等特殊token，文本的token数按LRU缓存。
+    """
+
+    def __init__(self, tokenizer_name: str, cache_size: int = 100000):
+        """初始化计数器
+
+        Args:
+            tokenizer_name: 分词器名称，应与嵌入模型一致
+            cache_size: 缓存的最大条目数
+        """
+        self.tokenizer_name = tokenizer_name
+        self.cache_size = cache_size
+        self.tokenizer = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_tokenizer(self):
+        """获取分词器，首次使用时加载"""
+        if self.tokenizer is None:
+            # transformers导入耗时较长，延迟到首次使用时
+            from transformers import AutoTokenizer
+
+            tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_name, use_fast=True)
+            if not tokenizer.is_fast:
+                raise ValueError(f"分词器 {self.tokenizer_name} 没有快速实现，无法按token分块")
+            self.tokenizer = tokenizer
+        return self.tokenizer
+
+    @property
+    def num_special_tokens(self) -> int:
+        """编码单条文本时添加的特殊token数"""
+        return self._get_tokenizer().num_special_tokens_to_add(pair=False)
+
+    def count(self, texts: List[str]) -> List[int]:
+        """批量统计文本的token数，未缓存的文本一次调用分词器
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            与texts一一对应的token数
+        """
+        counts = [None] * len(texts)
+        pending = {}
+        with self._lock:
+            for i, text in enumerate(texts):
+                count = self._cache.get(text)
+                if count is not None:
+                    self._cache.move_to_end(text)
+                    counts[i] = count
+                else:
+                    pending.setdefault(text, []).append(i)
+
+        if pending:
+            pending_texts = list(pending)
+            encoded = self._get_tokenizer()(pending_texts, add_special_tokens=False, return_attention_mask=False,
+                                            return_token_type_ids=False, verbose=False)
+            with self._lock:
+                for text, ids in zip(pending_texts, encoded["input_ids"]):
+                    for i in pending[text]:
+                        counts[i] = len(ids)
+                    if len(text) <= CACHE_MAX_TEXT_CHARS:
+                        self._cache[text] = len(ids)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return counts
+
+    def offsets(self, text: str) -> List[Tuple[int, int]]:
+        """获取文本中每个token的字符偏移
+
+        Args:
+            text: 文本
+
+        Returns:
+            每个token在text中的(起点, 终点)
+        """
+        encoded = self._get_tokenizer()(text, add_special_tokens=False, return_offsets_mapping=True,
+                                        return_attention_mask=False, return_token_type_ids=False, verbose=False)
+        return [tuple(offset) for offset in encoded["offset_mapping"]]
+
+
+def get_token_counter(tokenizer_name: str) -> TokenCounter:
+    """获取分词器对应的共享计数器
+
+    Args:
+        tokenizer_name: 分词器名称
+
+    Returns:
+        TokenCounter实例
+    """
+    with _counters_lock:
+        counter = _counters.get(tokenizer_name)
+        if counter is None:
+            counter = _counters[tokenizer_name] = TokenCounter(tokenizer_name)
+        return counter
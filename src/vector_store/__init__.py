@@ -1,5 +1,11 @@
 """向量存储模块，负责文档向量的存储和检索"""
 
+from .base_store import BaseVectorStore, create_vector_store
 from .chroma_store import ChromaStore
+from .numpy_store import NumpyStore
+from .faiss_store import FaissStore
+from .sharded_store import ShardedStore
+from .store_lock import KnowledgeBaseLock
 
-__all__ = ["ChromaStore"]
\ No newline at end of file
+__all__ = ["BaseVectorStore", "ChromaStore", "NumpyStore", "FaissStore", "ShardedStore", "create_vector_store",
+           "KnowledgeBaseLock"]
@@ -0,0 +1,181 @@
+"""向量存储后端基准，测量冷启动耗时和稳态常驻内存，比较Chromadb PersistentClient与进程内后端"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+from typing import List, Dict, Any, Optional
+from config import BASE_DIR, DATA_DIR
+
+# 基准报告的默认输出目录
+REPORT_DIR = os.path.join(DATA_DIR, "reports")
+
+# 基准集合名称
+BENCH_COLLECTION = "backend_bench"
+
+
+def _rss_mb() -> float:
+    """当前进程的常驻内存（MB），优先读取/proc，其余平台退回峰值常驻内存"""
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _open_store(backend: str):
+    """打开基准集合，存储目录已由_run_worker在导入向量存储模块之前指向临时目录"""
+    from .base_store import get_store_class
+
+    def no_embedding(texts):
+        raise RuntimeError("基准只使用已有向量")
+
+    return get_store_class(backend)(BENCH_COLLECTION, embedding_function=no_embedding, sparse_index=False)
+
+
+def _worker_build(backend: str, data_dir: str, num_vectors: int, dimension: int, seed: int) -> Dict[str, Any]:
+    """子进程：写入随机单位向量构建基准集合"""
+    import numpy as np
+
+    store = _open_store(backend)
+    rng = np.random.default_rng(seed)
+    start_time = time.perf_counter()
+    for start in range(0, num_vectors, 10000):
+        end = min(start + 10000, num_vectors)
+        vectors = rng.standard_normal((end - start, dimension), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        ids = [f"chunk-{i}" for i in range(start, end)]
+        texts = [f"基准文本块 {i}" for i in range(start, end)]
+        metadatas = [{"source": f"doc-{i // 50}"} for i in range(start, end)]
+        store.add_embeddings(texts, vectors, metadatas, ids)
+    return {"build_s": time.perf_counter() - start_time, "count": store.count()}
+
+
+def _worker_measure(backend: str, data_dir: str, dimension: int, num_queries: int, k: int,
+                    seed: int) -> Dict[str, Any]:
+    """子进程：测量打开已有集合到首个查询返回的耗时，以及持续查询后的常驻内存"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed + 1)
+    queries = rng.standard_normal((num_queries, dimension), dtype=np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    baseline_rss = _rss_mb()
+
+    # 冷启动包含导入存储后端、打开集合和首个查询加载索引
+    start_time = time.perf_counter()
+    store = _open_store(backend)
+    open_s = time.perf_counter() - start_time
+    store._query(queries[:1], k, include=())
+    cold_start_s = time.perf_counter() - start_time
+
+    latencies = []
+    for query in queries:
+        query_start = time.perf_counter()
+        store._query(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - query_start) * 1000)
+
+    rss = _rss_mb()
+    return {
+        "open_s": open_s,
+        "cold_start_s": cold_start_s,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "rss_mb": rss,
+        "rss_delta_mb": rss - baseline_rss,
+    }
+
+
+def _run_worker(phase: str, *args) -> Dict[str, Any]:
+    """在新的解释器中运行一个阶段，保证每次测量都是冷启动且内存互不影响
+
+    各后端在导入时读取VECTOR_STORE_DIR，子进程先修改配置再导入向量存储模块。
+    args的第二项为存储目录。
+    """
+    code = (
+        "import json, sys, config; "
+        "args = json.loads(sys.argv[1]); "
+        "config.VECTOR_STORE_DIR = args[1]; "
+        "config.VECTOR_STORE_CONFIG['query_cache_enabled'] = False; "
+        "from src.vector_store.backend_benchmark import _worker_build, _worker_measure; "
+        f"print(json.dumps(_worker_{phase}(*args)))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code, json.dumps(args)],
+        capture_output=True,
+        text=True,
+        cwd=str(BASE_DIR),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"基准子进程失败: {result.stderr.strip().splitlines()[-1]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run_backend_benchmark(
+    backends: Optional[List[str]] = None,
+    num_vectors: int = 100000,
+    dimension: int = 768,
+    num_queries: int = 200,
+    k: int = 5,
+    repeats: int = 3,
+    output_dir: str = None,
+    seed: int = 0,
+) -> List[Dict[str, Any]]:
+    """对各后端在相同的随机向量上测量构建耗时、冷启动耗时、查询延迟和稳态常驻内存
+
+    每个后端先在临时目录中构建集合，再在新进程中重复打开并查询repeats次，冷启动取中位数。
+
+    Args:
+        backends: 参与比较的后端，默认为chroma、numpy和faiss
+        num_vectors: 集合中的向量数
+        dimension: 向量维度
+        num_queries: 每次测量的查询数
+        k: 每个查询返回的条数
+        repeats: 冷启动测量的重复次数
+        output_dir: 报告输出目录
+        seed: 随机种子
+
+    Returns:
+        每个后端一行的结果列表，同时写入JSON报告
+    """
+    backends = backends or ["chroma", "numpy", "faiss"]
+    print(f"后端基准: {num_vectors}条{dimension}维向量，{num_queries}条查询，k={k}")
+
+    results = []
+    for backend in backends:
+        data_dir = tempfile.mkdtemp(prefix=f"bench_{backend}_")
+        try:
+            build = _run_worker("build", backend, data_dir, num_vectors, dimension, seed)
+            runs = [_run_worker("measure", backend, data_dir, dimension, num_queries, k, seed)
+                    for _ in range(repeats)]
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+        runs.sort(key=lambda run: run["cold_start_s"])
+        row = dict(runs[len(runs) // 2], backend=backend, build_s=build["build_s"])
+        results.append(row)
+        print(f"{backend:<7} 构建{row['build_s']:.1f}s 冷启动{row['cold_start_s']:.3f}s "
+              f"(打开{row['open_s']:.3f}s) p50={row['p50_ms']:.2f}ms p99={row['p99_ms']:.2f}ms "
+              f"RSS={row['rss_mb']:.0f}MB (+{row['rss_delta_mb']:.0f}MB)")
+
+    output_dir = output_dir or REPORT_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"backend_bench_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "num_vectors": num_vectors,
+            "dimension": dimension,
+            "num_queries": num_queries,
+            "k": k,
+            "results": results,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"基准报告已写入: {path}")
+
+    return results
@@ -0,0 +1,846 @@
+"""向量存储抽象基类，定义统一接口并实现与存储后端无关的检索流程"""
+
+import time
+import logging
+import hashlib
+import numpy as np
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Callable, Iterable, Iterator, Tuple
+from config import VECTOR_STORE_CONFIG
+from src.model.embedding_cache import EmbeddingCache
+from .bm25_index import BM25Index, reciprocal_rank_fusion
+from .query_cache import QueryResultCache
+
+# 默认的embedding模型
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+# 检索结果可选的字段，id总是返回；score同时包含原始距离distance
+SEARCH_RESULT_FIELDS = ("score", "metadata", "content")
+
+# 检索结果字段对应的_query返回字段
+_QUERY_FIELDS = {"metadata": "metadatas", "content": "documents"}
+
+logger = logging.getLogger(__name__)
+
+
+def make_chunk_ids(texts: List[str], metadatas: List[Dict[str, Any]]) -> List[str]:
+    """根据(来源, 文本哈希)生成确定性的文本块ID
+
+    同一来源中内容相同的文本块按出现次序区分，重复上传同一文档得到相同的ID。
+
+    Args:
+        texts: 文本列表
+        metadatas: 与文本对应的元数据列表，来源取自metadata["source"]
+
+    Returns:
+        文本块ID列表
+    """
+    ids = []
+    occurrences: Dict[Tuple[str, str], int] = {}
+    for text, metadata in zip(texts, metadatas):
+        source = str((metadata or {}).get("source", ""))
+        text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        occurrence = occurrences.get((source, text_hash), 0)
+        occurrences[(source, text_hash)] = occurrence + 1
+        key = f"{source}\0{text_hash}\0{occurrence}"
+        ids.append(hashlib.sha256(key.encode("utf-8")).hexdigest()[:32])
+    return ids
+
+
+class BaseVectorStore(ABC):
+    """向量存储抽象基类
+
+    基类负责向量生成、分批流水线写入、BM25稀疏索引维护、混合检索和重排序；
+    子类只需实现按向量写入、按向量检索、按ID读取和删除等存储原语。
+    查询结果统一使用Chromadb的格式：{"ids": [[...]], "documents": [[...]], "metadatas": [[...]], "distances": [[...]]}。
+    """
+
+    def __init__(self, collection_name: str = "knowledge_base", embedding_function=None,
+                 embedding_executor=None, embedding_model=None, reranker=None, sparse_index: bool = True):
+        """初始化向量存储
+
+        Args:
+            collection_name: 集合名称，默认为knowledge_base
+            embedding_function: 嵌入函数，用于将文本转换为向量
+            embedding_executor: 可选的多进程嵌入执行器，add_texts时用于批量生成向量
+            embedding_model: 可选的SentenceEmbedding，提供encode_array时直接获取float32矩阵
+            reranker: 可选的CrossEncoderReranker，用于对检索结果重排序
+            sparse_index: 是否维护BM25稀疏索引，还需要配置中启用sparse_index_enabled
+        """
+        self.collection_name = collection_name
+        self.embedding_executor = embedding_executor
+        self.sentence_embedding = embedding_model
+        self.reranker = reranker
+        # 集合版本号，每次写入或删除后递增，用于使检索结果缓存失效
+        self.version = 0
+        self.query_cache = QueryResultCache(
+            VECTOR_STORE_CONFIG["query_cache_max_entries"],
+            VECTOR_STORE_CONFIG["query_cache_ttl"]
+        ) if VECTOR_STORE_CONFIG["query_cache_enabled"] else None
+        self.embedding_function = embedding_function or self._default_embedding_function()
+        # 默认嵌入模型只在未提供embedding_function且首次调用时加载
+        self.embedding_model = None
+        self.embedding_cache = None
+        self.sparse_index_enabled = sparse_index and VECTOR_STORE_CONFIG["sparse_index_enabled"]
+        self.sparse_index = None
+        self._sparse_index_checked = False
+
+    def _get_default_embedding_model(self):
+        """加载默认的SentenceTransformer模型"""
+        if self.embedding_model is None:
+            from sentence_transformers import SentenceTransformer
+
+            print(f"正在加载默认嵌入模型: {DEFAULT_EMBEDDING_MODEL}")
+            self.embedding_model = SentenceTransformer(DEFAULT_EMBEDDING_MODEL)
+        return self.embedding_model
+
+    def _default_embedding_function(self):
+        """默认的embedding函数，经过磁盘嵌入缓存"""
+        def embed_function(texts: List[str]) -> List[List[float]]:
+            embedding_model = self._get_default_embedding_model()
+            if not VECTOR_STORE_CONFIG["embedding_cache_enabled"]:
+                return embedding_model.encode(texts).tolist()
+            if self.embedding_cache is None:
+                self.embedding_cache = EmbeddingCache(
+                    DEFAULT_EMBEDDING_MODEL,
+                    embedding_model.get_sentence_embedding_dimension()
+                )
+            return self.embedding_cache.lookup_or_compute(texts, embedding_model.encode).tolist()
+        return embed_function
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """生成文本向量
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            形状为(len(texts), dimension)的连续float32矩阵
+        """
+        if self.embedding_executor is not None:
+            return self.embedding_executor.encode(texts)
+        return self._embed_queries(texts)
+
+    def _embed_queries(self, queries: List[str]) -> np.ndarray:
+        """生成查询向量，查询数量少，直接在当前进程中计算"""
+        if self.sentence_embedding is not None:
+            return self.sentence_embedding.encode_array(queries)
+        return np.asarray(self.embedding_function(queries), dtype=np.float32)
+
+    def _init_sparse_index(self, index_dir: str = None) -> None:
+        """创建BM25稀疏索引，随写入和删除增量维护"""
+        if self.sparse_index_enabled:
+            self.sparse_index = BM25Index(self.collection_name, index_dir)
+        self._sparse_index_checked = False
+
+    # ---- 存储后端需要实现的原语 ----
+
+    @abstractmethod
+    def _upsert_batch(self, ids: List[str], texts: List[str],
+                      metadatas: List[Dict[str, Any]], embeddings: np.ndarray) -> None:
+        """写入一批文本及其向量，已存在的ID直接覆盖"""
+        pass
+
+    @abstractmethod
+    def _update_metadatas(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """只更新已存在文本块的元数据"""
+        pass
+
+    @abstractmethod
+    def _query(self, query_embeddings: np.ndarray, k: int, filter: Optional[Dict[str, Any]] = None,
+               include: Tuple[str, ...] = ("documents", "metadatas")) -> Dict[str, Any]:
+        """按向量检索，返回Chromadb格式的结果
+
+        ids和distances总是返回，documents和metadatas仅在include中时读取，否则为None。
+        """
+        pass
+
+    @abstractmethod
+    def _delete(self, ids: List[str]) -> None:
+        """删除指定ID的向量"""
+        pass
+
+    @abstractmethod
+    def _reset(self) -> None:
+        """清空存储"""
+        pass
+
+    @abstractmethod
+    def _iter_documents(self, page_size: int) -> Iterator[Tuple[List[str], List[str]]]:
+        """分页遍历全部文档，每页返回(ID列表, 文本列表)"""
+        pass
+
+    @abstractmethod
+    def export_batches(self, page_size: int = 1000) -> Iterator[Tuple[List[str], List[str], List[Dict[str, Any]], np.ndarray]]:
+        """分页导出全部文本块，每页返回(ID列表, 文本列表, 元数据列表, 向量矩阵)"""
+        pass
+
+    @abstractmethod
+    def iter_embeddings(self, page_size: int = 1000) -> Iterator[np.ndarray]:
+        """分页遍历全部存活向量，每页返回float32矩阵"""
+        pass
+
+    @abstractmethod
+    def get(self, ids: List[str], where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """获取指定ID的文档
+
+        Args:
+            ids: 要获取的文档ID列表
+            where: 可选的元数据过滤条件
+
+        Returns:
+            文档内容、元数据和ID
+        """
+        pass
+
+    @abstractmethod
+    def _get_embeddings(self, ids: List[str]) -> Tuple[List[str], List[str], List[Dict[str, Any]], np.ndarray]:
+        """获取指定ID的文本块及其向量，返回(ID列表, 文本列表, 元数据列表, 向量矩阵)，不存在的ID跳过"""
+        pass
+
+    def _existing_ids(self, ids: List[str]) -> List[str]:
+        """返回指定ID中已存在的ID，后端可以覆盖为不读取文本和元数据的查询"""
+        return self.get(ids)["ids"]
+
+    @abstractmethod
+    def _get_where(self, where: Dict[str, Any]) -> Dict[str, Any]:
+        """按元数据过滤条件获取文档，返回格式与get相同"""
+        pass
+
+    @abstractmethod
+    def _delete_where(self, where: Dict[str, Any]) -> List[str]:
+        """按元数据过滤条件删除文档，返回被删除的ID"""
+        pass
+
+    @abstractmethod
+    def count(self) -> int:
+        """获取集合中的文档数量"""
+        pass
+
+    def _bump_version(self) -> None:
+        """集合内容变化后递增版本号
+
+        必须在写入或删除完成之后调用：写入期间的检索可能读到旧数据，并以写入前的版本号缓存，
+        写入完成后递增版本号才能使这些结果失效。
+        """
+        self.version += 1
+
+    def query_cache_stats(self) -> Optional[Dict[str, Any]]:
+        """获取检索结果缓存的命中统计，未启用缓存时返回None"""
+        return self.query_cache.stats() if self.query_cache is not None else None
+
+    def _flush(self) -> None:
+        """一次写入的全部批次完成后调用，需要整体落盘的后端在此持久化"""
+        pass
+
+    def needs_compaction(self) -> bool:
+        """已删除的数据是否多到需要执行maintain()，默认不需要"""
+        return False
+
+    def maintain(self) -> bool:
+        """执行耗时的存储维护（如压缩向量文件、重建索引），默认无需维护
+
+        Returns:
+            是否执行了维护
+        """
+        return False
+
+    def _write_batch_size(self) -> int:
+        """每批写入的文本数"""
+        return max(1, VECTOR_STORE_CONFIG["write_batch_size"])
+
+    # ---- 与后端无关的公共接口 ----
+
+    def _get_sparse_index(self) -> BM25Index:
+        """获取稀疏索引，首次使用时与集合核对，不一致则重建"""
+        if self.sparse_index is None:
+            raise ValueError("混合检索需要启用稀疏索引（sparse_index_enabled）")
+
+        if not self._sparse_index_checked:
+            if self.sparse_index.count() != self.count():
+                self.rebuild_sparse_index()
+            self._sparse_index_checked = True
+        return self.sparse_index
+
+    def rebuild_sparse_index(self, page_size: int = 1000) -> None:
+        """根据集合中的全部文档重建稀疏索引"""
+        print("正在重建BM25稀疏索引")
+        self.sparse_index.reset()
+        total = 0
+        for ids, documents in self._iter_documents(page_size):
+            self.sparse_index.add(ids, documents)
+            total += len(ids)
+        print(f"BM25稀疏索引重建完成，共{total}条")
+
+    def add_texts(
+        self,
+        texts: List[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        ids: Optional[List[str]] = None,
+        progress_callback: Optional[Callable[[str, float], None]] = None,
+        embeddings: Optional[np.ndarray] = None,
+        stats: Optional[Dict[str, Any]] = None,
+        **kwargs
+    ) -> List[str]:
+        """添加文本到向量存储
+
+        写入按ID做upsert：已存在且内容相同的文本块不重新计算向量，元数据有变化时只更新元数据；
+        其余文本按批次写入，第N+1批的向量在第N批写入存储的同时计算。
+
+        Args:
+            texts: 要添加的文本列表
+            metadatas: 文本对应的元数据列表
+            ids: 文本对应的ID列表，如果不提供则根据(来源, 文本哈希)生成
+            progress_callback: 进度回调函数，每写完一批以("vector_store", 完成比例)调用
+            embeddings: 可选的与文本对应的向量矩阵，提供时直接写入，不调用嵌入模型
+            stats: 可选的字典，写入本次调用的统计：写入、仅更新元数据和未变化的文本块数。
+                存储实例在会话间共享，统计按调用返回而不保存在实例上
+
+        Returns:
+            添加的文本ID列表
+        """
+        if not texts:
+            return []
+
+        # 确保metadatas与texts长度一致
+        if metadatas is None:
+            metadatas = [{} for _ in range(len(texts))]
+
+        # 如果没有提供ID，则根据内容生成
+        if ids is None:
+            ids = make_chunk_ids(texts, metadatas)
+
+        # 内容未变化的文本块跳过嵌入
+        existing = self.get(ids)
+        existing_docs = dict(zip(existing["ids"], zip(existing["documents"], existing["metadatas"])))
+        pending = []
+        metadata_only = []
+        for i, (doc_id, text, metadata) in enumerate(zip(ids, texts, metadatas)):
+            old = existing_docs.get(doc_id)
+            if old is None or old[0] != text:
+                pending.append(i)
+            elif old[1] != metadata:
+                metadata_only.append(i)
+
+        if metadata_only:
+            try:
+                self._update_metadatas([ids[i] for i in metadata_only], [metadatas[i] for i in metadata_only])
+            finally:
+                # 写入完成后再递增版本号，写入期间的检索结果以旧版本号缓存，之后不会再命中
+                if not pending:
+                    self._bump_version()
+        unchanged = len(texts) - len(pending) - len(metadata_only)
+        if stats is not None:
+            stats.update(written=len(pending), metadata_updated=len(metadata_only), unchanged=unchanged)
+        print(f"写入向量存储: 新增或变更{len(pending)}条，仅更新元数据{len(metadata_only)}条，"
+              f"未变化{unchanged}条")
+
+        if not pending:
+            if progress_callback:
+                progress_callback("vector_store", 1.0)
+            return ids
+
+        pending_ids = [ids[i] for i in pending]
+        pending_texts = [texts[i] for i in pending]
+        pending_metadatas = [metadatas[i] for i in pending]
+
+        if embeddings is not None:
+            self.add_embeddings(pending_texts, np.asarray(embeddings)[pending], pending_metadatas, pending_ids,
+                                progress_callback=progress_callback)
+            return ids
+
+        batch_size = self._write_batch_size()
+        batches = [(start, min(start + batch_size, len(pending))) for start in range(0, len(pending), batch_size)]
+
+        # 单独的线程计算下一批向量，当前线程负责写入
+        try:
+            with ThreadPoolExecutor(max_workers=1) as embed_pool:
+                start, end = batches[0]
+                next_embeddings = embed_pool.submit(self._embed, pending_texts[start:end])
+
+                for batch_no, (start, end) in enumerate(batches):
+                    embeddings = next_embeddings.result()
+                    if batch_no + 1 < len(batches):
+                        next_start, next_end = batches[batch_no + 1]
+                        next_embeddings = embed_pool.submit(self._embed, pending_texts[next_start:next_end])
+
+                    self._upsert_batch(pending_ids[start:end], pending_texts[start:end],
+                                       pending_metadatas[start:end], embeddings)
+                    if self.sparse_index is not None:
+                        self.sparse_index.add(pending_ids[start:end], pending_texts[start:end])
+
+                    if progress_callback:
+                        progress_callback("vector_store", end / len(pending))
+            self._flush()
+        finally:
+            self._bump_version()
+
+        return ids
+
+    def add_embeddings(
+        self,
+        texts: List[str],
+        embeddings: np.ndarray,
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        ids: Optional[List[str]] = None,
+        progress_callback: Optional[Callable[[str, float], None]] = None
+    ) -> List[str]:
+        """使用已有向量直接批量写入，不调用嵌入模型，也不做已存在内容的比对
+
+        Args:
+            texts: 文本列表
+            embeddings: 与文本对应的向量矩阵
+            metadatas: 文本对应的元数据列表
+            ids: 文本对应的ID列表，如果不提供则根据(来源, 文本哈希)生成
+            progress_callback: 进度回调函数，每写完一批以("vector_store", 完成比例)调用
+
+        Returns:
+            写入的文本ID列表
+        """
+        if not texts:
+            return []
+
+        if metadatas is None:
+            metadatas = [{} for _ in range(len(texts))]
+        if ids is None:
+            ids = make_chunk_ids(texts, metadatas)
+
+        self.add_embedding_batches([(texts, embeddings, metadatas, ids)], len(texts), progress_callback)
+        return ids
+
+    def add_embedding_batches(
+        self,
+        batches: Iterable[Tuple[List[str], np.ndarray, List[Dict[str, Any]], List[str]]],
+        total: int,
+        progress_callback: Optional[Callable[[str, float], None]] = None
+    ) -> int:
+        """逐批写入已有向量，批次可以来自流式读取，全部写完后只落盘一次
+
+        Args:
+            batches: (文本列表, 向量矩阵, 元数据列表, ID列表)的可迭代对象
+            total: 文本块总数，用于计算进度
+            progress_callback: 进度回调函数，每写完一批以("vector_store", 完成比例)调用
+
+        Returns:
+            写入的文本块数量
+        """
+        batch_size = self._write_batch_size()
+        written = 0
+        try:
+            for texts, embeddings, metadatas, ids in batches:
+                embeddings = np.asarray(embeddings, dtype=np.float32)
+                for start in range(0, len(texts), batch_size):
+                    end = min(start + batch_size, len(texts))
+                    self._upsert_batch(ids[start:end], texts[start:end], metadatas[start:end], embeddings[start:end])
+                    if self.sparse_index is not None:
+                        self.sparse_index.add(ids[start:end], texts[start:end])
+                    written += end - start
+                    if progress_callback and total:
+                        progress_callback("vector_store", written / total)
+            self._flush()
+        finally:
+            # 全部写入落盘后再递增版本号，写入期间缓存的结果随之失效
+            self._bump_version()
+
+        return written
+
+    def similarity_search(
+        self,
+        query: str,
+        k: int = None,
+        filter: Optional[Dict[str, Any]] = None,
+        use_llm: bool = False,
+        mode: str = None,
+        rerank: bool = None,
+        include: Optional[List[str]] = None,
+        stats: Optional[Dict[str, Any]] = None,
+        **kwargs
+    ) -> List[Dict[str, Any]]:
+        """基于相似度搜索文本
+
+        Args:
+            query: 查询文本
+            k: 返回的最相似文档数量，默认使用配置文件中的设置
+            filter: 过滤条件
+            mode: 检索模式，"dense"为纯向量检索，"hybrid"为BM25与向量检索融合，默认使用配置文件中的设置
+            rerank: 是否用交叉编码器对候选池重排序，默认使用配置文件中的设置
+            include: 需要返回的字段，取值为"score"、"metadata"、"content"，默认全部返回。
+                不需要的字段不会从存储中读取，未取的文本可以之后用load_contents补齐
+            stats: 可选的字典，写入本次检索的耗时统计，检索和重排序分开记录。
+                存储实例在会话间共享，统计按调用返回而不保存在实例上
+
+        Returns:
+            相似文档列表，每个文档包含id以及include指定的文本内容、元数据、相似度分数和原始距离
+        """
+        k = k or VECTOR_STORE_CONFIG["top_k"]
+        mode = mode or VECTOR_STORE_CONFIG["search_mode"]
+        rerank = VECTOR_STORE_CONFIG["rerank_enabled"] if rerank is None else rerank
+        include = self._check_include(include)
+        if rerank and self.reranker is None:
+            raise ValueError("重排序需要提供reranker")
+
+        start_time = time.perf_counter()
+        cache_key = None
+        if self.query_cache is not None:
+            cache_key = QueryResultCache.make_key(query, k, filter, type(self).__name__, mode, rerank, include)
+            cached = self.query_cache.get(cache_key, self.version)
+            if cached is not None:
+                if stats is not None:
+                    stats.update(mode=mode, search_ms=(time.perf_counter() - start_time) * 1000,
+                                 rerank_ms=0.0, cache_hit=True)
+                return cached
+        # 检索前记录版本号，检索期间发生写入时缓存的结果不会再被命中
+        version = self.version
+
+        # 重排序时先取更大的候选池，交叉编码器打分需要文本
+        fetch_k = k * VECTOR_STORE_CONFIG["rerank_pool_multiplier"] if rerank else k
+        fetch_include = tuple(sorted(set(include) | {"content"})) if rerank else include
+
+        if mode == "hybrid":
+            results = self._hybrid_search(query, fetch_k, filter, fetch_include)
+        elif mode == "dense":
+            results = self._dense_search(query, fetch_k, filter, fetch_include)
+        else:
+            raise ValueError(f"不支持的检索模式: {mode}")
+        if stats is not None:
+            stats.update(mode=mode, search_ms=(time.perf_counter() - start_time) * 1000,
+                         rerank_ms=0.0, cache_hit=False)
+
+        if rerank:
+            results, rerank_stats = self.reranker.rerank(query, results, k)
+            if stats is not None:
+                stats.update(rerank_stats)
+            if "content" not in include:
+                for result in results:
+                    result.pop("content", None)
+
+        if cache_key is not None:
+            self.query_cache.put(cache_key, version, results, (time.perf_counter() - start_time) * 1000)
+
+        return results
+
+    @staticmethod
+    def _check_include(include: Optional[List[str]]) -> Tuple[str, ...]:
+        """校验并规范化include参数"""
+        if include is None:
+            return SEARCH_RESULT_FIELDS
+        unknown = set(include) - set(SEARCH_RESULT_FIELDS)
+        if unknown:
+            raise ValueError(f"不支持的检索结果字段: {sorted(unknown)}")
+        return tuple(field for field in SEARCH_RESULT_FIELDS if field in include)
+
+    @staticmethod
+    def _query_include(include: Tuple[str, ...]) -> Tuple[str, ...]:
+        """检索结果字段对应的_query返回字段"""
+        return tuple(_QUERY_FIELDS[field] for field in include if field in _QUERY_FIELDS)
+
+    def _dense_search(self, query: str, k: int, filter: Optional[Dict[str, Any]],
+                      include: Tuple[str, ...] = SEARCH_RESULT_FIELDS) -> List[Dict[str, Any]]:
+        """纯向量检索"""
+        # 执行查询
+        results = self._query(self._embed_queries([query]), k, filter, self._query_include(include))
+        logger.debug("向量检索: query=%r k=%d 命中%d条", query, k, len(results["ids"][0]))
+
+        return self._build_results(results, 0, include)
+
+    def _hybrid_search(self, query: str, k: int, filter: Optional[Dict[str, Any]],
+                       include: Tuple[str, ...] = SEARCH_RESULT_FIELDS) -> List[Dict[str, Any]]:
+        """BM25与向量检索结果按倒数排名融合
+
+        两路各取k的若干倍作为候选，融合后取前k条。score为归一化到[0, 1]的融合分数。
+        """
+        sparse_index = self._get_sparse_index()
+        candidate_k = k * VECTOR_STORE_CONFIG["hybrid_candidate_multiplier"]
+        rrf_k = VECTOR_STORE_CONFIG["rrf_k"]
+
+        # 向量检索候选，只取排名和ID，融合后再读取入选文档需要的字段
+        results = self._query(self._embed_queries([query]), candidate_k, filter, ())
+        dense_results = self._build_results(results, 0, ("score",))
+        dense_by_id = {result["id"]: result for result in dense_results}
+
+        # 稀疏检索候选，过滤条件在确认文档是否存在时生效
+        sparse_hits = sparse_index.search(query, candidate_k)
+        bm25_scores = dict(sparse_hits)
+        fetched_docs = {}
+        missing = [doc_id for doc_id, _ in sparse_hits if doc_id not in dense_by_id]
+        if missing:
+            fetched = self.get(missing, where=filter)
+            for doc_id, document, metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"]):
+                fetched_docs[doc_id] = (document, metadata)
+        sparse_ranking = [doc_id for doc_id, _ in sparse_hits if doc_id in dense_by_id or doc_id in fetched_docs]
+
+        fused = reciprocal_rank_fusion([list(dense_by_id), sparse_ranking], rrf_k)[:k]
+        max_score = 2.0 / (rrf_k + 1)
+        logger.debug("混合检索: query=%r 向量候选%d条 稀疏候选%d条 融合后%d条",
+                     query, len(dense_by_id), len(sparse_ranking), len(fused))
+
+        # 读取入选的向量检索文档的文本和元数据
+        need_fetch = [doc_id for doc_id, _ in fused if doc_id not in fetched_docs]
+        if need_fetch and ("content" in include or "metadata" in include):
+            fetched = self.get(need_fetch)
+            for doc_id, document, metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"]):
+                fetched_docs[doc_id] = (document, metadata)
+
+        search_results = []
+        for doc_id, fused_score in fused:
+            result = {"id": doc_id}
+            if doc_id in fetched_docs:
+                content, metadata = fetched_docs[doc_id]
+                if "content" in include:
+                    result["content"] = content
+                if "metadata" in include:
+                    result["metadata"] = metadata
+            if "score" in include:
+                result["score"] = fused_score / max_score
+                result["distance"] = dense_by_id[doc_id]["distance"] if doc_id in dense_by_id else None
+                result["rrf_score"] = fused_score
+                result["bm25_score"] = bm25_scores.get(doc_id)
+            search_results.append(result)
+
+        return search_results
+
+    def similarity_search_batch(
+        self,
+        queries: List[str],
+        k: int = None,
+        filter: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+        **kwargs
+    ) -> List[List[Dict[str, Any]]]:
+        """批量相似度搜索，所有查询一次编码、一次查询
+
+        Args:
+            queries: 查询文本列表
+            k: 每个查询返回的最相似文档数量，默认使用配置文件中的设置
+            filter: 过滤条件，对所有查询生效
+            include: 需要返回的字段，含义与similarity_search相同
+
+        Returns:
+            与queries一一对应的结果列表，每项格式与similarity_search的返回值相同
+        """
+        if not queries:
+            return []
+
+        k = k or VECTOR_STORE_CONFIG["top_k"]
+        include = self._check_include(include)
+
+        # 一次模型调用编码全部查询，一次向量化查询
+        results = self._query(self._embed_queries(queries), k, filter, self._query_include(include))
+
+        return [self._build_results(results, i, include) for i in range(len(queries))]
+
+    def _build_results(self, results: Dict[str, Any], index: int,
+                       include: Tuple[str, ...] = SEARCH_RESULT_FIELDS) -> List[Dict[str, Any]]:
+        """将_query的第index个查询结果组装为返回格式
+
+        Args:
+            results: _query的返回值
+            index: 查询在批次中的位置
+            include: 需要返回的字段
+
+        Returns:
+            相似文档列表
+        """
+        ids = results["ids"][index]
+        distances = results["distances"][index]
+        documents = results["documents"][index] if "content" in include else None
+        metadatas = results["metadatas"][index] if "metadata" in include else None
+
+        # 组装返回结果
+        search_results = []
+        for i, doc_id in enumerate(ids):
+            result = {"id": doc_id}
+            if documents is not None:
+                result["content"] = documents[i]
+            if metadatas is not None:
+                result["metadata"] = metadatas[i]
+            if "score" in include:
+                # 相似度分数和原始距离值
+                result["score"] = 1.0 - distances[i]
+                result["distance"] = distances[i]
+            search_results.append(result)
+
+        return search_results
+
+    def load_contents(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """为未取文本的检索结果补齐文本内容，一次读取全部缺少的文本
+
+        Args:
+            results: similarity_search的返回值
+
+        Returns:
+            原结果列表，每项补齐content字段
+        """
+        missing = [result["id"] for result in results if "content" not in result]
+        if missing:
+            fetched = self.get(missing)
+            documents = dict(zip(fetched["ids"], fetched["documents"]))
+            for result in results:
+                if "content" not in result:
+                    result["content"] = documents.get(result["id"])
+        return results
+
+    def delete(self, ids: List[str]) -> None:
+        """删除指定ID的文档
+
+        Args:
+            ids: 要删除的文档ID列表
+        """
+        if not ids:
+            return
+
+        self._delete(ids)
+        if self.sparse_index is not None:
+            self.sparse_index.delete(ids)
+        self._bump_version()
+
+    def get_by_source(self, source: str) -> Dict[str, Any]:
+        """获取某个来源的全部文本块
+
+        Args:
+            source: 文档来源（文件路径或网页链接）
+
+        Returns:
+            文档内容、元数据和ID
+        """
+        return self._get_where({"source": source})
+
+    def delete_by_source(self, source: str) -> int:
+        """按来源一次删除文档的全部文本块
+
+        Args:
+            source: 文档来源（文件路径或网页链接）
+
+        Returns:
+            删除的文本块数量
+        """
+        ids = self._delete_where({"source": source})
+        if self.sparse_index is not None:
+            self.sparse_index.delete(ids)
+        self._bump_version()
+        return len(ids)
+
+    def replace_source(
+        self,
+        source: str,
+        texts: List[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        progress_callback: Optional[Callable[[str, float], None]] = None,
+        embeddings: Optional[np.ndarray] = None,
+        stats: Optional[Dict[str, Any]] = None
+    ) -> List[str]:
+        """用文档的新版本替换同一来源的全部文本块，只处理变化的部分
+
+        新旧版本按文本块ID（由来源和文本哈希确定）比较：未变化的文本块不重新计算向量，
+        新增的写入，旧版本中不再出现的删除。
+
+        Args:
+            source: 文档来源（文件路径或网页链接）
+            texts: 新版本的文本块列表
+            metadatas: 文本块对应的元数据列表，来源统一设置为source
+            progress_callback: 进度回调函数，含义与add_texts相同
+            embeddings: 可选的与文本块对应的向量矩阵，含义与add_texts相同
+            stats: 可选的字典，写入与add_texts相同的统计以及删除的文本块数deleted
+
+        Returns:
+            新版本的文本块ID列表
+        """
+        metadatas = [dict(metadata or {}, source=source) for metadata in (metadatas or [{} for _ in texts])]
+        old_ids = set(self._get_where({"source": source})["ids"])
+
+        write_stats = {"written": 0, "metadata_updated": 0, "unchanged": 0}
+        ids = self.add_texts(texts, metadatas, progress_callback=progress_callback, embeddings=embeddings,
+                             stats=write_stats) if texts else []
+        stale = list(old_ids - set(ids))
+        if stale:
+            self.delete(stale)
+        write_stats["deleted"] = len(stale)
+        if stats is not None:
+            stats.update(write_stats)
+        print(f"替换文档 {source}: 删除旧版本中不再出现的文本块{len(stale)}条")
+
+        return ids
+
+    def update_texts(
+        self,
+        texts: List[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        ids: List[str] = None,
+        **kwargs
+    ) -> List[str]:
+        """更新文本，按ID直接upsert，不存在先删除后写入的空窗
+
+        Args:
+            texts: 要更新的文本列表
+            metadatas: 文本对应的元数据列表
+            ids: 文本对应的ID列表，必须提供
+
+        Returns:
+            更新的文本ID列表
+        """
+        if not texts or not ids:
+            return []
+
+        return self.add_texts(texts, metadatas, ids)
+
+    def reset(self) -> None:
+        """重置集合，删除所有文档"""
+        self._reset()
+        if self.sparse_index is not None:
+            self.sparse_index.reset()
+        self._bump_version()
+
+
+def get_hnsw_params(collection_name: str) -> Dict[str, int]:
+    """获取集合的HNSW参数，集合级配置覆盖全局配置
+
+    Args:
+        collection_name: 集合名称
+
+    Returns:
+        包含M、construction_ef和search_ef的字典
+    """
+    params = dict(VECTOR_STORE_CONFIG["hnsw"])
+    params.update(VECTOR_STORE_CONFIG["hnsw_collections"].get(collection_name, {}))
+    return params
+
+
+def get_store_class(backend: str = None) -> type:
+    """根据后端名称获取向量存储类
+
+    Args:
+        backend: 后端名称，默认使用配置文件中的设置
+
+    Returns:
+        向量存储类
+    """
+    backend = backend or VECTOR_STORE_CONFIG.get("backend", "chroma")
+    if backend == "faiss":
+        from .faiss_store import FaissStore
+        return FaissStore
+    if backend == "numpy":
+        from .numpy_store import NumpyStore
+        return NumpyStore
+    if backend == "chroma":
+        from .chroma_store import ChromaStore
+        return ChromaStore
+    raise ValueError(f"不支持的向量存储后端: {backend}")
+
+
+def create_vector_store(collection_name: str = "knowledge_base", **kwargs) -> BaseVectorStore:
+    """向量存储工厂方法，根据配置创建对应的存储后端
+
+    配置了分片策略时返回由多个同类后端组成的分片存储。
+
+    Args:
+        collection_name: 集合名称
+        **kwargs: 传给存储后端构造函数的参数（embedding_function、embedding_model等）
+
+    Returns:
+        向量存储实例
+    """
+    if VECTOR_STORE_CONFIG["shard_strategy"] != "none":
+        from .sharded_store import ShardedStore
+        return ShardedStore(collection_name, **kwargs)
+    return get_store_class()(collection_name, **kwargs)
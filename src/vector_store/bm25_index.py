@@ -0,0 +1,184 @@
+"""基于jieba分词的BM25稀疏倒排索引，用于混合检索"""
+
+import os
+import re
+import math
+import sqlite3
+import threading
+from collections import Counter
+from typing import List, Dict, Tuple, Iterable, Optional
+from config import VECTOR_STORE_DIR
+
+# 只保留包含字母、数字或汉字的词
+_TOKEN_PATTERN = re.compile(r"\w", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """使用jieba搜索引擎模式分词
+
+    Args:
+        text: 待分词的文本
+
+    Returns:
+        小写的词列表，去除标点和空白
+    """
+    # jieba导入和词典加载耗时较长，延迟到首次分词时
+    import jieba
+
+    return [token for token in jieba.lcut_for_search(text.lower()) if _TOKEN_PATTERN.search(token)]
+
+
+class BM25Index:
+    """BM25倒排索引
+
+    倒排表保存在SQLite中，随add/delete增量维护，无需整体重写文件。
+    """
+
+    def __init__(self, collection_name: str, index_dir: str = None,
+                 k1: float = 1.5, b: float = 0.75):
+        """初始化倒排索引
+
+        Args:
+            collection_name: 对应的向量集合名称
+            index_dir: 索引文件目录，默认与向量存储放在一起
+            k1: BM25词频饱和参数
+            b: BM25文档长度归一化参数
+        """
+        self.k1 = k1
+        self.b = b
+        self.path = os.path.join(index_dir or VECTOR_STORE_DIR, f"bm25_{collection_name}.sqlite3")
+        self._lock = threading.Lock()
+
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                doc_id TEXT PRIMARY KEY,
+                length INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, doc_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings (doc_id);
+        """)
+
+        # 文档数和总长度缓存在内存中，随增删更新
+        self._doc_count, self._total_length = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs"
+        ).fetchone()
+
+    def count(self) -> int:
+        """索引中的文档数"""
+        return self._doc_count
+
+    def add(self, ids: List[str], texts: List[str]) -> None:
+        """添加（或覆盖）文档
+
+        Args:
+            ids: 文档ID列表
+            texts: 文档文本列表
+        """
+        if not ids:
+            return
+        # 已存在的文档先删除，保证统计量正确
+        self.delete(ids)
+
+        rows_docs = []
+        rows_postings = []
+        for doc_id, text in zip(ids, texts):
+            tokens = tokenize(text)
+            rows_docs.append((doc_id, len(tokens)))
+            rows_postings.extend((term, doc_id, tf) for term, tf in Counter(tokens).items())
+
+        with self._lock, self.conn:
+            self.conn.executemany("INSERT INTO docs (doc_id, length) VALUES (?, ?)", rows_docs)
+            self.conn.executemany("INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)", rows_postings)
+            self._doc_count += len(rows_docs)
+            self._total_length += sum(length for _, length in rows_docs)
+
+    def delete(self, ids: Iterable[str]) -> None:
+        """删除文档
+
+        Args:
+            ids: 文档ID列表
+        """
+        ids = list(ids)
+        if not ids:
+            return
+
+        with self._lock, self.conn:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                removed_count, removed_length = self.conn.execute(
+                    f"SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs WHERE doc_id IN ({placeholders})", batch
+                ).fetchone()
+                self.conn.execute(f"DELETE FROM postings WHERE doc_id IN ({placeholders})", batch)
+                self.conn.execute(f"DELETE FROM docs WHERE doc_id IN ({placeholders})", batch)
+                self._doc_count -= removed_count
+                self._total_length -= removed_length
+
+    def reset(self) -> None:
+        """清空索引"""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM postings")
+            self.conn.execute("DELETE FROM docs")
+            self._doc_count = 0
+            self._total_length = 0
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """BM25检索
+
+        Args:
+            query: 查询文本
+            k: 返回的文档数量
+
+        Returns:
+            按分数降序排列的(文档ID, BM25分数)列表
+        """
+        terms = set(tokenize(query))
+        if not terms or self._doc_count == 0:
+            return []
+
+        avg_length = self._total_length / self._doc_count
+        scores: Dict[str, float] = {}
+
+        with self._lock:
+            for term in terms:
+                postings = self.conn.execute(
+                    "SELECT p.doc_id, p.tf, d.length FROM postings p JOIN docs d ON p.doc_id = d.doc_id "
+                    "WHERE p.term = ?", (term,)
+                ).fetchall()
+                if not postings:
+                    continue
+
+                df = len(postings)
+                idf = math.log(1 + (self._doc_count - df + 0.5) / (df + 0.5))
+                for doc_id, tf, length in postings:
+                    norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        self.conn.close()
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], rrf_k: int = 60) -> List[Tuple[str, float]]:
+    """倒数排名融合（RRF）
+
+    Args:
+        rankings: 多个按相关性排序的文档ID列表
+        rrf_k: 平滑常数
+
+    Returns:
+        按融合分数降序排列的(文档ID, 融合分数)列表
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
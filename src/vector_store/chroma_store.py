@@ -1,47 +1,59 @@
 """基于Chromadb的向量存储实现"""
 
-import os
-import uuid
-import chromadb
-from chromadb.config import Settings
-from typing import List, Dict, Any, Optional, Union
-from sentence_transformers import SentenceTransformer
-from config import VECTOR_STORE_DIR, VECTOR_STORE_CONFIG, MODEL_CONFIG
+import threading
+import numpy as np
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+from config import VECTOR_STORE_DIR, VECTOR_STORE_CONFIG
+from .base_store import BaseVectorStore, get_hnsw_params
 
-# 默认的embedding模型
-DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+# 按存储路径缓存的Chromadb客户端
+_clients = {}
+_client_lock = threading.Lock()
 
 
-class ChromaStore:
+class ChromaStore(BaseVectorStore):
     """基于Chromadb的向量存储实现"""
 
-    def __init__(self, collection_name: str = "knowledge_base", embedding_function=None):
+    def __init__(self, collection_name: str = "knowledge_base", embedding_function=None,
+                 embedding_executor=None, embedding_model=None, reranker=None, sparse_index: bool = True):
         """初始化向量存储
 
         Args:
             collection_name: 集合名称，默认为knowledge_base
             embedding_function: 嵌入函数，用于将文本转换为向量
+            embedding_executor: 可选的多进程嵌入执行器，add_texts时用于批量生成向量
+            embedding_model: 可选的SentenceEmbedding，提供encode_array时直接获取float32矩阵
+            reranker: 可选的CrossEncoderReranker，用于对检索结果重排序
+            sparse_index: 是否维护BM25稀疏索引，还需要配置中启用sparse_index_enabled
         """
-        self.collection_name = collection_name
-        self.embedding_function = embedding_function or self._default_embedding_function()
-        self.embedding_model = SentenceTransformer(DEFAULT_EMBEDDING_MODEL)
+        super().__init__(collection_name, embedding_function, embedding_executor, embedding_model, reranker,
+                         sparse_index)
         self.__post_init__()
-        
-    def _default_embedding_function(self):
-        """默认的embedding函数"""
-        def embed_function(texts: List[str]) -> List[List[float]]:
-            return self.embedding_model.encode(texts).tolist()
-        return embed_function
+    
+    @staticmethod
+    def _to_chroma_embeddings(embeddings: np.ndarray) -> List[List[float]]:
+        """转换为Chromadb接受的嵌套列表
+
+        chromadb 0.4.x只接受list类型的向量，转换集中在写入边界一次完成。
+        """
+        return embeddings.tolist()
 
     def __post_init__(self):
-        # 初始化Chromadb客户端
-        self.client = chromadb.PersistentClient(
-            path=VECTOR_STORE_DIR,
-            settings=Settings(
-                anonymized_telemetry=False,  # 禁用遥测数据收集
-                allow_reset=True,
-            )
-        )
+        # chromadb导入耗时较长，延迟到创建客户端时
+        import chromadb
+        from chromadb.config import Settings
+
+        # 初始化Chromadb客户端，同一进程中的多个集合（如分片）共用一个客户端
+        with _client_lock:
+            if VECTOR_STORE_DIR not in _clients:
+                _clients[VECTOR_STORE_DIR] = chromadb.PersistentClient(
+                    path=VECTOR_STORE_DIR,
+                    settings=Settings(
+                        anonymized_telemetry=False,  # 禁用遥测数据收集
+                        allow_reset=True,
+                    )
+                )
+            self.client = _clients[VECTOR_STORE_DIR]
         
         # 获取或创建集合
         try:
@@ -49,155 +61,92 @@ class ChromaStore:
                 name=self.collection_name,
                 embedding_function=self.embedding_function
             )
+            self._check_hnsw_params()
         except ValueError:
             # 集合不存在，创建新集合
             self.collection = self.client.create_collection(
                 name=self.collection_name,
                 embedding_function=self.embedding_function,
-                metadata={"hnsw:space": VECTOR_STORE_CONFIG["distance_metric"]}
+                metadata=self._collection_metadata()
             )
-    
-    def add_texts(
-        self, 
-        texts: List[str], 
-        metadatas: Optional[List[Dict[str, Any]]] = None,
-        ids: Optional[List[str]] = None,
-        **kwargs
-    ) -> List[str]:
-        """添加文本到向量存储
-
-        Args:
-            texts: 要添加的文本列表
-            metadatas: 文本对应的元数据列表
-            ids: 文本对应的ID列表，如果不提供则自动生成
-
-        Returns:
-            添加的文本ID列表
-        """
-        if not texts:
-            return []
-
-        # 如果没有提供ID，则自动生成
-        if ids is None:
-            ids = [str(uuid.uuid4()) for _ in range(len(texts))]
-        
-        # 确保metadatas与texts长度一致
-        if metadatas is None:
-            metadatas = [{} for _ in range(len(texts))]
         
-        # 添加文本到集合
-        self.collection.add(
+        # BM25稀疏索引，随写入和删除增量维护
+        self._init_sparse_index(VECTOR_STORE_DIR)
+    
+    def _collection_metadata(self) -> Dict[str, Any]:
+        """创建集合时使用的元数据，包含距离度量和HNSW参数"""
+        params = get_hnsw_params(self.collection_name)
+        return {
+            "hnsw:space": VECTOR_STORE_CONFIG["distance_metric"],
+            "hnsw:M": params["M"],
+            "hnsw:construction_ef": params["construction_ef"],
+            "hnsw:search_ef": params["search_ef"],
+        }
+    
+    def _check_hnsw_params(self) -> None:
+        """已有集合的HNSW参数在创建时确定，与配置不一致时提示"""
+        current = self.collection.metadata or {}
+        expected = self._collection_metadata()
+        changed = [key for key, value in expected.items() if key in current and current[key] != value]
+        changed += [key for key in expected if key not in current and key != "hnsw:space"]
+        if changed:
+            print(f"集合 {self.collection_name} 的HNSW参数与配置不一致（{', '.join(changed)}），"
+                  f"重置集合后按新参数建索引")
+    
+    def _iter_documents(self, page_size: int) -> Iterator[Tuple[List[str], List[str]]]:
+        """分页遍历集合中的全部文档"""
+        offset = 0
+        while True:
+            page = self.collection.get(limit=page_size, offset=offset, include=["documents"])
+            if not page["ids"]:
+                break
+            yield page["ids"], page["documents"]
+            offset += len(page["ids"])
+    
+    def _upsert_batch(self, ids: List[str], texts: List[str],
+                      metadatas: List[Dict[str, Any]], embeddings: np.ndarray) -> None:
+        """写入一批文本，向量以float32矩阵形式生成，直到写入集合时才转换"""
+        self.collection.upsert(
             documents=texts,
             metadatas=metadatas,
+            embeddings=self._to_chroma_embeddings(embeddings),
             ids=ids
         )
-        
-        return ids
     
-    def similarity_search(
-        self, 
-        query: str, 
-        k: int = None,
-        filter: Optional[Dict[str, Any]] = None,
-        use_llm: bool = False,
-        **kwargs
-    ) -> List[Dict[str, Any]]:
-        """基于相似度搜索文本
-
-        Args:
-            query: 查询文本
-            k: 返回的最相似文档数量，默认使用配置文件中的设置
-            filter: 过滤条件
-
-        Returns:
-            相似文档列表，每个文档包含文本内容、元数据、相似度分数和相似文本片段
-        """
-        k = k or VECTOR_STORE_CONFIG["top_k"]
-        
-        # 执行查询
-        results = self.collection.query(
-            query_texts=[query],
+    def _update_metadatas(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """只更新元数据，不改动向量和文本"""
+        batch_size = self._write_batch_size()
+        for start in range(0, len(ids), batch_size):
+            self.collection.update(ids=ids[start:start + batch_size], metadatas=metadatas[start:start + batch_size])
+    
+    def _write_batch_size(self) -> int:
+        """每批写入的文本数，不超过Chromadb客户端允许的最大批次"""
+        batch_size = VECTOR_STORE_CONFIG["write_batch_size"]
+        max_batch_size = getattr(self.client, "max_batch_size", None)
+        if max_batch_size:
+            batch_size = min(batch_size, max_batch_size)
+        return max(1, batch_size)
+    
+    def _query(self, query_embeddings: np.ndarray, k: int, filter: Optional[Dict[str, Any]] = None,
+               include: Tuple[str, ...] = ("documents", "metadatas")) -> Dict[str, Any]:
+        """按向量查询集合，只读取include中的字段"""
+        return self.collection.query(
+            query_embeddings=self._to_chroma_embeddings(query_embeddings),
             n_results=k,
-            where=filter
+            where=filter,
+            include=list(include) + ["distances"]
         )
-
-        print(results)
-        
-        # 处理结果
-        documents = results.get("documents", [[]])[0]
-        metadatas = results.get("metadatas", [[]])[0]
-        distances = results.get("distances", [[]])[0]
-        ids = results.get("ids", [[]])[0]
-        
-        # 组装返回结果
-        search_results = []
-        for i in range(len(documents)):
-            # 提取相关文本片段
-            content = documents[i]
-            # 计算相似度分数
-            similarity_score = 1.0 - distances[i]
-            
-            # 提取相似文本片段
-            similar_text = content
-            
-            search_results.append({
-                "content": content,
-                "metadata": metadatas[i],
-                "score": similarity_score,
-                "id": ids[i],
-                "query": query,  # 添加查询文本，用于后续高亮显示
-                "similar_text": similar_text,  # 添加相似文本片段
-                "distance": distances[i]  # 添加原始距离值
-            })
-        
-        return search_results
     
-    def delete(self, ids: List[str]) -> None:
-        """删除指定ID的文档
-
-        Args:
-            ids: 要删除的文档ID列表
-        """
-        if not ids:
-            return
-        
+    def _delete(self, ids: List[str]) -> None:
+        """从集合中删除指定ID的文档"""
         self.collection.delete(ids=ids)
     
-    def update_texts(
-        self, 
-        texts: List[str], 
-        metadatas: Optional[List[Dict[str, Any]]] = None,
-        ids: List[str] = None,
-        **kwargs
-    ) -> List[str]:
-        """更新文本
-
-        Args:
-            texts: 要更新的文本列表
-            metadatas: 文本对应的元数据列表
-            ids: 文本对应的ID列表，必须提供
-
-        Returns:
-            更新的文本ID列表
-        """
-        if not texts or not ids:
-            return []
-        
-        # 确保metadatas与texts长度一致
-        if metadatas is None:
-            metadatas = [{} for _ in range(len(texts))]
-        
-        # 先删除旧文档
-        self.delete(ids)
-        
-        # 添加新文档
-        return self.add_texts(texts, metadatas, ids)
-    
-    def get(self, ids: List[str]) -> Dict[str, Any]:
+    def get(self, ids: List[str], where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """获取指定ID的文档
 
         Args:
             ids: 要获取的文档ID列表
+            where: 可选的元数据过滤条件
 
         Returns:
             文档内容、元数据和ID
@@ -205,7 +154,7 @@ class ChromaStore:
         if not ids:
             return {"documents": [], "metadatas": [], "ids": []}
         
-        results = self.collection.get(ids=ids)
+        results = self.collection.get(ids=ids, where=where)
         
         return {
             "documents": results.get("documents", []),
@@ -213,6 +162,54 @@ class ChromaStore:
             "ids": results.get("ids", [])
         }
     
+    def _existing_ids(self, ids: List[str]) -> List[str]:
+        """只取ID，不读取文本和元数据"""
+        return self.collection.get(ids=ids, include=[])["ids"] if ids else []
+    
+    def _get_embeddings(self, ids: List[str]) -> Tuple[List[str], List[str], List[Dict[str, Any]], np.ndarray]:
+        """按ID读取文本、元数据和向量"""
+        if not ids:
+            return [], [], [], np.empty((0, 0), dtype=np.float32)
+        page = self.collection.get(ids=ids, include=["documents", "metadatas", "embeddings"])
+        return page["ids"], page["documents"], page["metadatas"], np.asarray(page["embeddings"], dtype=np.float32)
+    
+    def export_batches(self, page_size: int = 1000) -> Iterator[Tuple[List[str], List[str], List[Dict[str, Any]], np.ndarray]]:
+        """分页导出集合中的文本、元数据和向量"""
+        offset = 0
+        while True:
+            page = self.collection.get(limit=page_size, offset=offset,
+                                       include=["documents", "metadatas", "embeddings"])
+            if not page["ids"]:
+                break
+            yield page["ids"], page["documents"], page["metadatas"], np.asarray(page["embeddings"], dtype=np.float32)
+            offset += len(page["ids"])
+    
+    def iter_embeddings(self, page_size: int = 1000) -> Iterator[np.ndarray]:
+        """分页遍历集合中的全部向量"""
+        offset = 0
+        while True:
+            page = self.collection.get(limit=page_size, offset=offset, include=["embeddings"])
+            if not page["ids"]:
+                break
+            yield np.asarray(page["embeddings"], dtype=np.float32)
+            offset += len(page["ids"])
+    
+    def _get_where(self, where: Dict[str, Any]) -> Dict[str, Any]:
+        """按元数据过滤条件获取文档"""
+        results = self.collection.get(where=where)
+        return {
+            "documents": results.get("documents", []),
+            "metadatas": results.get("metadatas", []),
+            "ids": results.get("ids", [])
+        }
+    
+    def _delete_where(self, where: Dict[str, Any]) -> List[str]:
+        """按元数据过滤条件删除文档，只取ID用于同步稀疏索引"""
+        ids = self.collection.get(where=where, include=[])["ids"]
+        if ids:
+            self.collection.delete(where=where)
+        return ids
+    
     def count(self) -> int:
         """获取集合中的文档数量
 
@@ -221,11 +218,11 @@ class ChromaStore:
         """
         return self.collection.count()
     
-    def reset(self) -> None:
-        """重置集合，删除所有文档"""
+    def _reset(self) -> None:
+        """删除并重建集合"""
         self.client.delete_collection(self.collection_name)
         self.collection = self.client.create_collection(
             name=self.collection_name,
             embedding_function=self.embedding_function,
-            metadata={"hnsw:space": VECTOR_STORE_CONFIG["distance_metric"]}
+            metadata=self._collection_metadata()
         )
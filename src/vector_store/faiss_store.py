@@ -0,0 +1,203 @@
+"""基于FAISS HNSW的近似检索向量存储，索引文件以内存映射方式加载"""
+
+import os
+import time
+import atexit
+import weakref
+import numpy as np
+from typing import List, Dict, Any, Optional, Tuple
+from config import VECTOR_STORE_CONFIG
+from .base_store import get_hnsw_params
+from .numpy_store import NumpyStore
+
+# 过滤后的候选数不超过该值时直接精确检索，避免HNSW在选择性很强的过滤下召回率下降
+EXACT_SEARCH_MAX_CANDIDATES = 20000
+
+# 进程内打开的FAISS存储，弱引用不延长存储的生命周期
+_open_stores = weakref.WeakSet()
+
+
+def _save_open_indexes() -> None:
+    """进程退出时保存各存储尚未落盘的索引"""
+    for store in list(_open_stores):
+        store.save_index()
+
+
+atexit.register(_save_open_indexes)
+
+
+class FaissStore(NumpyStore):
+    """基于FAISS HNSW的向量存储
+
+    原始向量、墓碑位图和元数据沿用NumpyStore的存储方式，HNSW索引中的内部编号即向量行号。
+    启动时以只读内存映射加载索引，首次写入时才整体读入内存；删除只标记墓碑，
+    检索时通过ID选择器跳过。重建索引耗时较长，不在删除调用中执行，失效行超过一定比例后
+    由maintain()压缩向量文件并重建索引，执行方式与NumpyStore相同。
+    """
+
+    storage_subdir = "faiss"
+
+    def __init__(self, collection_name: str = "knowledge_base", embedding_function=None,
+                 embedding_executor=None, embedding_model=None, reranker=None, sparse_index: bool = True):
+        """初始化向量存储
+
+        Args:
+            collection_name: 集合名称，默认为knowledge_base
+            embedding_function: 嵌入函数，用于将文本转换为向量
+            embedding_executor: 可选的多进程嵌入执行器，add_texts时用于批量生成向量
+            embedding_model: 可选的SentenceEmbedding，提供encode_array时直接获取float32矩阵
+            reranker: 可选的CrossEncoderReranker，用于对检索结果重排序
+            sparse_index: 是否维护BM25稀疏索引，还需要配置中启用sparse_index_enabled
+        """
+        try:
+            import faiss
+        except ImportError:
+            raise ImportError("使用faiss后端需要安装faiss-cpu: pip install faiss-cpu")
+        self.faiss = faiss
+        self.hnsw_params = get_hnsw_params(collection_name)
+        self._index = None
+        self._index_mmapped = False
+        self._index_dirty = False
+        super().__init__(collection_name, embedding_function, embedding_executor, embedding_model, reranker,
+                         sparse_index)
+        self.compact_threshold = VECTOR_STORE_CONFIG["faiss_rebuild_threshold"]
+        # 进程退出时保存尚未落盘的索引，退出钩子在模块导入时只注册一次
+        _open_stores.add(self)
+
+    def _index_path(self, generation: int = None) -> str:
+        """索引文件路径，与向量文件使用相同的代数"""
+        generation = self.generation if generation is None else generation
+        return os.path.join(self.store_dir, f"hnsw.{generation}.faiss")
+
+    def _new_index(self):
+        """按配置的构建参数创建空的HNSW索引"""
+        metric = self.faiss.METRIC_L2 if self.metric == "l2" else self.faiss.METRIC_INNER_PRODUCT
+        index = self.faiss.IndexHNSWFlat(self.dimension, self.hnsw_params["M"], metric)
+        index.hnsw.efConstruction = self.hnsw_params["construction_ef"]
+        index.hnsw.efSearch = self.hnsw_params["search_ef"]
+        return index
+
+    def _get_index(self):
+        """获取索引，首次使用时以只读内存映射加载，并补齐索引落后于向量文件的行"""
+        if self._index is None and self.dimension is not None:
+            path = self._index_path()
+            if os.path.exists(path):
+                start_time = time.perf_counter()
+                # IO_FLAG_MMAP_IFC（faiss 1.10+）对HNSW的向量和邻接表做内存映射，旧版本退回整体读取
+                mmap_flag = getattr(self.faiss, "IO_FLAG_MMAP_IFC", None)
+                if mmap_flag is not None:
+                    self._index = self.faiss.read_index(path, mmap_flag | self.faiss.IO_FLAG_READ_ONLY)
+                    self._index_mmapped = True
+                else:
+                    self._index = self.faiss.read_index(path)
+                    self._index_mmapped = False
+                print(f"HNSW索引加载完成，共{self._index.ntotal}条，耗时{time.perf_counter() - start_time:.2f}s")
+            else:
+                self._index = self._new_index()
+                self._index_mmapped = False
+            self._sync_index()
+        return self._index
+
+    def _writable_index(self):
+        """将内存映射的只读索引整体读入内存以便写入"""
+        index = self._get_index()
+        if self._index_mmapped:
+            self._index = self.faiss.read_index(self._index_path())
+            self._index_mmapped = False
+            index = self._index
+        return index
+
+    def _sync_index(self) -> None:
+        """把向量文件中尚未加入索引的行追加到索引
+
+        内存映射的索引是只读视图，任何写入前都必须先整体读入内存。
+        """
+        index = self._index
+        if index.ntotal > self._num_rows:
+            # 索引比向量文件新，说明两者不属于同一代，重建索引
+            print("HNSW索引与向量文件不一致，重建索引")
+            self._index = self._new_index()
+            self._index_mmapped = False
+            index = self._index
+        if index.ntotal == self._num_rows:
+            return
+
+        index = self._writable_index()
+        matrix = self._get_matrix()
+        for start in range(index.ntotal, self._num_rows, 65536):
+            end = min(start + 65536, self._num_rows)
+            index.add(np.ascontiguousarray(matrix[start:end]))
+        self._index_dirty = True
+
+    def save_index(self) -> None:
+        """将索引写回磁盘"""
+        with self._lock:
+            if self._index is None or not self._index_dirty:
+                return
+            path = self._index_path()
+            tmp_path = path + ".tmp"
+            self.faiss.write_index(self._index, tmp_path)
+            os.replace(tmp_path, path)
+            self._index_dirty = False
+
+    def _upsert_batch(self, ids: List[str], texts: List[str],
+                      metadatas: List[Dict[str, Any]], embeddings: np.ndarray) -> None:
+        """追加向量后增量加入HNSW索引"""
+        with self._lock:
+            super()._upsert_batch(ids, texts, metadatas, embeddings)
+            self._get_index()
+            self._sync_index()
+
+    def _flush(self) -> None:
+        """全部批次写完后保存一次索引"""
+        self.save_index()
+
+    def _search_rows(self, queries: np.ndarray, k: int,
+                     candidate_rows: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """HNSW检索，墓碑行和不满足过滤条件的行通过位图选择器排除"""
+        if candidate_rows is not None and len(candidate_rows) <= EXACT_SEARCH_MAX_CANDIDATES:
+            return super()._search_rows(queries, k, candidate_rows)
+
+        index = self._get_index()
+        if candidate_rows is None:
+            allowed = self._alive
+        else:
+            allowed = np.zeros(self._num_rows, dtype=bool)
+            allowed[candidate_rows] = True
+
+        params = self.faiss.SearchParametersHNSW()
+        params.efSearch = max(self.hnsw_params["search_ef"], k)
+        if not allowed.all():
+            # 位图需要在检索期间保持引用
+            bitmap = np.packbits(allowed, bitorder="little")
+            params.sel = self.faiss.IDSelectorBitmap(len(allowed), self.faiss.swig_ptr(bitmap))
+
+        scores, rows = index.search(queries, k, params=params)
+        if self.metric == "l2":
+            distances = scores
+        else:
+            distances = 1.0 - scores
+        distances = np.where(rows < 0, np.inf, distances).astype(np.float32)
+        return rows.astype(np.int64), distances
+
+    def compact(self) -> None:
+        """压缩向量文件后按新的行号重建索引"""
+        with self._lock:
+            old_index_path = self._index_path()
+            super().compact()
+            self._index = self._new_index()
+            self._index_mmapped = False
+            self._sync_index()
+            self.save_index()
+            if os.path.exists(old_index_path):
+                os.remove(old_index_path)
+
+    def _reset(self) -> None:
+        """清空存储并删除索引文件"""
+        with self._lock:
+            old_index_path = self._index_path()
+            self._index = None
+            self._index_dirty = False
+            super()._reset()
+            if os.path.exists(old_index_path):
+                os.remove(old_index_path)
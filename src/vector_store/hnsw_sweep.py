@@ -0,0 +1,174 @@
+"""HNSW参数扫描，在知识库自身的向量上测量召回率和查询延迟"""
+
+import os
+import csv
+import json
+import time
+import itertools
+import numpy as np
+from typing import List, Dict, Any, Optional
+from config import DATA_DIR, VECTOR_STORE_CONFIG
+
+# 扫描报告的默认输出目录
+REPORT_DIR = os.path.join(DATA_DIR, "reports")
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def exact_search(corpus: np.ndarray, queries: np.ndarray, k: int, metric: str) -> np.ndarray:
+    """精确检索，作为召回率的基准
+
+    Returns:
+        形状为(len(queries), k)的行号矩阵
+    """
+    corpus_norms = np.einsum("ij,ij->i", corpus, corpus)[None, :] if metric == "l2" else None
+    truth = []
+    # 分批计算，限制分数矩阵的内存占用
+    for start in range(0, len(queries), 32):
+        batch = queries[start:start + 32]
+        if metric == "l2":
+            distances = np.einsum("ij,ij->i", batch, batch)[:, None] + corpus_norms - 2 * batch @ corpus.T
+        else:
+            distances = -(batch @ corpus.T)
+        top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(distances, top, axis=1), axis=1)
+        truth.append(np.take_along_axis(top, order, axis=1))
+    return np.concatenate(truth)
+
+
+class _HnswlibIndex:
+    """hnswlib索引，与Chromadb内部使用的实现一致"""
+
+    def __init__(self, corpus: np.ndarray, metric: str, M: int, construction_ef: int):
+        import hnswlib
+
+        self.index = hnswlib.Index(space=metric, dim=corpus.shape[1])
+        self.index.init_index(max_elements=len(corpus), ef_construction=construction_ef, M=M)
+        self.index.add_items(corpus, np.arange(len(corpus)))
+
+    def search(self, query: np.ndarray, k: int, search_ef: int) -> np.ndarray:
+        self.index.set_ef(max(search_ef, k))
+        labels, _ = self.index.knn_query(query, k=k)
+        return labels
+
+
+class _FaissIndex:
+    """FAISS HNSW索引，与FaissStore使用的实现一致"""
+
+    def __init__(self, corpus: np.ndarray, metric: str, M: int, construction_ef: int):
+        import faiss
+
+        self.faiss = faiss
+        faiss_metric = faiss.METRIC_L2 if metric == "l2" else faiss.METRIC_INNER_PRODUCT
+        self.index = faiss.IndexHNSWFlat(corpus.shape[1], M, faiss_metric)
+        self.index.hnsw.efConstruction = construction_ef
+        self.index.add(corpus)
+
+    def search(self, query: np.ndarray, k: int, search_ef: int) -> np.ndarray:
+        params = self.faiss.SearchParametersHNSW()
+        params.efSearch = max(search_ef, k)
+        _, labels = self.index.search(query, k, params=params)
+        return labels
+
+
+def run_hnsw_sweep(
+    store,
+    k: int = 10,
+    num_queries: int = 200,
+    query_texts: Optional[List[str]] = None,
+    grid: Optional[Dict[str, List[int]]] = None,
+    engine: str = None,
+    output_dir: str = None,
+    seed: int = 0,
+) -> List[Dict[str, Any]]:
+    """扫描HNSW参数网格，测量recall@k和单条查询的p50/p99延迟
+
+    Args:
+        store: 向量存储，用于读取知识库中的全部向量
+        k: 召回率和检索的k
+        num_queries: 未提供query_texts时从知识库中抽样的查询数
+        query_texts: 可选的真实查询文本，使用store的嵌入模型编码
+        grid: 参数网格，默认使用配置文件中的设置
+        engine: "hnswlib"或"faiss"，默认按向量存储后端选择
+        output_dir: 报告输出目录
+        seed: 抽样查询的随机种子
+
+    Returns:
+        每组参数一行的结果列表，同时写入CSV和JSON报告
+    """
+    grid = grid or VECTOR_STORE_CONFIG["hnsw_sweep_grid"]
+    engine = engine or ("faiss" if VECTOR_STORE_CONFIG.get("backend") == "faiss" else "hnswlib")
+    index_class = _FaissIndex if engine == "faiss" else _HnswlibIndex
+    metric = VECTOR_STORE_CONFIG["distance_metric"]
+
+    corpus = np.concatenate(list(store.iter_embeddings()) or [np.empty((0, 0), dtype=np.float32)])
+    if len(corpus) == 0:
+        raise ValueError("知识库为空，无法进行参数扫描")
+    corpus = np.ascontiguousarray(corpus, dtype=np.float32)
+
+    if query_texts:
+        queries = store._embed_queries(query_texts)
+    else:
+        rng = np.random.default_rng(seed)
+        queries = corpus[rng.choice(len(corpus), size=min(num_queries, len(corpus)), replace=False)]
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    if metric == "cosine":
+        corpus = _normalize(corpus)
+        queries = _normalize(queries)
+    k = min(k, len(corpus))
+
+    print(f"参数扫描: {len(corpus)}条向量，{len(queries)}条查询，k={k}，引擎={engine}")
+    truth = exact_search(corpus, queries, k, metric)
+
+    results = []
+    for M, construction_ef in itertools.product(grid["M"], grid["construction_ef"]):
+        build_start = time.perf_counter()
+        index = index_class(corpus, metric, M, construction_ef)
+        build_seconds = time.perf_counter() - build_start
+
+        for search_ef in grid["search_ef"]:
+            latencies = []
+            hits = 0
+            # 逐条查询以测量在线检索的单次延迟
+            for query, expected in zip(queries, truth):
+                query_start = time.perf_counter()
+                labels = index.search(query.reshape(1, -1), k, search_ef)
+                latencies.append((time.perf_counter() - query_start) * 1000)
+                hits += len(set(labels[0].tolist()) & set(expected.tolist()))
+
+            row = {
+                "M": M,
+                "construction_ef": construction_ef,
+                "search_ef": search_ef,
+                f"recall@{k}": hits / (len(queries) * k),
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+                "build_s": build_seconds,
+            }
+            results.append(row)
+            print(f"M={M:<3} construction_ef={construction_ef:<4} search_ef={search_ef:<4} "
+                  f"recall@{k}={row[f'recall@{k}']:.4f} p50={row['p50_ms']:.3f}ms p99={row['p99_ms']:.3f}ms")
+
+    output_dir = output_dir or REPORT_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    base_name = os.path.join(output_dir, f"hnsw_sweep_{store.collection_name}_{time.strftime('%Y%m%d_%H%M%S')}")
+    with open(base_name + ".csv", "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+    with open(base_name + ".json", "w", encoding="utf-8") as f:
+        json.dump({
+            "collection": store.collection_name,
+            "engine": engine,
+            "metric": metric,
+            "corpus_size": len(corpus),
+            "num_queries": len(queries),
+            "k": k,
+            "results": results,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"扫描报告已写入: {base_name}.csv / {base_name}.json")
+
+    return results
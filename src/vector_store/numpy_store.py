@@ -0,0 +1,536 @@
+"""基于NumPy的进程内精确检索向量存储"""
+
+import os
+import json
+import sqlite3
+import threading
+import numpy as np
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+from config import VECTOR_STORE_DIR, VECTOR_STORE_CONFIG
+from .base_store import BaseVectorStore
+
+# 检索时每次参与矩阵乘法的向量行数，限制临时分数矩阵的内存占用
+SEARCH_BLOCK_ROWS = 65536
+
+# 过滤条件中比较运算符到SQL的映射
+_WHERE_OPERATORS = {
+    "$eq": "=",
+    "$ne": "!=",
+    "$gt": ">",
+    "$gte": ">=",
+    "$lt": "<",
+    "$lte": "<=",
+}
+
+
+class NumpyStore(BaseVectorStore):
+    """基于NumPy的精确检索向量存储
+
+    向量按行追加写入float32文件并以内存映射方式读取，检索时对全部向量做分块矩阵乘法，
+    召回率为100%，适合二十万条以内的知识库。删除只在内存中的墓碑位图上标记，
+    压缩需要重写整个向量文件，不在删除调用中执行，失效行超过一定比例后由maintain()完成：
+    应用内通过侧栏的存储维护在同一进程中执行，命令行的python run.py compact需要先停止应用。
+    文本、元数据和行号保存在SQLite中。
+    """
+
+    # 存储目录名，位于VECTOR_STORE_DIR下
+    storage_subdir = "numpy"
+
+    def __init__(self, collection_name: str = "knowledge_base", embedding_function=None,
+                 embedding_executor=None, embedding_model=None, reranker=None, sparse_index: bool = True):
+        """初始化向量存储
+
+        Args:
+            collection_name: 集合名称，默认为knowledge_base
+            embedding_function: 嵌入函数，用于将文本转换为向量
+            embedding_executor: 可选的多进程嵌入执行器，add_texts时用于批量生成向量
+            embedding_model: 可选的SentenceEmbedding，提供encode_array时直接获取float32矩阵
+            reranker: 可选的CrossEncoderReranker，用于对检索结果重排序
+            sparse_index: 是否维护BM25稀疏索引，还需要配置中启用sparse_index_enabled
+        """
+        super().__init__(collection_name, embedding_function, embedding_executor, embedding_model, reranker,
+                         sparse_index)
+        self.metric = VECTOR_STORE_CONFIG["distance_metric"]
+        if self.metric not in ("cosine", "ip", "l2"):
+            raise ValueError(f"不支持的距离度量方式: {self.metric}")
+        self.store_dir = os.path.join(VECTOR_STORE_DIR, self.storage_subdir, collection_name)
+        self.compact_threshold = VECTOR_STORE_CONFIG["numpy_compact_threshold"]
+        self._compaction_hinted = False
+        self._lock = threading.RLock()
+        self.__post_init__()
+
+    def __post_init__(self):
+        os.makedirs(self.store_dir, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(self.store_dir, "meta.sqlite3"), check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                row INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                document TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                source TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_chunks_source ON chunks (source);
+            CREATE TABLE IF NOT EXISTS info (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+        self._load()
+
+        # BM25稀疏索引与向量文件放在同一目录
+        self._init_sparse_index(self.store_dir)
+
+    def _get_info(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM info WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_info(self, key: str, value) -> None:
+        self.conn.execute("INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _vector_path(self, generation: int) -> str:
+        """向量文件路径，每次压缩或重置生成新文件，与SQLite中的代数一起原子切换"""
+        return os.path.join(self.store_dir, f"vectors.{generation}.f32")
+
+    def _load(self) -> None:
+        """读取向量文件大小和存活行，重建墓碑位图"""
+        dimension = self._get_info("dimension")
+        self.dimension = int(dimension) if dimension else None
+        self.generation = int(self._get_info("generation") or 0)
+        self.vector_path = self._vector_path(self.generation)
+        if not os.path.exists(self.vector_path):
+            open(self.vector_path, "wb").close()
+
+        row_bytes = 4 * self.dimension if self.dimension else 0
+        self._num_rows = os.path.getsize(self.vector_path) // row_bytes if row_bytes else 0
+        self._matrix = None
+
+        # 向量写入后元数据未提交的行保持为墓碑；元数据指向不存在的向量行则删除
+        with self.conn:
+            self.conn.execute("DELETE FROM chunks WHERE row >= ?", (self._num_rows,))
+        self._alive = np.zeros(self._num_rows, dtype=bool)
+        rows = [row for (row,) in self.conn.execute("SELECT row FROM chunks")]
+        self._alive[rows] = True
+
+    def _get_matrix(self) -> np.ndarray:
+        """以只读内存映射打开向量文件"""
+        if self._matrix is None:
+            if self._num_rows == 0:
+                self._matrix = np.empty((0, self.dimension or 0), dtype=np.float32)
+            else:
+                self._matrix = np.memmap(self.vector_path, dtype=np.float32, mode="r",
+                                         shape=(self._num_rows, self.dimension))
+        return self._matrix
+
+    def _prepare_vectors(self, vectors: np.ndarray) -> np.ndarray:
+        """转换为连续float32矩阵，余弦距离下做L2归一化"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        if self.metric == "cosine":
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.maximum(norms, 1e-12)
+        return vectors
+
+    def _upsert_batch(self, ids: List[str], texts: List[str],
+                      metadatas: List[Dict[str, Any]], embeddings: np.ndarray) -> None:
+        """追加一批向量，已存在的ID视为覆盖，旧行标记为墓碑"""
+        embeddings = self._prepare_vectors(embeddings)
+        with self._lock:
+            if self.dimension is None:
+                self.dimension = embeddings.shape[1]
+                with self.conn:
+                    self._set_info("dimension", self.dimension)
+            elif embeddings.shape[1] != self.dimension:
+                raise ValueError(f"向量维度不一致: 期望{self.dimension}，实际{embeddings.shape[1]}")
+
+            old_rows = self._rows_for_ids(ids)
+
+            # 先追加向量再提交元数据，中途失败只会留下无元数据的墓碑行
+            start_row = self._num_rows
+            with open(self.vector_path, "ab") as f:
+                f.write(embeddings.tobytes())
+            self._num_rows += len(ids)
+            self._alive = np.concatenate([self._alive, np.zeros(len(ids), dtype=bool)])
+            self._matrix = None
+
+            with self.conn:
+                self._delete_rows_sql(old_rows)
+                self.conn.executemany(
+                    "INSERT INTO chunks (row, id, document, metadata, source) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (start_row + i, doc_id, text, json.dumps(metadata or {}, ensure_ascii=False),
+                         (metadata or {}).get("source"))
+                        for i, (doc_id, text, metadata) in enumerate(zip(ids, texts, metadatas))
+                    ]
+                )
+            self._alive[old_rows] = False
+            self._alive[start_row:self._num_rows] = True
+
+    def _update_metadatas(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """只更新元数据，向量行保持不变"""
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "UPDATE chunks SET metadata = ?, source = ? WHERE id = ?",
+                [
+                    (json.dumps(metadata or {}, ensure_ascii=False), (metadata or {}).get("source"), doc_id)
+                    for doc_id, metadata in zip(ids, metadatas)
+                ]
+            )
+
+    def _rows_for_ids(self, ids: List[str]) -> List[int]:
+        """查询ID对应的向量行号"""
+        rows = []
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows.extend(row for (row,) in self.conn.execute(
+                f"SELECT row FROM chunks WHERE id IN ({placeholders})", batch
+            ))
+        return rows
+
+    def _delete_rows_sql(self, rows: List[int]) -> None:
+        for start in range(0, len(rows), 500):
+            batch = rows[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            self.conn.execute(f"DELETE FROM chunks WHERE row IN ({placeholders})", batch)
+
+    def _delete(self, ids: List[str]) -> None:
+        """删除元数据并在墓碑位图上标记"""
+        with self._lock:
+            rows = self._rows_for_ids(ids)
+            with self.conn:
+                self._delete_rows_sql(rows)
+            self._mark_deleted(rows)
+
+    def _delete_where(self, where: Dict[str, Any]) -> List[str]:
+        """按过滤条件删除，来源条件走source列上的索引"""
+        sql, params = self._where_to_sql(where)
+        with self._lock:
+            matches = self.conn.execute(f"SELECT row, id FROM chunks WHERE {sql}", params).fetchall()
+            with self.conn:
+                self.conn.execute(f"DELETE FROM chunks WHERE {sql}", params)
+            self._mark_deleted([row for row, _ in matches])
+        return [doc_id for _, doc_id in matches]
+
+    def _mark_deleted(self, rows: List[int]) -> None:
+        """只在墓碑位图上标记删除，不在删除调用中同步压缩"""
+        self._alive[rows] = False
+        if self.needs_compaction() and not self._compaction_hinted:
+            print("已删除行超过阈值，请在应用侧栏执行存储维护，或停止应用后运行 python run.py compact")
+            self._compaction_hinted = True
+
+    def needs_compaction(self) -> bool:
+        """已删除行占比是否超过压缩阈值"""
+        with self._lock:
+            dead = self._num_rows - int(self._alive.sum())
+            return bool(self._num_rows) and dead / self._num_rows > self.compact_threshold
+
+    def maintain(self) -> bool:
+        """失效行超过阈值时压缩向量文件
+
+        Returns:
+            是否执行了压缩
+        """
+        with self._lock:
+            if not self.needs_compaction():
+                return False
+            self.compact()
+            return True
+
+    def compact(self) -> None:
+        """压缩向量文件，丢弃墓碑行并重新编号"""
+        with self._lock:
+            live_rows = np.flatnonzero(self._alive)
+            matrix = self._get_matrix()
+            generation = self.generation + 1
+            new_path = self._vector_path(generation)
+
+            with open(new_path, "wb") as f:
+                for start in range(0, len(live_rows), SEARCH_BLOCK_ROWS):
+                    f.write(np.ascontiguousarray(matrix[live_rows[start:start + SEARCH_BLOCK_ROWS]]).tobytes())
+
+            # 先改为负数再取反，避免重新编号时与未处理的行号冲突
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE chunks SET row = ? WHERE row = ?",
+                    [(-(new_row + 1), int(old_row)) for new_row, old_row in enumerate(live_rows)]
+                )
+                self.conn.execute("UPDATE chunks SET row = -row - 1")
+                self._set_info("generation", generation)
+
+            old_path = self.vector_path
+            self._matrix = None
+            self.generation = generation
+            self.vector_path = new_path
+            self._num_rows = len(live_rows)
+            self._alive = np.ones(self._num_rows, dtype=bool)
+            self._compaction_hinted = False
+            os.remove(old_path)
+            print(f"向量文件压缩完成，剩余{self._num_rows}条")
+
+    def _where_to_sql(self, where: Dict[str, Any]) -> Tuple[str, List[Any]]:
+        """将Chromadb风格的过滤条件转换为SQL条件
+
+        支持$and、$or以及$eq、$ne、$gt、$gte、$lt、$lte、$in、$nin运算符。
+        """
+        clauses = []
+        params = []
+        for key, value in where.items():
+            if key in ("$and", "$or"):
+                parts = [self._where_to_sql(condition) for condition in value]
+                joiner = " AND " if key == "$and" else " OR "
+                clauses.append("(" + joiner.join(sql for sql, _ in parts) + ")")
+                for _, part_params in parts:
+                    params.extend(part_params)
+                continue
+
+            if key == "source":
+                column = "source"
+            else:
+                column = "json_extract(metadata, ?)"
+                column_params = [f'$."{key}"']
+
+            conditions = value if isinstance(value, dict) else {"$eq": value}
+            for operator, operand in conditions.items():
+                if column != "source":
+                    params.extend(column_params)
+                if operator in ("$in", "$nin"):
+                    placeholders = ",".join("?" * len(operand))
+                    negation = "NOT " if operator == "$nin" else ""
+                    clauses.append(f"{column} {negation}IN ({placeholders})")
+                    params.extend(operand)
+                elif operator in _WHERE_OPERATORS:
+                    clauses.append(f"{column} {_WHERE_OPERATORS[operator]} ?")
+                    params.append(operand)
+                else:
+                    raise ValueError(f"不支持的过滤运算符: {operator}")
+
+        return " AND ".join(clauses) or "1", params
+
+    def _distances(self, queries: np.ndarray, block: np.ndarray) -> np.ndarray:
+        """计算查询与一块向量之间的距离，与Chromadb的距离定义一致"""
+        similarity = queries @ block.T
+        if self.metric == "l2":
+            query_norms = np.einsum("ij,ij->i", queries, queries)[:, None]
+            block_norms = np.einsum("ij,ij->i", block, block)[None, :]
+            return query_norms + block_norms - 2 * similarity
+        return 1.0 - similarity
+
+    def _search_rows(self, queries: np.ndarray, k: int,
+                     candidate_rows: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """分块精确检索
+
+        Args:
+            queries: 查询矩阵
+            k: 每个查询返回的行数
+            candidate_rows: 过滤后的候选行号，为None时检索全部存活行
+
+        Returns:
+            (行号矩阵, 距离矩阵)，按距离升序排列，不足k个的位置距离为inf
+        """
+        matrix = self._get_matrix()
+        num_queries = queries.shape[0]
+        best_rows = np.empty((num_queries, 0), dtype=np.int64)
+        best_distances = np.empty((num_queries, 0), dtype=np.float32)
+
+        total = self._num_rows if candidate_rows is None else len(candidate_rows)
+        for start in range(0, total, SEARCH_BLOCK_ROWS):
+            end = min(start + SEARCH_BLOCK_ROWS, total)
+            if candidate_rows is None:
+                rows = np.arange(start, end)
+                distances = self._distances(queries, matrix[start:end])
+                distances[:, ~self._alive[start:end]] = np.inf
+            else:
+                rows = candidate_rows[start:end]
+                distances = self._distances(queries, matrix[rows])
+
+            # 与上一块的前k合并后再取前k
+            rows = np.concatenate([best_rows, np.broadcast_to(rows, distances.shape)], axis=1)
+            distances = np.concatenate([best_distances, distances.astype(np.float32)], axis=1)
+            if distances.shape[1] > k:
+                top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+                rows = np.take_along_axis(rows, top, axis=1)
+                distances = np.take_along_axis(distances, top, axis=1)
+            best_rows, best_distances = rows, distances
+
+        order = np.argsort(best_distances, axis=1, kind="stable")
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_distances, order, axis=1)
+
+    def _query(self, query_embeddings: np.ndarray, k: int, filter: Optional[Dict[str, Any]] = None,
+               include: Tuple[str, ...] = ("documents", "metadatas")) -> Dict[str, Any]:
+        """对全部存活向量做精确检索，只从SQLite读取include中的字段"""
+        queries = self._prepare_vectors(query_embeddings)
+        results = {"ids": [], "distances": []}
+        results.update({key: [] for key in ("documents", "metadatas") if key in include})
+
+        with self._lock:
+            if self._num_rows == 0:
+                for key in results:
+                    results[key] = [[] for _ in range(len(queries))]
+                return results
+
+            candidate_rows = None
+            if filter:
+                sql, params = self._where_to_sql(filter)
+                candidate_rows = np.array(
+                    [row for (row,) in self.conn.execute(f"SELECT row FROM chunks WHERE {sql} ORDER BY row", params)],
+                    dtype=np.int64
+                )
+            rows, distances = self._search_rows(queries, k, candidate_rows)
+
+            hit_rows = sorted({int(row) for row, distance in zip(rows.ravel(), distances.ravel())
+                               if np.isfinite(distance)})
+            columns = "row, id, {}, {}".format("document" if "documents" in include else "NULL",
+                                               "metadata" if "metadatas" in include else "NULL")
+            records = {}
+            for start in range(0, len(hit_rows), 500):
+                batch = hit_rows[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for row, doc_id, document, metadata in self.conn.execute(
+                    f"SELECT {columns} FROM chunks WHERE row IN ({placeholders})", batch
+                ):
+                    records[row] = (doc_id, document, json.loads(metadata) if metadata is not None else None)
+
+        for query_rows, query_distances in zip(rows, distances):
+            hits = [(int(row), float(distance)) for row, distance in zip(query_rows, query_distances)
+                    if np.isfinite(distance) and int(row) in records]
+            results["ids"].append([records[row][0] for row, _ in hits])
+            if "documents" in results:
+                results["documents"].append([records[row][1] for row, _ in hits])
+            if "metadatas" in results:
+                results["metadatas"].append([records[row][2] for row, _ in hits])
+            results["distances"].append([distance for _, distance in hits])
+        results.setdefault("documents", None)
+        results.setdefault("metadatas", None)
+        return results
+
+    def get(self, ids: List[str], where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """获取指定ID的文档
+
+        Args:
+            ids: 要获取的文档ID列表
+            where: 可选的元数据过滤条件
+
+        Returns:
+            文档内容、元数据和ID
+        """
+        results = {"documents": [], "metadatas": [], "ids": []}
+        if not ids:
+            return results
+
+        where_sql, where_params = self._where_to_sql(where) if where else ("1", [])
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for doc_id, document, metadata in self.conn.execute(
+                    f"SELECT id, document, metadata FROM chunks WHERE id IN ({placeholders}) AND {where_sql}",
+                    batch + where_params
+                ):
+                    results["ids"].append(doc_id)
+                    results["documents"].append(document)
+                    results["metadatas"].append(json.loads(metadata))
+        return results
+
+    def _existing_ids(self, ids: List[str]) -> List[str]:
+        """只查询ID列，不读取文本和元数据"""
+        found = []
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                found.extend(doc_id for (doc_id,) in self.conn.execute(
+                    f"SELECT id FROM chunks WHERE id IN ({placeholders})", batch
+                ))
+        return found
+
+    def _get_embeddings(self, ids: List[str]) -> Tuple[List[str], List[str], List[Dict[str, Any]], np.ndarray]:
+        """按ID读取文本、元数据和向量行"""
+        records = []
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                records.extend(self.conn.execute(
+                    f"SELECT row, id, document, metadata FROM chunks WHERE id IN ({placeholders})", batch
+                ))
+            if records:
+                vectors = np.asarray(self._get_matrix()[[row for row, _, _, _ in records]])
+            else:
+                vectors = np.empty((0, self.dimension or 0), dtype=np.float32)
+        return ([doc_id for _, doc_id, _, _ in records], [document for _, _, document, _ in records],
+                [json.loads(metadata) for _, _, _, metadata in records], vectors)
+
+    def _get_where(self, where: Dict[str, Any]) -> Dict[str, Any]:
+        """按过滤条件获取文档，按写入顺序返回"""
+        sql, params = self._where_to_sql(where)
+        results = {"documents": [], "metadatas": [], "ids": []}
+        with self._lock:
+            for doc_id, document, metadata in self.conn.execute(
+                f"SELECT id, document, metadata FROM chunks WHERE {sql} ORDER BY row", params
+            ):
+                results["ids"].append(doc_id)
+                results["documents"].append(document)
+                results["metadatas"].append(json.loads(metadata))
+        return results
+
+    def _iter_documents(self, page_size: int) -> Iterator[Tuple[List[str], List[str]]]:
+        """按行号分页遍历全部文档"""
+        last_row = -1
+        while True:
+            with self._lock:
+                page = self.conn.execute(
+                    "SELECT row, id, document FROM chunks WHERE row > ? ORDER BY row LIMIT ?",
+                    (last_row, page_size)
+                ).fetchall()
+            if not page:
+                break
+            yield [doc_id for _, doc_id, _ in page], [document for _, _, document in page]
+            last_row = page[-1][0]
+
+    def export_batches(self, page_size: int = 1000) -> Iterator[Tuple[List[str], List[str], List[Dict[str, Any]], np.ndarray]]:
+        """按行号分页导出文本、元数据和向量"""
+        last_row = -1
+        while True:
+            with self._lock:
+                page = self.conn.execute(
+                    "SELECT row, id, document, metadata FROM chunks WHERE row > ? ORDER BY row LIMIT ?",
+                    (last_row, page_size)
+                ).fetchall()
+                if not page:
+                    break
+                vectors = np.asarray(self._get_matrix()[[row for row, _, _, _ in page]])
+            yield ([doc_id for _, doc_id, _, _ in page], [document for _, _, document, _ in page],
+                   [json.loads(metadata) for _, _, _, metadata in page], vectors)
+            last_row = page[-1][0]
+
+    def iter_embeddings(self, page_size: int = 1000) -> Iterator[np.ndarray]:
+        """按行号分页遍历全部存活向量"""
+        with self._lock:
+            live_rows = np.flatnonzero(self._alive)
+            matrix = self._get_matrix()
+        for start in range(0, len(live_rows), page_size):
+            yield np.asarray(matrix[live_rows[start:start + page_size]])
+
+    def count(self) -> int:
+        """获取集合中的文档数量
+
+        Returns:
+            文档数量
+        """
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def _reset(self) -> None:
+        """清空元数据并切换到新的空向量文件"""
+        with self._lock:
+            generation = self.generation + 1
+            with self.conn:
+                self.conn.execute("DELETE FROM chunks")
+                self.conn.execute("DELETE FROM info WHERE key = 'dimension'")
+                self._set_info("generation", generation)
+            old_path = self.vector_path
+            self._matrix = None
+            os.remove(old_path)
+            self._load()
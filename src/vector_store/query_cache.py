@@ -0,0 +1,96 @@
+"""检索结果缓存，按集合版本号失效"""
+
+import copy
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class QueryResultCache:
+    """有界的LRU+TTL检索结果缓存
+
+    每个条目记录写入时的集合版本号，集合有写入或删除后版本号递增，旧版本的条目不再命中。
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        """初始化缓存
+
+        Args:
+            max_entries: 最大条目数，超出后淘汰最久未使用的条目
+            ttl: 条目有效期（秒）
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+        self._entries = OrderedDict()  # key -> (version, created, search_ms, results)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(query: str, k: int, filter: Optional[Dict[str, Any]], *options) -> Tuple:
+        """生成缓存键：规范化查询、k、过滤条件以及检索模式等选项"""
+        normalized_query = " ".join(query.split()).lower()
+        filter_key = json.dumps(filter, sort_keys=True, ensure_ascii=False) if filter else ""
+        return (normalized_query, k, filter_key) + tuple(options)
+
+    def get(self, key: Tuple, version: int) -> Optional[Any]:
+        """查询缓存
+
+        Args:
+            key: 缓存键
+            version: 当前集合版本号
+
+        Returns:
+            缓存结果的副本，未命中时返回None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_version, created, search_ms, results = entry
+                if entry_version == version and time.monotonic() - created <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self.saved_ms += search_ms
+                    return copy.deepcopy(results)
+                # 过期或集合已变化
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Tuple, version: int, results: Any, search_ms: float) -> None:
+        """写入缓存
+
+        Args:
+            key: 缓存键
+            version: 检索时的集合版本号
+            results: 检索结果
+            search_ms: 本次检索耗时，命中时计入节省的延迟
+        """
+        with self._lock:
+            self._entries[key] = (version, time.monotonic(), search_ms, copy.deepcopy(results))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计
+
+        Returns:
+            包含命中数、未命中数、命中率、累计节省延迟和当前条目数的字典
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "saved_ms": self.saved_ms,
+            "entries": len(self._entries),
+        }
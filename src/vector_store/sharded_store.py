@@ -0,0 +1,316 @@
+"""分片向量存储，将文本块分散到多个集合中并行检索"""
+
+import os
+import re
+import json
+import heapq
+import hashlib
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import List, Dict, Any, Optional, Callable, Iterator, Tuple
+from config import VECTOR_STORE_DIR, VECTOR_STORE_CONFIG
+from .base_store import BaseVectorStore, get_store_class
+
+# 各分片策略用于路由的元数据字段
+_STRATEGY_FIELDS = {
+    "source_type": "source_type",
+    "hash": "source",
+}
+
+
+class ShardedStore(BaseVectorStore):
+    """分片向量存储
+
+    每个分片是一个独立的同类后端集合，写入和删除路由到所属分片，检索在线程池中并行查询
+    各分片后按距离用堆归并前k条。BM25稀疏索引、检索缓存和版本号在分片存储这一层统一维护。
+    分片列表保存在清单文件中，启动时据此打开已有分片。写入时可能新建分片，
+    读取分片列表统一经过_shard_items在分片锁内取快照。
+    """
+
+    def __init__(self, collection_name: str = "knowledge_base", embedding_function=None,
+                 embedding_executor=None, embedding_model=None, reranker=None, sparse_index: bool = True):
+        """初始化分片存储
+
+        Args:
+            collection_name: 集合名称，各分片的集合名称以此为前缀
+            embedding_function: 嵌入函数，用于将文本转换为向量
+            embedding_executor: 可选的多进程嵌入执行器，add_texts时用于批量生成向量
+            embedding_model: 可选的SentenceEmbedding，提供encode_array时直接获取float32矩阵
+            reranker: 可选的CrossEncoderReranker，用于对检索结果重排序
+            sparse_index: 是否维护BM25稀疏索引，还需要配置中启用sparse_index_enabled
+        """
+        super().__init__(collection_name, embedding_function, embedding_executor, embedding_model, reranker,
+                         sparse_index)
+        self.strategy = VECTOR_STORE_CONFIG["shard_strategy"]
+        if self.strategy not in ("source_type", "hash", "partition_key"):
+            raise ValueError(f"不支持的分片策略: {self.strategy}")
+        self.shard_field = _STRATEGY_FIELDS.get(self.strategy, VECTOR_STORE_CONFIG["shard_partition_key"])
+        self.shard_count = VECTOR_STORE_CONFIG["shard_count"]
+        self.store_class = get_store_class()
+        self.shards: Dict[str, BaseVectorStore] = {}
+        self._shard_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=VECTOR_STORE_CONFIG["shard_query_workers"])
+        self.__post_init__()
+
+    def __post_init__(self):
+        self.manifest_path = os.path.join(VECTOR_STORE_DIR, f"shards_{self.collection_name}.json")
+        keys = []
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest["strategy"] != self.strategy:
+                raise ValueError(f"集合 {self.collection_name} 已按 {manifest['strategy']} 分片，"
+                                 f"更换分片策略需要重置后重新导入")
+            if manifest.get("shard_count", self.shard_count) != self.shard_count:
+                # 哈希路由依赖分片数，沿用创建时的分片数
+                print(f"分片数与配置不一致，沿用已有的 {manifest['shard_count']} 个分片")
+                self.shard_count = manifest["shard_count"]
+            keys = manifest["shards"]
+        if self.strategy == "hash":
+            keys = [str(i) for i in range(self.shard_count)]
+
+        for key in keys:
+            self._open_shard(key)
+
+        # 分片自身不维护稀疏索引，由分片存储统一维护
+        self._init_sparse_index(VECTOR_STORE_DIR)
+
+    def _save_manifest(self) -> None:
+        manifest = {
+            "strategy": self.strategy,
+            "shard_count": self.shard_count,
+            "shards": list(self.shards),
+        }
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _shard_collection_name(self, key: str) -> str:
+        """分片的集合名称，只包含集合名允许的字符"""
+        safe_key = re.sub(r"[^0-9A-Za-z_-]", "_", key)
+        if len(safe_key) > 32 or safe_key != key:
+            safe_key = f"{safe_key[:16]}_{hashlib.md5(key.encode('utf-8')).hexdigest()[:8]}"
+        return f"{self.collection_name}_shard_{safe_key}"
+
+    def _open_shard(self, key: str) -> BaseVectorStore:
+        """打开（或创建）分片"""
+        with self._shard_lock:
+            shard = self.shards.get(key)
+            if shard is None:
+                shard = self.store_class(
+                    self._shard_collection_name(key),
+                    embedding_function=self.embedding_function,
+                    embedding_model=self.sentence_embedding,
+                    sparse_index=False
+                )
+                self.shards[key] = shard
+                self._save_manifest()
+            return shard
+
+    def _shard_items(self) -> List[Tuple[str, BaseVectorStore]]:
+        """分片列表的快照，并发写入可能同时新建分片"""
+        with self._shard_lock:
+            return list(self.shards.items())
+
+    def _route_value(self, value: Any) -> str:
+        """由分片字段的取值计算分片键"""
+        if self.strategy == "hash":
+            digest = hashlib.md5(str(value or "").encode("utf-8")).hexdigest()
+            return str(int(digest, 16) % self.shard_count)
+        return str(value) if value not in (None, "") else "default"
+
+    def _shard_key(self, metadata: Dict[str, Any]) -> str:
+        """文本块所属的分片键"""
+        return self._route_value((metadata or {}).get(self.shard_field))
+
+    def _target_shards(self, where: Optional[Dict[str, Any]]) -> List[BaseVectorStore]:
+        """过滤条件对分片字段做等值限定时只查询对应分片，否则查询全部分片"""
+        if where and self.shard_field in where:
+            value = where[self.shard_field]
+            if isinstance(value, dict):
+                value = value.get("$eq") if list(value) == ["$eq"] else None
+            if value is not None:
+                with self._shard_lock:
+                    shard = self.shards.get(self._route_value(value))
+                return [shard] if shard is not None else []
+        return [shard for _, shard in self._shard_items()]
+
+    def _fan_out(self, fn: Callable[[BaseVectorStore], Any],
+                 shards: Optional[List[BaseVectorStore]] = None) -> List[Any]:
+        """在线程池中对各分片并行执行fn"""
+        shards = [shard for _, shard in self._shard_items()] if shards is None else shards
+        if len(shards) <= 1:
+            return [fn(shard) for shard in shards]
+        return list(self._pool.map(fn, shards))
+
+    def _locate(self, ids: List[str]) -> List[Tuple[str, BaseVectorStore, List[str]]]:
+        """查询ID所在的分片，只查ID不读取文本和元数据，返回(分片键, 分片, ID列表)"""
+        items = self._shard_items()
+        found = self._fan_out(lambda shard: shard._existing_ids(ids), [shard for _, shard in items])
+        return [(key, shard, shard_ids) for (key, shard), shard_ids in zip(items, found) if shard_ids]
+
+    def _upsert_batch(self, ids: List[str], texts: List[str],
+                      metadatas: List[Dict[str, Any]], embeddings: np.ndarray) -> None:
+        """按分片键分组后写入各自的分片
+
+        路由字段变化的已有文本块写入新分片后，从原分片删除旧副本，避免同一ID在两个分片中各存一份。
+        """
+        target_keys = [self._shard_key(metadata) for metadata in metadatas]
+        located = self._locate(ids)
+
+        groups: Dict[str, List[int]] = {}
+        for i, key in enumerate(target_keys):
+            groups.setdefault(key, []).append(i)
+        for key, indices in groups.items():
+            self._open_shard(key)._upsert_batch(
+                [ids[i] for i in indices],
+                [texts[i] for i in indices],
+                [metadatas[i] for i in indices],
+                embeddings[indices]
+            )
+
+        target_by_id = dict(zip(ids, target_keys))
+        for key, shard, shard_ids in located:
+            moved = [doc_id for doc_id in shard_ids if target_by_id[doc_id] != key]
+            if moved:
+                shard._delete(moved)
+
+    def _flush(self) -> None:
+        """通知各分片写入完成"""
+        for _, shard in self._shard_items():
+            shard._flush()
+
+    def needs_compaction(self) -> bool:
+        """任一分片需要维护"""
+        return any(shard.needs_compaction() for _, shard in self._shard_items())
+
+    def maintain(self) -> bool:
+        """依次维护各分片"""
+        return any([shard.maintain() for _, shard in self._shard_items()])
+
+    def _update_metadatas(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """在文本块所在的分片上更新元数据
+
+        路由字段变化的文本块连同已有向量迁移到新分片，不重新计算向量。
+        """
+        metadata_by_id = dict(zip(ids, metadatas))
+        for key, shard, shard_ids in self._locate(ids):
+            staying = [doc_id for doc_id in shard_ids if self._shard_key(metadata_by_id[doc_id]) == key]
+            if staying:
+                shard._update_metadatas(staying, [metadata_by_id[doc_id] for doc_id in staying])
+            moving = [doc_id for doc_id in shard_ids if self._shard_key(metadata_by_id[doc_id]) != key]
+            if moving:
+                self._move(shard, moving, metadata_by_id)
+
+    def _move(self, shard: BaseVectorStore, ids: List[str], metadata_by_id: Dict[str, Dict[str, Any]]) -> None:
+        """把文本块的已有向量写入新元数据对应的分片，再从原分片删除"""
+        moved_ids, texts, _, embeddings = shard._get_embeddings(ids)
+        metadatas = [metadata_by_id[doc_id] for doc_id in moved_ids]
+        groups: Dict[str, List[int]] = {}
+        for i, metadata in enumerate(metadatas):
+            groups.setdefault(self._shard_key(metadata), []).append(i)
+        for key, indices in groups.items():
+            target = self._open_shard(key)
+            target._upsert_batch(
+                [moved_ids[i] for i in indices],
+                [texts[i] for i in indices],
+                [metadatas[i] for i in indices],
+                embeddings[indices]
+            )
+            target._flush()
+        shard._delete(moved_ids)
+        shard._flush()
+
+    def _query(self, query_embeddings: np.ndarray, k: int, filter: Optional[Dict[str, Any]] = None,
+               include: Tuple[str, ...] = ("documents", "metadatas")) -> Dict[str, Any]:
+        """并行查询各分片，每个查询按距离归并前k条"""
+        shard_results = self._fan_out(lambda shard: shard._query(query_embeddings, k, filter, include),
+                                      self._target_shards(filter))
+        results = {"ids": [], "distances": []}
+        results.update({key: [] for key in ("documents", "metadatas") if key in include})
+        for i in range(len(query_embeddings)):
+            candidates = (
+                (distance, shard_no, position)
+                for shard_no, shard_result in enumerate(shard_results)
+                for position, distance in enumerate(shard_result["distances"][i])
+            )
+            top = heapq.nsmallest(k, candidates)
+            for key in results:
+                results[key].append([shard_results[shard_no][key][i][position] for _, shard_no, position in top])
+        results.setdefault("documents", None)
+        results.setdefault("metadatas", None)
+        return results
+
+    def _delete(self, ids: List[str]) -> None:
+        """在文本块所在的分片上删除"""
+        for _, shard, shard_ids in self._locate(ids):
+            shard._delete(shard_ids)
+
+    def _delete_where(self, where: Dict[str, Any]) -> List[str]:
+        """按过滤条件删除，哈希分片下按来源删除只涉及一个分片"""
+        deleted = self._fan_out(lambda shard: shard._delete_where(where), self._target_shards(where))
+        return list(chain.from_iterable(deleted))
+
+    def _merge_get(self, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            key: list(chain.from_iterable(result[key] for result in results))
+            for key in ("documents", "metadatas", "ids")
+        }
+
+    def get(self, ids: List[str], where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """获取指定ID的文档
+
+        Args:
+            ids: 要获取的文档ID列表
+            where: 可选的元数据过滤条件
+
+        Returns:
+            文档内容、元数据和ID
+        """
+        if not ids:
+            return {"documents": [], "metadatas": [], "ids": []}
+        return self._merge_get(self._fan_out(lambda shard: shard.get(ids, where), self._target_shards(where)))
+
+    def _get_embeddings(self, ids: List[str]) -> Tuple[List[str], List[str], List[Dict[str, Any]], np.ndarray]:
+        """从各分片读取文本块及其向量后拼接"""
+        parts = [part for part in self._fan_out(lambda shard: shard._get_embeddings(ids)) if part[0]]
+        if not parts:
+            return [], [], [], np.empty((0, 0), dtype=np.float32)
+        return (list(chain.from_iterable(part[0] for part in parts)),
+                list(chain.from_iterable(part[1] for part in parts)),
+                list(chain.from_iterable(part[2] for part in parts)),
+                np.concatenate([part[3] for part in parts], axis=0))
+
+    def _get_where(self, where: Dict[str, Any]) -> Dict[str, Any]:
+        """按元数据过滤条件获取文档"""
+        return self._merge_get(self._fan_out(lambda shard: shard._get_where(where), self._target_shards(where)))
+
+    def _iter_documents(self, page_size: int) -> Iterator[Tuple[List[str], List[str]]]:
+        """依次遍历各分片的文档"""
+        for _, shard in self._shard_items():
+            yield from shard._iter_documents(page_size)
+
+    def export_batches(self, page_size: int = 1000) -> Iterator[Tuple[List[str], List[str], List[Dict[str, Any]], np.ndarray]]:
+        """依次导出各分片的文本块"""
+        for _, shard in self._shard_items():
+            yield from shard.export_batches(page_size)
+
+    def iter_embeddings(self, page_size: int = 1000) -> Iterator[np.ndarray]:
+        """依次遍历各分片的向量"""
+        for _, shard in self._shard_items():
+            yield from shard.iter_embeddings(page_size)
+
+    def count(self) -> int:
+        """获取全部分片的文档总数
+
+        Returns:
+            文档数量
+        """
+        return sum(self._fan_out(lambda shard: shard.count()))
+
+    def _reset(self) -> None:
+        """清空全部分片"""
+        self._fan_out(lambda shard: shard._reset())
@@ -0,0 +1,325 @@
+"""知识库快照，导出向量、文本块和文档目录，恢复时直接批量写入而不重新计算向量"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import numpy as np
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+from config import DATA_DIR, DOCUMENT_DIR, VECTOR_STORE_CONFIG
+
+# 快照格式版本，格式变化时递增
+SNAPSHOT_FORMAT_VERSION = 2
+
+# 快照的默认输出目录
+SNAPSHOT_DIR = os.path.join(DATA_DIR, "snapshots")
+
+# 文档目录文件
+DEFAULT_CATALOG_PATH = os.path.join(DOCUMENT_DIR, "documents.json")
+
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+CHUNKS_FILE = "chunks.jsonl"
+CATALOG_FILE = "documents.json"
+
+# 导出和恢复时每批读写的文本块数
+PAGE_SIZE = 1000
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _embedding_model_name(store) -> Optional[str]:
+    return getattr(store.sentence_embedding, "model_name", None)
+
+
+def create_snapshot(store, output_dir: str = None, catalog_path: str = DEFAULT_CATALOG_PATH) -> str:
+    """导出知识库快照
+
+    快照目录包含vectors.npy（float32向量矩阵）、chunks.jsonl（每行一个文本块的ID、文本和元数据，
+    行序与向量矩阵一致）、documents.json（文档目录）以及记录各文件SHA-256的manifest.json。
+    向量和文本块随导出批次逐批写入，内存中只保留一批；先写入临时目录，完成后再改名。
+
+    Args:
+        store: 向量存储
+        output_dir: 快照目录，默认为data/snapshots/<集合名>_<时间>
+        catalog_path: 文档目录文件路径
+
+    Returns:
+        快照目录路径
+    """
+    start_time = time.perf_counter()
+    output_dir = output_dir or os.path.join(
+        SNAPSHOT_DIR, f"{store.collection_name}_{time.strftime('%Y%m%d_%H%M%S')}")
+    if os.path.exists(output_dir):
+        raise FileExistsError(f"快照目录已存在: {output_dir}")
+    tmp_dir = output_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    try:
+        total = store.count()
+        written = 0
+        vectors = None
+        dimension = 0
+        with open(os.path.join(tmp_dir, CHUNKS_FILE), "w", encoding="utf-8") as chunks_file:
+            for batch_ids, batch_documents, batch_metadatas, batch_embeddings in store.export_batches(PAGE_SIZE):
+                if not batch_ids:
+                    continue
+                if vectors is None:
+                    dimension = batch_embeddings.shape[1]
+                    vectors = np.lib.format.open_memmap(os.path.join(tmp_dir, VECTORS_FILE), mode="w+",
+                                                        dtype=np.float32, shape=(total, dimension))
+                if written + len(batch_ids) > total:
+                    raise RuntimeError("导出过程中知识库发生了写入，请稍后重试")
+                vectors[written:written + len(batch_ids)] = batch_embeddings
+                for doc_id, document, metadata in zip(batch_ids, batch_documents, batch_metadatas):
+                    chunks_file.write(json.dumps({"id": doc_id, "document": document, "metadata": metadata},
+                                                 ensure_ascii=False) + "\n")
+                written += len(batch_ids)
+        if written != total:
+            raise RuntimeError("导出过程中知识库发生了写入，请稍后重试")
+        if vectors is None:
+            np.save(os.path.join(tmp_dir, VECTORS_FILE), np.empty((0, 0), dtype=np.float32))
+        else:
+            vectors.flush()
+            del vectors
+
+        files = [VECTORS_FILE, CHUNKS_FILE]
+        if os.path.exists(catalog_path):
+            shutil.copyfile(catalog_path, os.path.join(tmp_dir, CATALOG_FILE))
+            files.append(CATALOG_FILE)
+
+        manifest = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "collection": store.collection_name,
+            "backend": type(store).__name__,
+            "count": total,
+            "dimension": dimension,
+            "distance_metric": VECTOR_STORE_CONFIG["distance_metric"],
+            "embedding_model": _embedding_model_name(store),
+            "files": {
+                name: {
+                    "sha256": _file_sha256(os.path.join(tmp_dir, name)),
+                    "bytes": os.path.getsize(os.path.join(tmp_dir, name)),
+                }
+                for name in files
+            },
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    os.replace(tmp_dir, output_dir)
+    print(f"快照已写入: {output_dir}（{total}个文本块，耗时{time.perf_counter() - start_time:.2f}s）")
+    return output_dir
+
+
+def load_manifest(snapshot_dir: str, verify: bool = True) -> Dict[str, Any]:
+    """读取快照清单
+
+    Args:
+        snapshot_dir: 快照目录
+        verify: 是否校验各文件的大小和SHA-256
+
+    Returns:
+        清单内容
+    """
+    with open(os.path.join(snapshot_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"不支持的快照格式版本: {manifest.get('format_version')}")
+    if verify:
+        for name, info in manifest["files"].items():
+            path = os.path.join(snapshot_dir, name)
+            if not os.path.exists(path) or os.path.getsize(path) != info["bytes"] \
+                    or _file_sha256(path) != info["sha256"]:
+                raise ValueError(f"快照文件校验失败: {name}")
+    return manifest
+
+
+def _write_catalog(catalog_path: str, source_path: Optional[str]) -> None:
+    """原子地替换文档目录，source_path为None时写入空目录"""
+    os.makedirs(os.path.dirname(catalog_path), exist_ok=True)
+    tmp_path = catalog_path + ".tmp"
+    if source_path is None:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump([], f)
+    else:
+        shutil.copyfile(source_path, tmp_path)
+    os.replace(tmp_path, catalog_path)
+
+
+def _iter_chunks(snapshot_dir: str) -> Iterator[Dict[str, Any]]:
+    """逐行读取快照中的文本块"""
+    with open(os.path.join(snapshot_dir, CHUNKS_FILE), "r", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def _load_snapshot(snapshot_dir: str, manifest: Dict[str, Any]) -> np.ndarray:
+    """流式校验快照中的文本块和向量，任何不一致都在改动知识库之前报错
+
+    只在内存中保留文本块ID用于查重，向量以内存映射方式打开。
+
+    Returns:
+        快照中的向量矩阵
+    """
+    vectors = np.load(os.path.join(snapshot_dir, VECTORS_FILE), mmap_mode="r")
+
+    seen_ids = set()
+    count = 0
+    for chunk in _iter_chunks(snapshot_dir):
+        if not isinstance(chunk.get("id"), str) or not isinstance(chunk.get("document"), str) \
+                or not isinstance(chunk.get("metadata"), dict):
+            raise ValueError(f"快照中第{count + 1}个文本块格式不正确")
+        if chunk["id"] in seen_ids:
+            raise ValueError("快照中存在重复的文本块ID")
+        seen_ids.add(chunk["id"])
+        count += 1
+    if count != manifest["count"]:
+        raise ValueError("快照中的文本块数与清单不一致")
+    if count and (vectors.dtype != np.float32 or vectors.shape != (count, manifest["dimension"])):
+        raise ValueError("快照中的向量形状与文本块数或维度不一致")
+    if CATALOG_FILE in manifest["files"]:
+        with open(os.path.join(snapshot_dir, CATALOG_FILE), "r", encoding="utf-8") as f:
+            if not isinstance(json.load(f), list):
+                raise ValueError("快照中的文档目录格式不正确")
+    return vectors
+
+
+def _iter_pages(snapshot_dir: str, vectors: np.ndarray) -> Iterator[Tuple[List[str], np.ndarray,
+                                                                           List[Dict[str, Any]], List[str]]]:
+    """按PAGE_SIZE分批读取文本块，与向量矩阵的对应行一起返回"""
+    documents, metadatas, ids = [], [], []
+    start = 0
+    for chunk in _iter_chunks(snapshot_dir):
+        documents.append(chunk["document"])
+        metadatas.append(chunk["metadata"])
+        ids.append(chunk["id"])
+        if len(ids) == PAGE_SIZE:
+            yield documents, vectors[start:start + len(ids)], metadatas, ids
+            start += len(ids)
+            documents, metadatas, ids = [], [], []
+    if ids:
+        yield documents, vectors[start:start + len(ids)], metadatas, ids
+
+
+def _load_into(store, snapshot_dir: str, manifest: Dict[str, Any], vectors: np.ndarray,
+               progress_callback=None) -> None:
+    """清空集合后逐批写入快照中的文本块和向量"""
+    store.reset()
+    if manifest["count"]:
+        store.add_embedding_batches(_iter_pages(snapshot_dir, vectors), manifest["count"],
+                                    progress_callback=progress_callback)
+
+
+def _sample_documents(snapshot_dir: str, count: int, sample_size: int, seed: int) -> List[str]:
+    """从快照中随机抽取文本，只保留被抽中的行"""
+    rng = np.random.default_rng(seed)
+    picked = set(rng.choice(count, size=min(sample_size, count), replace=False).tolist())
+    return [chunk["document"] for i, chunk in enumerate(_iter_chunks(snapshot_dir)) if i in picked]
+
+
+def estimate_reingest_seconds(store, texts: List[str], total: int = None, sample_size: int = 256,
+                              seed: int = 0) -> float:
+    """估算重新入库时为全部文本块计算向量的耗时
+
+    对随机抽样的文本块编码后按数量线性外推。有SentenceEmbedding时绕过嵌入缓存直接推理，
+    否则使用store的嵌入函数，其中的缓存命中会使估算偏低。
+
+    Args:
+        store: 向量存储，使用其嵌入模型
+        texts: 文本块，可以是全部文本块或已抽取的样本
+        total: 文本块总数，默认为len(texts)
+        sample_size: 抽样的文本块数
+        seed: 抽样的随机种子
+
+    Returns:
+        估算的秒数
+    """
+    if not texts:
+        return 0.0
+    total = total or len(texts)
+    rng = np.random.default_rng(seed)
+    sample = [texts[i] for i in rng.choice(len(texts), size=min(sample_size, len(texts)), replace=False)]
+    encode = store.sentence_embedding._encode_batches if store.sentence_embedding is not None \
+        else store.embedding_function
+    # 首次调用包含模型加载，不计入耗时
+    encode(sample[:1])
+    start_time = time.perf_counter()
+    encode(sample)
+    return (time.perf_counter() - start_time) * total / len(sample)
+
+
+def restore_snapshot(store, snapshot_dir: str, catalog_path: str = DEFAULT_CATALOG_PATH,
+                     compare_reingest: bool = False) -> int:
+    """从快照恢复知识库，清空当前集合后直接写入快照中的向量
+
+    清空集合前先完整校验快照，并把当前知识库导出为回滚快照；写入中途失败时用回滚快照恢复原状。
+    文档目录总是被替换：快照中没有目录时写入空目录，避免目录中残留已不存在的文档。
+    恢复必须在应用停止后执行，运行中的应用不会感知存储文件和文档目录的变化，
+    命令行入口通过KnowledgeBaseLock的独占锁保证这一点。
+
+    Args:
+        store: 向量存储
+        snapshot_dir: 快照目录
+        catalog_path: 文档目录文件路径
+        compare_reingest: 恢复后是否抽样测量重新计算向量的耗时，与恢复耗时对比
+
+    Returns:
+        恢复的文本块数量
+    """
+    start_time = time.perf_counter()
+    manifest = load_manifest(snapshot_dir)
+
+    if manifest["distance_metric"] != VECTOR_STORE_CONFIG["distance_metric"]:
+        raise ValueError(f"快照的距离度量方式为{manifest['distance_metric']}，"
+                         f"与当前配置的{VECTOR_STORE_CONFIG['distance_metric']}不一致")
+    model_name = _embedding_model_name(store)
+    if manifest.get("embedding_model") and model_name and manifest["embedding_model"] != model_name:
+        print(f"警告: 快照使用的嵌入模型为{manifest['embedding_model']}，当前为{model_name}，查询向量可能不匹配")
+
+    vectors = _load_snapshot(snapshot_dir, manifest)
+
+    # 回滚快照包含当前的向量、文本块和文档目录
+    rollback_dir = create_snapshot(store, os.path.join(
+        SNAPSHOT_DIR, f"{store.collection_name}_rollback_{time.strftime('%Y%m%d_%H%M%S')}"), catalog_path)
+    last_reported = [0.0]
+
+    def report(stage: str, progress: float) -> None:
+        if progress - last_reported[0] >= 0.1 or progress >= 1.0:
+            last_reported[0] = progress
+            print(f"恢复进度: {progress:.0%}")
+
+    try:
+        _load_into(store, snapshot_dir, manifest, vectors, report)
+        _write_catalog(catalog_path, os.path.join(snapshot_dir, CATALOG_FILE)
+                       if CATALOG_FILE in manifest["files"] else None)
+    except BaseException:
+        print(f"快照恢复失败，正在回滚到恢复前的知识库: {rollback_dir}")
+        rollback_manifest = load_manifest(rollback_dir, verify=False)
+        _load_into(store, rollback_dir, rollback_manifest, _load_snapshot(rollback_dir, rollback_manifest))
+        _write_catalog(catalog_path, os.path.join(rollback_dir, CATALOG_FILE)
+                       if CATALOG_FILE in rollback_manifest["files"] else None)
+        shutil.rmtree(rollback_dir, ignore_errors=True)
+        raise
+    shutil.rmtree(rollback_dir, ignore_errors=True)
+
+    elapsed = time.perf_counter() - start_time
+    count = manifest["count"]
+    print(f"快照恢复完成: {count}个文本块，耗时{elapsed:.2f}s")
+    if compare_reingest and count:
+        reingest_seconds = estimate_reingest_seconds(
+            store, _sample_documents(snapshot_dir, count, sample_size=256, seed=0), total=count)
+        print(f"重新入库仅计算向量预计耗时{reingest_seconds:.2f}s，快照恢复快{reingest_seconds / max(elapsed, 1e-9):.1f}倍")
+    return count
@@ -0,0 +1,67 @@
+"""知识库的进程间文件锁，防止应用运行期间命令行工具改写存储文件"""
+
+import os
+from config import VECTOR_STORE_DIR
+
+try:
+    import fcntl
+except ImportError:
+    # Windows没有flock，不做进程间互斥
+    fcntl = None
+
+# 锁文件名，位于VECTOR_STORE_DIR下
+LOCK_FILE = "knowledge_base.lock"
+
+
+class KnowledgeBaseLock:
+    """知识库锁
+
+    应用进程打开向量存储后一直持有共享锁。命令行的compact会重写向量文件并重新编号行号，
+    restore会清空集合并替换文档目录，两者需要独占锁：应用运行期间拿不到独占锁，命令拒绝执行；
+    命令执行期间应用也无法打开向量存储。锁随文件关闭或进程退出由操作系统释放。
+    """
+
+    def __init__(self, path: str = None):
+        """初始化知识库锁
+
+        Args:
+            path: 锁文件路径，默认为VECTOR_STORE_DIR下的knowledge_base.lock
+        """
+        self.path = path or os.path.join(VECTOR_STORE_DIR, LOCK_FILE)
+        self._file = None
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None
+
+    def acquire(self, exclusive: bool = False) -> None:
+        """不等待地获取锁
+
+        Args:
+            exclusive: 是否获取独占锁，默认为共享锁
+
+        Raises:
+            RuntimeError: 其他进程以冲突的方式持有锁
+        """
+        if self._file is not None:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        f = open(self.path, "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(f.fileno(), (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                if exclusive:
+                    raise RuntimeError("知识库正在被应用使用，请先停止应用再执行该命令")
+                raise RuntimeError("知识库正在由命令行工具维护（compact/restore），请等待其完成后再打开")
+        self._file = f
+
+    def release(self) -> None:
+        """释放锁"""
+        if self._file is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
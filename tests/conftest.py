@@ -0,0 +1,80 @@
+"""测试公共配置
+
+各模块在导入时读取config中的数据目录，因此在导入src之前先把目录指向临时目录，
+测试不会读写data/下的知识库、嵌入缓存和快照。
+"""
+
+import os
+import sys
+import uuid
+import atexit
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+_TEST_DATA_DIR = tempfile.mkdtemp(prefix="knowledge_base_test_")
+# 最先注册，退出时最后执行，存储和缓存的退出回调写回之后再删除
+atexit.register(shutil.rmtree, _TEST_DATA_DIR, True)
+
+config.DATA_DIR = _TEST_DATA_DIR
+config.DOCUMENT_DIR = os.path.join(_TEST_DATA_DIR, "documents")
+config.VECTOR_STORE_DIR = os.path.join(_TEST_DATA_DIR, "vector_store")
+config.EMBEDDING_CACHE_DIR = os.path.join(_TEST_DATA_DIR, "embedding_cache")
+for path in (config.DOCUMENT_DIR, config.VECTOR_STORE_DIR, config.EMBEDDING_CACHE_DIR):
+    os.makedirs(path, exist_ok=True)
+
+# 测试向量的维度
+DIMENSION = 16
+
+# 后端名称，sharded为按来源哈希分成两片的numpy后端
+BACKENDS = ["numpy", "faiss", "chroma", "sharded"]
+
+_BACKEND_MODULES = {"numpy": "numpy", "faiss": "faiss", "chroma": "chromadb", "sharded": "numpy"}
+
+
+class FakeEmbedding:
+    """按文本哈希生成确定的单位向量，并记录被编码的文本"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        vectors = np.empty((len(texts), DIMENSION), dtype=np.float32)
+        for i, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(DIMENSION)
+            vectors[i] = vector / np.linalg.norm(vector)
+        return vectors
+
+    @property
+    def encoded(self):
+        return sum(len(texts) for texts in self.calls)
+
+
+@pytest.fixture
+def embedding():
+    return FakeEmbedding()
+
+
+@pytest.fixture(params=BACKENDS)
+def store(request, embedding, monkeypatch):
+    """各后端的空向量存储，每个测试使用独立的集合"""
+    pytest.importorskip(_BACKEND_MODULES[request.param])
+    if request.param == "sharded":
+        monkeypatch.setitem(config.VECTOR_STORE_CONFIG, "backend", "numpy")
+        monkeypatch.setitem(config.VECTOR_STORE_CONFIG, "shard_strategy", "hash")
+        monkeypatch.setitem(config.VECTOR_STORE_CONFIG, "shard_count", 2)
+    else:
+        monkeypatch.setitem(config.VECTOR_STORE_CONFIG, "backend", request.param)
+    from src.vector_store import create_vector_store
+
+    store = create_vector_store(collection_name=f"test_{uuid.uuid4().hex[:12]}", embedding_function=embedding)
+    yield store
+    store.reset()
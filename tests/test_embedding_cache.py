@@ -0,0 +1,118 @@
+"""磁盘嵌入缓存的命中、持久化和失效"""
+
+import numpy as np
+import pytest
+
+from src.model.embedding_cache import EmbeddingCache
+
+DIMENSION = 8
+
+
+def vector_for(text):
+    return np.full(DIMENSION, len(text), dtype=np.float32)
+
+
+class Counter:
+    def __init__(self):
+        self.texts = []
+
+    def __call__(self, texts):
+        self.texts.extend(texts)
+        return [vector_for(text) for text in texts]
+
+
+@pytest.fixture
+def make_cache(tmp_path):
+    def make(model_name="test-model", dimension=DIMENSION, max_entries=16):
+        return EmbeddingCache(model_name, dimension, max_entries=max_entries, cache_dir=str(tmp_path))
+    return make
+
+
+def test_computes_only_misses(make_cache):
+    cache = make_cache()
+    compute = Counter()
+    cache.lookup_or_compute(["甲", "乙乙"], compute)
+
+    result = cache.lookup_or_compute(["乙乙", "丙丙丙", "甲"], compute)
+    assert compute.texts == ["甲", "乙乙", "丙丙丙"]
+    np.testing.assert_array_equal(result, np.stack([vector_for(t) for t in ["乙乙", "丙丙丙", "甲"]]))
+    assert result.dtype == np.float32
+    assert cache.stats()["hits"] == 2
+
+
+def test_whitespace_is_normalized(make_cache):
+    cache = make_cache()
+    compute = Counter()
+    cache.lookup_or_compute(["知识 库"], compute)
+    cache.lookup_or_compute(["  知识\n库 "], compute)
+
+    assert compute.texts == ["知识 库"]
+
+
+def test_model_name_is_part_of_the_key(make_cache):
+    assert make_cache("model-a").make_key("文本") != make_cache("model-b").make_key("文本")
+
+
+def test_persists_after_flush(make_cache):
+    cache = make_cache()
+    cache.lookup_or_compute(["甲", "乙乙"], Counter())
+    cache.flush()
+
+    compute = Counter()
+    reopened = make_cache()
+    reopened.lookup_or_compute(["甲", "乙乙"], compute)
+    assert compute.texts == []
+
+
+def test_changed_dimension_rebuilds(make_cache):
+    cache = make_cache()
+    cache.lookup_or_compute(["甲"], Counter())
+    cache.flush()
+
+    computed = []
+
+    def compute(texts):
+        computed.extend(texts)
+        return np.ones((len(texts), DIMENSION * 2), dtype=np.float32)
+
+    reopened = make_cache(dimension=DIMENSION * 2)
+    np.testing.assert_array_equal(reopened.lookup_or_compute(["甲"], compute), np.ones((1, DIMENSION * 2)))
+    assert computed == ["甲"]
+
+
+def test_lru_eviction(make_cache):
+    cache = make_cache(max_entries=2)
+    cache.lookup_or_compute(["甲", "乙乙"], Counter())
+    cache.lookup_or_compute(["甲"], Counter())
+    cache.lookup_or_compute(["丙丙丙"], Counter())
+
+    compute = Counter()
+    result = cache.lookup_or_compute(["甲", "丙丙丙", "乙乙"], compute)
+    assert compute.texts == ["乙乙"]
+    np.testing.assert_array_equal(result[1], vector_for("丙丙丙"))
+
+
+def test_overwritten_slot_misses(make_cache):
+    cache = make_cache()
+    cache.lookup_or_compute(["甲"], Counter())
+    cache.flush()
+    # 模拟索引写回前进程崩溃：槽位已存放其他文本的向量，磁盘上的索引仍指向它
+    slot = cache._index[cache.make_key("甲")]
+    cache._slot_keys[slot] = 0
+    cache._slot_keys.flush()
+
+    compute = Counter()
+    reopened = make_cache()
+    np.testing.assert_array_equal(reopened.lookup_or_compute(["甲"], compute)[0], vector_for("甲"))
+    assert compute.texts == ["甲"]
+
+
+def test_clear(make_cache):
+    cache = make_cache()
+    cache.lookup_or_compute(["甲"], Counter())
+    cache.flush()
+    cache.clear()
+
+    compute = Counter()
+    make_cache().lookup_or_compute(["甲"], compute)
+    assert compute.texts == ["甲"]
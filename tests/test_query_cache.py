@@ -0,0 +1,130 @@
+"""检索结果缓存按集合版本号失效"""
+
+import config
+import pytest
+
+from src.vector_store.query_cache import QueryResultCache
+
+
+@pytest.fixture
+def cached_store(store):
+    if store.query_cache is None:
+        pytest.skip("配置中未启用检索结果缓存")
+    store.add_texts([f"缓存测试文本{i}。" for i in range(10)], [{"source": "doc.txt"} for _ in range(10)])
+    return store
+
+
+def test_repeated_query_hits(cached_store):
+    first = cached_store.similarity_search("缓存测试文本3。", k=3, mode="dense")
+    second = cached_store.similarity_search("  缓存测试文本3。 ", k=3, mode="dense")
+
+    assert second == first
+    assert cached_store.query_cache_stats()["hits"] == 1
+
+
+def test_cached_results_are_copies(cached_store):
+    first = cached_store.similarity_search("缓存测试文本3。", k=3, mode="dense")
+    first[0]["content"] = "被调用方修改"
+
+    assert cached_store.similarity_search("缓存测试文本3。", k=3, mode="dense")[0]["content"] == "缓存测试文本3。"
+
+
+def test_options_are_part_of_the_key(cached_store):
+    cached_store.similarity_search("缓存测试文本3。", k=3, mode="dense")
+    cached_store.similarity_search("缓存测试文本3。", k=5, mode="dense")
+    cached_store.similarity_search("缓存测试文本3。", k=3, mode="dense", include=["score"])
+
+    assert cached_store.query_cache_stats()["hits"] == 0
+
+
+def test_add_invalidates(cached_store):
+    cached_store.similarity_search("新写入的文本。", k=1, mode="dense")
+    version = cached_store.version
+    ids = cached_store.add_texts(["新写入的文本。"], [{"source": "new.txt"}])
+
+    assert cached_store.version > version
+    assert cached_store.similarity_search("新写入的文本。", k=1, mode="dense")[0]["id"] == ids[0]
+    assert cached_store.query_cache_stats()["hits"] == 0
+
+
+def test_metadata_update_invalidates(cached_store):
+    ids = cached_store.add_texts(["元数据会变化的文本。"], [{"source": "doc.txt", "page": 1}])
+    cached_store.similarity_search("元数据会变化的文本。", k=1, mode="dense")
+    cached_store.add_texts(["元数据会变化的文本。"], [{"source": "doc.txt", "page": 2}])
+
+    hit = cached_store.similarity_search("元数据会变化的文本。", k=1, mode="dense")[0]
+    assert hit["id"] == ids[0]
+    assert hit["metadata"]["page"] == 2
+
+
+def test_unchanged_write_keeps_cache(cached_store):
+    cached_store.similarity_search("缓存测试文本3。", k=3, mode="dense")
+    version = cached_store.version
+    cached_store.add_texts(["缓存测试文本3。"], [{"source": "doc.txt"}])
+
+    assert cached_store.version == version
+    cached_store.similarity_search("缓存测试文本3。", k=3, mode="dense")
+    assert cached_store.query_cache_stats()["hits"] == 1
+
+
+def test_delete_invalidates(cached_store):
+    hit = cached_store.similarity_search("缓存测试文本3。", k=1, mode="dense")[0]
+    cached_store.delete([hit["id"]])
+
+    assert hit["id"] not in [r["id"] for r in cached_store.similarity_search("缓存测试文本3。", k=1, mode="dense")]
+
+
+def test_reset_invalidates(cached_store):
+    cached_store.similarity_search("缓存测试文本3。", k=1, mode="dense")
+    cached_store.reset()
+
+    assert cached_store.similarity_search("缓存测试文本3。", k=1, mode="dense") == []
+
+
+def test_disabled_cache(store, embedding, monkeypatch):
+    monkeypatch.setitem(config.VECTOR_STORE_CONFIG, "query_cache_enabled", False)
+    from src.vector_store import create_vector_store
+
+    uncached = create_vector_store(collection_name=store.collection_name, embedding_function=embedding)
+    assert uncached.query_cache is None
+    assert uncached.query_cache_stats() is None
+
+
+def test_stale_version_misses():
+    cache = QueryResultCache(max_entries=4, ttl=60)
+    key = cache.make_key("查询", 5, None)
+    cache.put(key, 1, ["结果"], 10.0)
+
+    assert cache.get(key, 2) is None
+    # 过期条目被移除，即使回到旧版本号也不再命中
+    assert cache.get(key, 1) is None
+
+
+def test_ttl_expiry(monkeypatch):
+    cache = QueryResultCache(max_entries=4, ttl=60)
+    key = cache.make_key("查询", 5, None)
+    now = [1000.0]
+    monkeypatch.setattr("src.vector_store.query_cache.time.monotonic", lambda: now[0])
+    cache.put(key, 1, ["结果"], 10.0)
+
+    now[0] += 30
+    assert cache.get(key, 1) == ["结果"]
+    now[0] += 61
+    assert cache.get(key, 1) is None
+
+
+def test_lru_eviction():
+    cache = QueryResultCache(max_entries=2, ttl=60)
+    keys = [cache.make_key(f"查询{i}", 5, None) for i in range(3)]
+    cache.put(keys[0], 1, [0], 1.0)
+    cache.put(keys[1], 1, [1], 1.0)
+    cache.get(keys[0], 1)
+    cache.put(keys[2], 1, [2], 1.0)
+
+    assert cache.get(keys[1], 1) is None
+    assert cache.get(keys[0], 1) == [0]
+    assert cache.get(keys[2], 1) == [2]
+
+
+def test_filter_key_is_order_independent():
+    assert QueryResultCache.make_key("查询", 5, {"a": 1, "b": 2}) == QueryResultCache.make_key("查询", 5, {"b": 2, "a": 1})
@@ -0,0 +1,144 @@
+"""知识库快照的导出、恢复、校验和回滚"""
+
+import os
+import json
+import numpy as np
+import pytest
+
+from src.vector_store import snapshot
+
+
+def dump(store):
+    """按ID整理存储中的全部文本块"""
+    contents = {}
+    for ids, documents, metadatas, vectors in store.export_batches():
+        for doc_id, document, metadata, vector in zip(ids, documents, metadatas, vectors):
+            contents[doc_id] = (document, metadata, np.array(vector))
+    return contents
+
+
+def assert_same_contents(actual, expected):
+    assert actual.keys() == expected.keys()
+    for doc_id, (document, metadata, vector) in expected.items():
+        assert actual[doc_id][0] == document
+        assert actual[doc_id][1] == metadata
+        np.testing.assert_allclose(actual[doc_id][2], vector, atol=1e-6)
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    path = str(tmp_path / "documents" / "documents.json")
+    os.makedirs(os.path.dirname(path))
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([{"source": "doc.txt"}], f)
+    return path
+
+
+@pytest.fixture
+def filled_store(store, monkeypatch):
+    # 分多页导出和恢复
+    monkeypatch.setattr(snapshot, "PAGE_SIZE", 7)
+    texts = [f"快照测试文本{i}。\n第二行" for i in range(30)]
+    store.add_texts(texts, [{"source": f"doc{i % 3}.txt", "chunk_index": i} for i in range(30)])
+    return store
+
+
+def test_snapshot_layout(filled_store, catalog, tmp_path):
+    snapshot_dir = snapshot.create_snapshot(filled_store, str(tmp_path / "snapshot"), catalog)
+
+    manifest = snapshot.load_manifest(snapshot_dir)
+    assert manifest["format_version"] == snapshot.SNAPSHOT_FORMAT_VERSION
+    assert manifest["count"] == 30
+    assert set(manifest["files"]) == {snapshot.VECTORS_FILE, snapshot.CHUNKS_FILE, snapshot.CATALOG_FILE}
+    with open(os.path.join(snapshot_dir, snapshot.CHUNKS_FILE), "r", encoding="utf-8") as f:
+        chunks = [json.loads(line) for line in f]
+    vectors = np.load(os.path.join(snapshot_dir, snapshot.VECTORS_FILE))
+    assert vectors.shape == (30, manifest["dimension"])
+
+    # 文本块的行序与向量矩阵一致
+    contents = dump(filled_store)
+    for chunk, vector in zip(chunks, vectors):
+        document, metadata, expected = contents[chunk["id"]]
+        assert chunk["document"] == document
+        assert chunk["metadata"] == metadata
+        np.testing.assert_allclose(vector, expected, atol=1e-6)
+
+
+def test_restore_round_trip(filled_store, embedding, catalog, tmp_path):
+    expected = dump(filled_store)
+    snapshot_dir = snapshot.create_snapshot(filled_store, str(tmp_path / "snapshot"), catalog)
+
+    filled_store.delete(list(expected)[:10])
+    filled_store.add_texts(["快照之后写入的文本。"], [{"source": "new.txt"}])
+    with open(catalog, "w", encoding="utf-8") as f:
+        json.dump([], f)
+    encoded = embedding.encoded
+
+    assert snapshot.restore_snapshot(filled_store, snapshot_dir, catalog) == 30
+    assert embedding.encoded == encoded
+    assert filled_store.count() == 30
+    assert_same_contents(dump(filled_store), expected)
+    with open(catalog, "r", encoding="utf-8") as f:
+        assert json.load(f) == [{"source": "doc.txt"}]
+    document = next(iter(expected.values()))[0]
+    assert filled_store.similarity_search(document, k=1, mode="dense")[0]["content"] == document
+
+
+def test_restore_empty_snapshot(store, catalog, tmp_path):
+    snapshot_dir = snapshot.create_snapshot(store, str(tmp_path / "snapshot"), catalog)
+    store.add_texts(["恢复后应被清空。"], [{"source": "doc.txt"}])
+
+    assert snapshot.restore_snapshot(store, snapshot_dir, catalog) == 0
+    assert store.count() == 0
+
+
+def test_corrupted_snapshot_is_rejected(filled_store, catalog, tmp_path):
+    snapshot_dir = snapshot.create_snapshot(filled_store, str(tmp_path / "snapshot"), catalog)
+    with open(os.path.join(snapshot_dir, snapshot.CHUNKS_FILE), "a", encoding="utf-8") as f:
+        f.write("\n")
+    expected = dump(filled_store)
+
+    with pytest.raises(ValueError):
+        snapshot.restore_snapshot(filled_store, snapshot_dir, catalog)
+    assert_same_contents(dump(filled_store), expected)
+
+
+def test_duplicate_ids_are_rejected(filled_store, catalog, tmp_path):
+    snapshot_dir = snapshot.create_snapshot(filled_store, str(tmp_path / "snapshot"), catalog)
+    chunks_path = os.path.join(snapshot_dir, snapshot.CHUNKS_FILE)
+    with open(chunks_path, "r", encoding="utf-8") as f:
+        lines = f.readlines()
+    lines[1] = json.dumps(dict(json.loads(lines[1]), id=json.loads(lines[0])["id"]), ensure_ascii=False) + "\n"
+    with open(chunks_path, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+    manifest = snapshot.load_manifest(snapshot_dir, verify=False)
+
+    with pytest.raises(ValueError, match="重复"):
+        snapshot._load_snapshot(snapshot_dir, manifest)
+
+
+def test_failed_restore_rolls_back(filled_store, catalog, tmp_path, monkeypatch):
+    snapshot_dir = snapshot.create_snapshot(filled_store, str(tmp_path / "snapshot"), catalog)
+    filled_store.delete(list(dump(filled_store))[:5])
+    filled_store.add_texts(["回滚后应保留的文本。"], [{"source": "new.txt"}])
+    with open(catalog, "w", encoding="utf-8") as f:
+        json.dump([{"source": "new.txt"}], f)
+    expected = dump(filled_store)
+
+    add_embedding_batches = filled_store.add_embedding_batches
+    calls = []
+
+    def failing_add_embedding_batches(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("写入失败")
+        return add_embedding_batches(*args, **kwargs)
+
+    monkeypatch.setattr(filled_store, "add_embedding_batches", failing_add_embedding_batches)
+    with pytest.raises(RuntimeError, match="写入失败"):
+        snapshot.restore_snapshot(filled_store, snapshot_dir, catalog)
+
+    assert_same_contents(dump(filled_store), expected)
+    with open(catalog, "r", encoding="utf-8") as f:
+        assert json.load(f) == [{"source": "new.txt"}]
+    assert not os.listdir(snapshot.SNAPSHOT_DIR)
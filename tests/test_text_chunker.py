@@ -0,0 +1,59 @@
+"""TextChunker的输出与原先的实现一致，流式分块与整体分块一致"""
+
+import random
+import pytest
+
+from src.utils.text_chunker import TextChunker
+from src.utils.chunker_benchmark import LegacyTextChunker, make_sample_text
+
+EDGE_CASES = [
+    "",
+    "   \n\n  \n",
+    "单独一段，没有换行",
+    "第一段。\n\n第二段！\n\n\n第三段？",
+    "段落内\n有换行。\n\n  前后有空白的段落  \n\n",
+    "字面的换行符\\n也作为句末。" * 20,
+    "。！？" * 50,
+    "没有句末标点的超长段落" * 30,
+    "Mixed English sentences! And 中文句子。Another one? 结尾" * 15,
+]
+
+CHUNK_PARAMS = [(500, 50), (200, 0), (120, 30), (40, 60)]
+
+
+@pytest.fixture(scope="module")
+def sample_text():
+    return make_sample_text(size_mb=0.1, seed=1)
+
+
+@pytest.mark.parametrize("chunk_size,chunk_overlap", CHUNK_PARAMS)
+def test_matches_legacy_on_sample_text(sample_text, chunk_size, chunk_overlap):
+    expected = LegacyTextChunker(chunk_size, chunk_overlap).split_text(sample_text)
+    assert TextChunker(chunk_size, chunk_overlap).split_text(sample_text) == expected
+
+
+@pytest.mark.parametrize("chunk_size,chunk_overlap", CHUNK_PARAMS)
+@pytest.mark.parametrize("text", EDGE_CASES)
+def test_matches_legacy_on_edge_cases(text, chunk_size, chunk_overlap):
+    expected = LegacyTextChunker(chunk_size, chunk_overlap).split_text(text)
+    assert TextChunker(chunk_size, chunk_overlap).split_text(text) == expected
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_streaming_matches_split_text(sample_text, seed):
+    text = sample_text[:20000]
+    rng = random.Random(seed)
+    cuts = sorted(rng.sample(range(1, len(text)), 50))
+    segments = [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+
+    chunker = TextChunker(300, 40)
+    assert list(chunker.split_text_iter(segments)) == chunker.split_text(text)
+    assert list(chunker.iter_chunks_with_offsets(segments)) == chunker.split_text_with_offsets(text)
+
+
+def test_offsets_are_ordered_and_within_text(sample_text):
+    text = sample_text[:20000]
+    previous_end = 0
+    for chunk, start, end in TextChunker(300, 40).split_text_with_offsets(text):
+        assert previous_end <= start < end <= len(text)
+        previous_end = end
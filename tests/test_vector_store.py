@@ -0,0 +1,139 @@
+"""向量存储后端的写入、检索、upsert和删除"""
+
+import uuid
+import config
+
+
+def make_chunks(count, source="doc.txt"):
+    texts = [f"第{i}段：知识库中的测试文本。" for i in range(count)]
+    metadatas = [{"source": source, "chunk_index": i} for i in range(count)]
+    return texts, metadatas
+
+
+def test_round_trip(store):
+    texts, metadatas = make_chunks(20)
+    ids = store.add_texts(texts, metadatas)
+
+    assert len(set(ids)) == 20
+    assert store.count() == 20
+    result = store.get(ids[:3])
+    assert dict(zip(result["ids"], result["documents"])) == dict(zip(ids[:3], texts[:3]))
+    assert dict(zip(result["ids"], result["metadatas"])) == dict(zip(ids[:3], metadatas[:3]))
+
+    hits = store.similarity_search(texts[7], k=3, mode="dense")
+    assert hits[0]["id"] == ids[7]
+    assert hits[0]["content"] == texts[7]
+    assert hits[0]["metadata"] == metadatas[7]
+
+
+def test_reopen_keeps_contents(store, embedding):
+    texts, metadatas = make_chunks(10)
+    ids = store.add_texts(texts, metadatas)
+
+    from src.vector_store import create_vector_store
+    reopened = create_vector_store(collection_name=store.collection_name, embedding_function=embedding)
+    assert reopened.count() == 10
+    assert reopened.similarity_search(texts[4], k=1, mode="dense")[0]["id"] == ids[4]
+
+
+def test_ids_are_deterministic(store):
+    texts, metadatas = make_chunks(5)
+    assert store.add_texts(texts, metadatas) == store.add_texts(texts, metadatas)
+
+
+def test_upsert_skips_unchanged_chunks(store, embedding):
+    texts, metadatas = make_chunks(10)
+    ids = store.add_texts(texts, metadatas)
+    encoded = embedding.encoded
+
+    stats = {}
+    assert store.add_texts(texts, metadatas, stats=stats) == ids
+    assert stats == {"written": 0, "metadata_updated": 0, "unchanged": 10}
+    assert embedding.encoded == encoded
+    assert store.count() == 10
+
+
+def test_upsert_updates_metadata_without_embedding(store, embedding):
+    texts, metadatas = make_chunks(10)
+    ids = store.add_texts(texts, metadatas)
+    encoded = embedding.encoded
+
+    updated = [dict(metadata, page=2) for metadata in metadatas]
+    stats = {}
+    store.add_texts(texts[:4], updated[:4], stats=stats)
+    assert stats == {"written": 0, "metadata_updated": 4, "unchanged": 0}
+    assert embedding.encoded == encoded
+    result = store.get(ids[:4])
+    assert all(metadata["page"] == 2 for metadata in result["metadatas"])
+
+
+def test_upsert_rewrites_changed_text(store, embedding):
+    texts, metadatas = make_chunks(10)
+    ids = store.add_texts(texts, metadatas)
+    encoded = embedding.encoded
+
+    stats = {}
+    store.add_texts(["改写后的第3段。"], [metadatas[3]], ids=[ids[3]], stats=stats)
+    assert stats == {"written": 1, "metadata_updated": 0, "unchanged": 0}
+    assert embedding.encoded == encoded + 1
+    assert store.count() == 10
+    assert store.get([ids[3]])["documents"] == ["改写后的第3段。"]
+    assert store.similarity_search("改写后的第3段。", k=1, mode="dense")[0]["id"] == ids[3]
+
+
+def test_delete(store):
+    texts, metadatas = make_chunks(10)
+    ids = store.add_texts(texts, metadatas)
+
+    store.delete(ids[:3])
+    assert store.count() == 7
+    assert store.get(ids[:3])["ids"] == []
+    hits = store.similarity_search(texts[1], k=10, mode="dense")
+    assert ids[1] not in [hit["id"] for hit in hits]
+    assert len(hits) == 7
+
+
+def test_delete_by_source(store):
+    texts, metadatas = make_chunks(6, source="a.txt")
+    other_texts, other_metadatas = make_chunks(4, source="b.txt")
+    store.add_texts(texts, metadatas)
+    other_ids = store.add_texts(other_texts, other_metadatas)
+
+    assert store.delete_by_source("a.txt") == 6
+    assert store.count() == 4
+    assert store.get_by_source("a.txt")["ids"] == []
+    assert sorted(store.get_by_source("b.txt")["ids"]) == sorted(other_ids)
+
+
+def test_replace_source_keeps_unchanged_chunks(store, embedding):
+    texts, metadatas = make_chunks(8)
+    ids = store.add_texts(texts, metadatas)
+    encoded = embedding.encoded
+
+    new_texts = texts[:6] + ["新增的段落。"]
+    stats = {}
+    store.replace_source("doc.txt", new_texts, [dict(m) for m in metadatas[:6]] + [{"chunk_index": 6}], stats=stats)
+    assert stats["written"] == 1
+    assert stats["deleted"] == 2
+    assert embedding.encoded == encoded + 1
+    assert store.count() == 7
+    assert set(ids[:6]) <= set(store.get_by_source("doc.txt")["ids"])
+
+
+def test_search_after_maintain(store, monkeypatch):
+    monkeypatch.setitem(config.VECTOR_STORE_CONFIG, "numpy_compact_threshold", 0.3)
+    texts, metadatas = make_chunks(30)
+    ids = store.add_texts(texts, metadatas)
+
+    store.delete(ids[:20])
+    if store.needs_compaction():
+        assert store.maintain()
+    assert not store.needs_compaction()
+    assert store.count() == 10
+    for i in (20, 25, 29):
+        assert store.similarity_search(texts[i], k=1, mode="dense")[0]["id"] == ids[i]
+    assert store.get(ids[:20])["ids"] == []
+
+    new_ids = store.add_texts([f"压缩后写入{uuid.uuid4().hex}"], [{"source": "c.txt"}])
+    assert store.count() == 11
+    assert store.get(new_ids)["ids"] == new_ids